@@ -35,10 +35,12 @@ A metrics package contains, minimally, two root directories:
 """
 
 import argparse
+import os
+import sys
 
 import lsst.pex.exceptions
 from lsst.utils import getPackageDir
-from lsst.verify import MetricSet, SpecificationSet
+from lsst.verify.lint import lint_metrics_package
 
 
 def main():
@@ -56,17 +58,49 @@ def main():
         type=str,
         nargs='?',
         help="Filepath of the metrics package to be checked.")
+    parser.add_argument(
+        "-j", "--processes",
+        default=None,
+        type=int,
+        help="Number of processes used to parse YAML files.")
+    parser.add_argument(
+        "--all",
+        dest="incremental",
+        action="store_false",
+        default=True,
+        help="Lint all files, including files that are unchanged since "
+             "they last passed.")
+    parser.add_argument(
+        "--state",
+        default=None,
+        help="File recording the files that passed, for incremental "
+             "linting. Default is a file in the metrics package cache.")
     args = parser.parse_args()
 
     print('Linting {}.'.format(args.package_dir))
 
-    metric_repo = MetricSet.load_metrics_package(args.package_dir)
-    print('Passed: metrics/')
-    print('\tParsed {0:d} metric sets.'.format(len(metric_repo)))
+    result = lint_metrics_package(args.package_dir,
+                                  processes=args.processes,
+                                  incremental=args.incremental,
+                                  state_path=args.state)
+
+    if len(result.timings) > 0:
+        print('\nTime per file:\n')
+        result.timing_table().pprint(max_lines=-1, max_width=-1)
+        print('\nTime per phase:\n')
+        for phase, duration in result.phase_totals.items():
+            print('\t{0:<12s} {1:10.2f} ms'.format(phase, duration * 1e3))
+
+    print('\nChecked {0:d} files ({1:d} unchanged files skipped).'.format(
+        len(result.checked), len(result.skipped)))
 
-    spec_set = SpecificationSet.load_metrics_package(args.package_dir)
-    print('Passed: specs/')
-    print('\tParsed {0:d} specifications.'.format(len(spec_set)))
+    if not result.passed:
+        print('\n{0:d} errors:'.format(len(result.errors)))
+        for path, message in result.errors:
+            print('\n{0}:\n\t{1}'.format(
+                os.path.relpath(path, result.package_dir),
+                message.replace('\n', '\n\t')))
+        sys.exit(1)
 
     print("\nAll tests passed.")
 
@@ -0,0 +1,32 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""pytest configuration."""
+
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 7):
+    # lsst.verify.asyncsquash requires Python 3.7 (and Python 3 syntax), so
+    # it can't be imported to collect its doctests or tests
+    collect_ignore += ['python/lsst/verify/asyncsquash.py',
+                       'tests/test_asyncsquash.py']
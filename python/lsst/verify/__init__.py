@@ -39,6 +39,8 @@ from .metricset import *
 from .measurement import *
 from .measurementset import *
 from .blob import *
+from .histogramblob import *
+from .sketchblob import *
 from .blobset import *
 from .jobmetadata import *
 from .job import *
@@ -0,0 +1,586 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Asynchronous SQUASH client, for uploading many jobs concurrently.
+
+The client shares its retry policy, statistics and endpoint cache with
+`lsst.verify.squash`. HTTP requests are made by a swappable transport:
+
+- `AiohttpTransport` uses `aiohttp`, if it is installed.
+- `ThreadTransport` runs requests with the shared `requests.Session` of
+  `lsst.verify.squash` (`~lsst.verify.squash.get_session`) on the event
+  loop's executor.
+
+This module requires Python 3.7 or later, and raises `ImportError` on
+earlier versions of Python 3. It isn't collected by the doctests on
+earlier versions (see ``conftest.py``).
+"""
+
+from __future__ import print_function, division
+
+__all__ = ['AsyncClient', 'ThreadTransport', 'AiohttpTransport',
+           'get_default_transport', 'dispatch_job', 'dispatch_many',
+           'DispatchResult']
+
+import asyncio
+from collections import namedtuple
+import functools
+import json
+import sys
+
+import requests
+from requests.structures import CaseInsensitiveDict
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import lsst.log
+
+from . import squash
+
+if sys.version_info < (3, 7):
+    raise ImportError('lsst.verify.asyncsquash requires Python 3.7 or later')
+
+# Result of dispatching one job with `dispatch_many`. ``response`` is `None`
+# if the upload failed with ``error``.
+DispatchResult = namedtuple('DispatchResult', ['index', 'response', 'error'])
+
+
+class _Response(object):
+    """Response to a request made by a transport.
+
+    Parameters
+    ----------
+    status_code : `int`
+        HTTP status code.
+    reason : `str`
+        HTTP status reason.
+    url : `str`
+        URL of the request.
+    headers : `dict`
+        Response headers.
+    content : `bytes`
+        Response content.
+    """
+
+    def __init__(self, status_code, reason, url, headers, content):
+        self.status_code = status_code
+        self.reason = reason
+        self.url = url
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+
+    def json(self):
+        """Decode the JSON content."""
+        return json.loads(self.content.decode('utf-8'))
+
+    def raise_for_status(self):
+        """Raise `requests.exceptions.HTTPError` for an error status."""
+        if 400 <= self.status_code < 600:
+            message = '{0:d} Error: {1} for url: {2}'.format(
+                self.status_code, self.reason, self.url)
+            raise requests.exceptions.HTTPError(message, response=self)
+
+
+class ThreadTransport(object):
+    """Transport that runs requests with the shared `requests.Session` of
+    `lsst.verify.squash` on an executor.
+
+    Parameters
+    ----------
+    executor : `concurrent.futures.Executor`, optional
+        Executor to run requests on. The event loop's default executor is
+        used by default.
+    """
+
+    def __init__(self, executor=None):
+        self._executor = executor
+
+    async def request(self, method, url, headers=None, data=None,
+                      auth=None, timeout=None):
+        """Send an HTTP request.
+
+        Parameters
+        ----------
+        method : `str`
+            HTTP method.
+        url : `str`
+            URL.
+        headers : `dict`, optional
+            Request headers.
+        data : `bytes`, optional
+            Request body.
+        auth : `tuple`, optional
+            Username and password for basic authentication.
+        timeout : `float`, optional
+            Request timeout, in seconds.
+
+        Returns
+        -------
+        response : `_Response`
+            The response.
+
+        Raises
+        ------
+        requests.exceptions.RequestException
+            Raised if no response was received.
+        """
+        call = functools.partial(squash.get_session().request, method, url,
+                                 headers=headers, data=data, auth=auth,
+                                 timeout=timeout, allow_redirects=False)
+        loop = asyncio.get_running_loop()
+        r = await loop.run_in_executor(self._executor, call)
+        return _Response(r.status_code, r.reason, r.url, r.headers,
+                         r.content)
+
+    async def close(self):
+        """Release the transport's resources."""
+        pass
+
+
+class AiohttpTransport(object):
+    """Transport that sends requests with `aiohttp`.
+
+    Parameters
+    ----------
+    limit : `int`, optional
+        Maximum number of open connections.
+
+    Raises
+    ------
+    ImportError
+        Raised if `aiohttp` isn't installed.
+    """
+
+    def __init__(self, limit=10):
+        if aiohttp is None:
+            raise ImportError('AiohttpTransport requires aiohttp.')
+        self._limit = limit
+        self._session = None
+
+    async def request(self, method, url, headers=None, data=None,
+                      auth=None, timeout=None):
+        """Send an HTTP request.
+
+        See `ThreadTransport.request`. Connection errors and timeouts are
+        raised as `requests.exceptions.ConnectionError` and
+        `requests.exceptions.Timeout`.
+        """
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self._limit)
+            self._session = aiohttp.ClientSession(connector=connector)
+        if auth is not None:
+            auth = aiohttp.BasicAuth(*auth)
+        try:
+            async with self._session.request(
+                    method, url, headers=headers, data=data, auth=auth,
+                    timeout=aiohttp.ClientTimeout(total=timeout),
+                    allow_redirects=False) as r:
+                content = await r.read()
+                return _Response(r.status, r.reason, str(r.url), r.headers,
+                                 content)
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.Timeout(str(e))
+        except aiohttp.ClientConnectionError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+
+    async def close(self):
+        """Close the transport's connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def get_default_transport():
+    """Get a transport with the preferred available HTTP library.
+
+    Returns
+    -------
+    transport : `AiohttpTransport` or `ThreadTransport`
+        An `AiohttpTransport` if `aiohttp` is installed, and a
+        `ThreadTransport` otherwise.
+    """
+    if aiohttp is not None:
+        return AiohttpTransport()
+    return ThreadTransport()
+
+
+class AsyncClient(object):
+    """Asynchronous client for a SQUASH API.
+
+    Parameters
+    ----------
+    api_url : `str`
+        Root URL of the SQUASH API. For example,
+        ``'https://squash.lsst.codes/dashboard/api/'``.
+    api_user : `str`, optional
+        API username.
+    api_password : `str`, optional
+        API password.
+    transport : obj, optional
+        Transport used to send requests: an object with ``request`` and
+        ``close`` coroutine methods, like `ThreadTransport`. The value of
+        `get_default_transport` is used by default.
+    timeout : `float`, optional
+        Request timeout. The value of `lsst.verify.squash.get_default_timeout`
+        is used by default.
+    version : `str`, optional
+        API version. The value of
+        `lsst.verify.squash.get_default_api_version` is used by default.
+
+    Notes
+    -----
+    Requests are retried following the policy set by
+    `lsst.verify.squash.configure_session`, and counted in
+    `lsst.verify.squash.get_session_stats`. Use the client as an
+    asynchronous context manager, or call `close`, to release the
+    transport's connections.
+    """
+
+    def __init__(self, api_url, api_user=None, api_password=None,
+                 transport=None, timeout=None, version=None):
+        self.api_url = api_url
+        if api_user is not None and api_password is not None:
+            self._auth = (api_user, api_password)
+        else:
+            self._auth = None
+        if transport is None:
+            transport = get_default_transport()
+        self.transport = transport
+        self._timeout = timeout or squash.get_default_timeout()
+        self._headers = {'Accept': squash.make_accept_header(version)}
+        # Created in the event loop by _get_entry
+        self._discovery_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        """Release the transport's connections."""
+        await self.transport.close()
+
+    async def request(self, method, url, headers=None, data=None):
+        """Send an HTTP request, retrying failures.
+
+        Requests are retried like those of `lsst.verify.squash`.
+
+        Parameters
+        ----------
+        method : `str`
+            HTTP method.
+        url : `str`
+            URL.
+        headers : `dict`, optional
+            Additional request headers.
+        data : `bytes`, optional
+            Request body.
+
+        Returns
+        -------
+        response : `_Response`
+            The final response, which may have an error status.
+
+        Raises
+        ------
+        requests.exceptions.RequestException
+            Raised if the final attempt failed without a response.
+        """
+        log = lsst.log.Log.getLogger('verify.asyncsquash')
+
+        request_headers = dict(self._headers)
+        if headers is not None:
+            request_headers.update(headers)
+        idempotent = method.upper() in squash._IDEMPOTENT_METHODS
+        max_retries = squash._SESSION_CONFIG['max_retries']
+        attempt = 0
+        while True:
+            squash._count('requests')
+            try:
+                r = await self.transport.request(
+                    method, url, headers=request_headers, data=data,
+                    auth=self._auth, timeout=self._timeout)
+            except requests.exceptions.RequestException as e:
+                squash._count('connection_errors')
+                if idempotent:
+                    retry = isinstance(e, (requests.exceptions.ConnectionError,
+                                           requests.exceptions.Timeout))
+                else:
+                    retry = isinstance(e, requests.exceptions.ConnectTimeout)
+                if not retry or attempt >= max_retries:
+                    raise
+                delay = squash._get_backoff(attempt)
+                log.warning(
+                    '{0} {1} failed ({2}); retrying in {3:.1f} s'.format(
+                        method, url, e, delay))
+            else:
+                retry = idempotent and r.status_code in squash._RETRY_STATUSES
+                if not retry or attempt >= max_retries:
+                    return r
+                delay = squash._get_backoff(attempt)
+                retry_after = squash._parse_retry_after(
+                    r.headers.get('Retry-After'))
+                if retry_after is not None:
+                    if retry_after > squash._SESSION_CONFIG['backoff_max']:
+                        return r
+                    delay = max(delay, retry_after)
+                    squash._count('retry_after_waits')
+                log.warning(
+                    '{0} {1} status: {2}; retrying in {3:.1f} s'.format(
+                        method, url, r.status_code, delay))
+
+            squash._count('retries')
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _get_entry(self):
+        """Get the endpoint cache entry of the API root, discovering its
+        endpoints if they aren't cached.
+        """
+        entry = squash._ENDPOINT_CACHE._lookup(self.api_url)
+        if entry is not None:
+            return entry
+
+        if self._discovery_lock is None:
+            self._discovery_lock = asyncio.Lock()
+        async with self._discovery_lock:
+            # Endpoints may have been discovered while waiting for the lock
+            entry = squash._ENDPOINT_CACHE._lookup(self.api_url)
+            if entry is None:
+                r = await self.get()
+                entry = squash._ENDPOINT_CACHE.set(
+                    self.api_url, r.json(),
+                    squash._parse_accept_encoding(
+                        r.headers.get('Accept-Encoding')))
+        return entry
+
+    async def get_endpoint_url(self, api_endpoint):
+        """Lookup a SQUASH endpoint URL.
+
+        See `lsst.verify.squash.get_endpoint_url`.
+        """
+        entry = await self._get_entry()
+        return entry[1][api_endpoint]
+
+    async def get(self, api_endpoint=None):
+        """GET request to the SQUASH API.
+
+        Parameters
+        ----------
+        api_endpoint : `str`, optional
+            Name of the API endpoint. The API root is requested if unset.
+
+        Raises
+        ------
+        requests.exceptions.RequestException
+           Raised if the HTTP request fails.
+
+        Returns
+        -------
+        response : `_Response`
+            Response object. Obtain JSON content with ``response.json()``.
+        """
+        log = lsst.log.Log.getLogger('verify.asyncsquash.get')
+
+        if api_endpoint is not None:
+            url = await self.get_endpoint_url(api_endpoint)
+        else:
+            url = self.api_url
+
+        try:
+            r = await self.request('GET', url)
+            log.info('GET {0} status: {1}'.format(url, r.status_code))
+            r.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            log.error(str(e))
+            raise e
+
+        return r
+
+    async def post(self, api_endpoint, json_doc=None, compress=None):
+        """POST a JSON document to SQUASH.
+
+        Parameters
+        ----------
+        api_endpoint : `str`
+            Name of the API endpoint to post to.
+        json_doc : `dict`
+            A JSON-serializable object.
+        compress : `bool`, optional
+            Compress the request body with gzip. See
+            `lsst.verify.squash.post`.
+
+        Raises
+        ------
+        requests.exceptions.RequestException
+           Raised if the HTTP request fails.
+
+        Returns
+        -------
+        response : `_Response`
+            Response object. Obtain JSON content with ``response.json()``.
+        """
+        log = lsst.log.Log.getLogger('verify.asyncsquash.post')
+
+        entry = await self._get_entry()
+        url = entry[1][api_endpoint]
+        if compress is None:
+            compress = 'gzip' in entry[2]
+
+        headers = {'Content-Type': 'application/json'}
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
+        # Serialize off the event loop so other uploads can progress
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(
+            None, b''.join, squash._JsonBody(json_doc, compress=compress))
+
+        try:
+            r = await self.request('POST', url, headers=headers, data=data)
+            log.info('POST {0} status: {1}'.format(url, r.status_code))
+            r.raise_for_status()
+
+            # be pedantic about return status, as in squash.post
+            if r.status_code != 201:
+                message = 'Expected status=201. Got status={0}. {1}'.format(
+                    r.status_code, r.reason)
+                raise requests.exceptions.RequestException(message,
+                                                           response=r)
+        except requests.exceptions.RequestException as e:
+            log.error(squash._describe_post_error(url, e))
+            raise e
+
+        return r
+
+
+async def dispatch_job(job, client=None,
+                       api_url='https://squash.lsst.codes/dashboard/api/',
+                       api_user=None, api_password=None, compress=None):
+    """POST a job to SQUASH asynchronously.
+
+    Parameters
+    ----------
+    job : `lsst.verify.Job`
+        The job.
+    client : `AsyncClient`, optional
+        Client to post the job with. By default, a client for ``api_url`` is
+        created and closed after the upload.
+    api_url : `str`, optional
+        Root URL of the SQUASH API server. Ignored if ``client`` is set.
+    api_user : `str`, optional
+        API username. Ignored if ``client`` is set.
+    api_password : `str`, optional
+        API password. Ignored if ``client`` is set.
+    compress : `bool`, optional
+        Compress the request body with gzip. See `lsst.verify.squash.post`.
+
+    Returns
+    -------
+    response : `_Response`
+        Response object.
+    """
+    if client is None:
+        async with AsyncClient(api_url, api_user=api_user,
+                               api_password=api_password) as client:
+            return await dispatch_job(job, client=client, compress=compress)
+
+    # Serialize off the event loop so other uploads can progress
+    loop = asyncio.get_running_loop()
+    json_doc = await loop.run_in_executor(None, job._get_dispatch_json)
+    return await client.post('jobs', json_doc=json_doc, compress=compress)
+
+
+async def _dispatch_many(jobs, client, max_concurrency, compress):
+    log = lsst.log.Log.getLogger('verify.asyncsquash.dispatch_many')
+
+    window = asyncio.Semaphore(max_concurrency)
+
+    async def dispatch(index, job):
+        async with window:
+            try:
+                if callable(job):
+                    # Load the job only now, off the event loop, so that
+                    # at most max_concurrency jobs are held at once
+                    loop = asyncio.get_running_loop()
+                    job = await loop.run_in_executor(None, job)
+                response = await dispatch_job(job, client=client,
+                                              compress=compress)
+            except Exception as e:
+                # A failed job doesn't stop the others
+                log.error('Job {0:d} upload failed: {1}'.format(index, e))
+                return DispatchResult(index, None, e)
+            log.info('Job {0:d} uploaded'.format(index))
+            return DispatchResult(index, response, None)
+
+    try:
+        return await asyncio.gather(*[dispatch(index, job)
+                                      for index, job in enumerate(jobs)])
+    finally:
+        await client.close()
+
+
+def dispatch_many(jobs, api_url='https://squash.lsst.codes/dashboard/api/',
+                  api_user=None, api_password=None, max_concurrency=4,
+                  transport=None, compress=None):
+    """POST several jobs to SQUASH concurrently.
+
+    Parameters
+    ----------
+    jobs : iterable of `lsst.verify.Job` or callable
+        The jobs, or functions that take no arguments and return a job. A
+        function is only called, in a worker thread, when its job's upload
+        starts, so that jobs can be loaded as they are uploaded rather than
+        all at once.
+    api_url : `str`, optional
+        Root URL of the SQUASH API server.
+    api_user : `str`, optional
+        API username.
+    api_password : `str`, optional
+        API password.
+    max_concurrency : `int`, optional
+        Maximum number of jobs uploaded at once.
+    transport : obj, optional
+        Transport shared by all uploads. See `AsyncClient`.
+    compress : `bool`, optional
+        Compress request bodies with gzip. See `lsst.verify.squash.post`.
+
+    Returns
+    -------
+    results : `list` of `DispatchResult`
+        Result of each job's upload, in the order of ``jobs``. Failed
+        uploads don't stop the others: their results have the exception
+        that was raised, such as a `requests.exceptions.RequestException`
+        or an error loading the job, as ``error``.
+    """
+    client = AsyncClient(api_url, api_user=api_user,
+                         api_password=api_password, transport=transport)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            _dispatch_many(jobs, client, max_concurrency, compress))
+    finally:
+        if hasattr(loop, 'shutdown_default_executor'):
+            loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
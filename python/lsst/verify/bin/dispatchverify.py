@@ -28,7 +28,12 @@ Job JSON files can be created by `lsst.verify.Job.write()` or
 measurements, associated blobs, and pipeline execution metadata. Individual
 LSST Science Pipelines tasks typically write separate JSON datasets. This
 command can collect and combine multiple Job JSON datasets into a single
-Job upload.
+Job upload. With ``--many``, each Job JSON dataset is instead uploaded as a
+separate Job, several at a time.
+
+With ``--spool``, Jobs are added to a durable local spool instead of being
+uploaded, so that a pipeline never waits on, or fails because of, the SQUASH
+service. ``dispatch_verify.py --drain`` later uploads the spooled Jobs.
 
 Configuration
 =============
@@ -56,8 +61,10 @@ Science Pipelines package metadata.
 from __future__ import print_function
 
 import argparse
+import functools
 import os
 import json
+import sys
 
 try:
     import git
@@ -66,7 +73,8 @@ except ImportError:
     git = None
 
 import lsst.log
-from lsst.verify import Job
+from lsst.verify import Job, MetricSet, SpecificationSet
+from lsst.verify.spool import drain
 from lsst.verify.metadata.lsstsw import LsstswRepos
 from lsst.verify.metadata.eupsmanifest import Manifest
 from lsst.verify.metadata.jenkinsci import get_jenkins_env
@@ -80,11 +88,12 @@ def parse_args():
 
     parser.add_argument(
         'json_paths',
-        nargs='+',
+        nargs='*',
         metavar='json',
         help='Verificaton job JSON file, or files. When multiple JSON '
              'files are present, their measurements, blobs, and metadata '
-             'are merged.')
+             'are merged, unless --many is set. Required unless --drain is '
+             'set.')
     parser.add_argument(
         '--test',
         default=False,
@@ -156,6 +165,75 @@ def parse_args():
         metavar='PASSWORD',
         help='Password for SQUASH API. Equivalent to the $SQUASH_PASSWORD '
              'environment variable.')
+    api_group.add_argument(
+        '--gzip',
+        dest='compress',
+        action='store_true',
+        default=False,
+        help='Compress the uploaded Job JSON with gzip even if the SQUASH '
+             'API does not advertise support for compressed uploads. '
+             'Equivalent to setting the $SQUASH_GZIP environment variable.')
+    api_group.add_argument(
+        '--stream',
+        dest='stream',
+        action='store_true',
+        default=False,
+        help='Serialize the Job JSON as it is uploaded, with chunked '
+             'transfer encoding, instead of building the whole request in '
+             'memory first.')
+    api_group.add_argument(
+        '--chunked',
+        dest='chunked',
+        action='store_true',
+        default=False,
+        help='Upload blobs and measurements in bounded-size chunks, '
+             'resuming any earlier interrupted upload of the same Job, '
+             'before uploading the Job metadata. Recommended for large '
+             'Jobs. Not compatible with --stream.')
+    api_group.add_argument(
+        '--many',
+        dest='many',
+        action='store_true',
+        default=False,
+        help='Upload each JSON file as a separate Job instead of merging '
+             'them. Jobs are uploaded concurrently over shared connections, '
+             'and the result of each upload is reported. Not compatible '
+             'with --write, --chunked or --stream. Requires Python 3.7 or '
+             'later.')
+    api_group.add_argument(
+        '--concurrency',
+        dest='concurrency',
+        type=int,
+        default=4,
+        metavar='N',
+        help='Maximum number of Jobs uploaded at once with --many or '
+             '--drain. Default is 4.')
+
+    spool_group = parser.add_argument_group('Spool arguments')
+    spool_group.add_argument(
+        '--spool',
+        dest='spool',
+        action='store_true',
+        default=False,
+        help='Add the Job (or, with --many, each Job) to the upload spool '
+             'instead of uploading it. SQUASH credentials are not required. '
+             'Not compatible with --chunked or --stream.')
+    spool_group.add_argument(
+        '--drain',
+        dest='drain',
+        action='store_true',
+        default=False,
+        help='Upload the Jobs in the upload spool, instead of Job JSON '
+             'files. Uploaded Jobs are removed from the spool, and Jobs '
+             'identical to a Job uploaded in the last 30 days are not '
+             'uploaded again.')
+    spool_group.add_argument(
+        '--spool-dir',
+        dest='spool_dir',
+        metavar='PATH',
+        help='Upload spool directory. Equivalent to the '
+             '$LSST_VERIFY_SPOOL_DIR environment variable. Default is '
+             '$XDG_DATA_HOME/lsst_verify/spool.')
     return parser.parse_args()
 
 
@@ -168,14 +246,16 @@ def main():
     config = Configuration(args)
     log.debug(str(config))
 
+    if config.drain:
+        main_drain(config)
+        return
+
+    if config.many:
+        main_many(config)
+        return
+
     # Parse all Job JSON
-    jobs = []
-    for json_path in config.json_paths:
-        log.info('Loading {0}'.format(json_path))
-        with open(json_path) as fp:
-            json_data = json.load(fp)
-        job = Job.deserialize(**json_data)
-        jobs.append(job)
+    jobs = [load_job(json_path) for json_path in config.json_paths]
 
     # Merge all Jobs into one
     job = jobs.pop(0)
@@ -184,9 +264,156 @@ def main():
     for other_job in jobs:
         job += other_job
 
+    job = enrich_job(job, config)
+
+    # Upload job
+    if config.spool and not config.test:
+        content_hash = job.dispatch(spool=True, spool_dir=config.spool_dir)
+        log.info('Spooled Job {0}.'.format(content_hash))
+    elif not config.test:
+        log.info('Uploading Job JSON to {0}.'.format(config.api_url))
+        dispatch_kwargs = {'compress': config.compress}
+        if config.chunked:
+            dispatch_kwargs['chunked'] = True
+        else:
+            dispatch_kwargs['stream'] = config.stream
+        job.dispatch(api_user=config.api_user,
+                     api_password=config.api_password,
+                     api_url=config.api_url,
+                     **dispatch_kwargs)
+
+    if config.show_json:
+        print(json.dumps(job.json,
+                         sort_keys=True, indent=4, separators=(',', ': ')))
+
+    # Write a json file
+    if config.output_filepath is not None:
+        log.info('Writing Job JSON to {0}.'.format(config.output_filepath))
+        job.write(config.output_filepath)
+
+
+def load_job(json_path):
+    """Load a Job from a JSON file."""
+    log = lsst.log.Log.getLogger('verify.bin.dispatchverify.load_job')
+
+    log.info('Loading {0}'.format(json_path))
+    with open(json_path) as fp:
+        json_data = json.load(fp)
+    return Job.deserialize(**json_data)
+
+
+def main_many(config):
+    """Enrich and upload each of several Jobs, concurrently, reporting the
+    result of each upload (``dispatch_verify.py --many``).
+
+    Each Job is loaded and enriched only when its upload starts, so at most
+    ``--concurrency`` Jobs are held in memory at once. The verify_metrics
+    package is loaded once, and its metrics and specifications are shared
+    by all Jobs. Exits with status 1 if any Job failed to load or upload.
+    """
+    # asyncsquash uses Python 3 syntax
+    from lsst.verify.asyncsquash import dispatch_many
+
+    log = lsst.log.Log.getLogger('verify.bin.dispatchverify.main_many')
+
+    log.info('Loading metric definitions from verify_metrics')
+    metrics = MetricSet.load_metrics_package('verify_metrics')
+    specs = SpecificationSet.load_metrics_package('verify_metrics')
+
+    def prepare_job(json_path):
+        job = enrich_job(load_job(json_path), config,
+                         metrics=metrics, specs=specs)
+        if config.show_json:
+            print(json.dumps(job.json,
+                             sort_keys=True, indent=4, separators=(',', ': ')))
+        return job
+
+    if config.test or config.spool:
+        for json_path in config.json_paths:
+            job = prepare_job(json_path)
+            if not config.test:
+                content_hash = job.dispatch(spool=True,
+                                            spool_dir=config.spool_dir)
+                log.info('Spooled Job {0}.'.format(content_hash))
+        return
+
+    log.info('Uploading {0:d} Jobs to {1}.'.format(len(config.json_paths),
+                                                   config.api_url))
+    results = dispatch_many([functools.partial(prepare_job, json_path)
+                             for json_path in config.json_paths],
+                            api_url=config.api_url,
+                            api_user=config.api_user,
+                            api_password=config.api_password,
+                            max_concurrency=config.concurrency,
+                            compress=config.compress)
+
+    failed = 0
+    for json_path, result in zip(config.json_paths, results):
+        if result.error is None:
+            print('{0}: uploaded (status {1:d})'.format(
+                json_path, result.response.status_code))
+        else:
+            failed += 1
+            print('{0}: failed ({1})'.format(json_path, result.error))
+    print('Uploaded {0:d} of {1:d} Jobs.'.format(
+        len(results) - failed, len(results)))
+    if failed:
+        sys.exit(1)
+
+
+def main_drain(config):
+    """Upload the Jobs in the upload spool (``dispatch_verify.py --drain``).
+
+    Exits with status 1 if any upload failed.
+    """
+    log = lsst.log.Log.getLogger('verify.bin.dispatchverify.main_drain')
+
+    log.info('Uploading spooled Jobs to {0}.'.format(config.api_url))
+    result = drain(config.api_url,
+                   api_user=config.api_user,
+                   api_password=config.api_password,
+                   spool_dir=config.spool_dir,
+                   max_concurrency=config.concurrency,
+                   compress=config.compress)
+
+    print('Uploaded {0:d} Jobs ({1:d} already uploaded); {2:d} failed.'.format(
+        len(result.uploaded), len(result.duplicates), len(result.failed)))
+    if result.failed:
+        sys.exit(1)
+
+
+def enrich_job(job, config, metrics=None, specs=None):
+    """Refresh a Job's metric definitions and insert metadata from the
+    environment.
+
+    Parameters
+    ----------
+    job : `lsst.verify.Job`
+        Job to enrich.
+    config : `Configuration`
+        Configuration of the command.
+    metrics : `lsst.verify.MetricSet`, optional
+        Metrics loaded from verify_metrics, which are added to the Job
+        without being modified. If `None`, verify_metrics is loaded again
+        for this Job.
+    specs : `lsst.verify.SpecificationSet`, optional
+        Specifications loaded from verify_metrics, used with ``metrics``.
+
+    Returns
+    -------
+    job : `lsst.verify.Job`
+        The enriched Job.
+    """
+    log = lsst.log.Log.getLogger('verify.bin.dispatchverify.enrich_job')
+
     # Ensure all measurements have a metric so that units are normalized
-    log.info('Refreshing metric definitions from verify_metrics')
-    job.reload_metrics_package('verify_metrics')
+    if metrics is None:
+        log.info('Refreshing metric definitions from verify_metrics')
+        job.reload_metrics_package('verify_metrics')
+    else:
+        job.metrics.update(metrics)
+        job.specs.update(specs)
+        job.measurements.refresh_metrics(job.metrics)
 
     # Insert package metadata from lsstsw
     if not config.ignore_lsstsw:
@@ -203,21 +430,7 @@ def main():
         log.info('Inserting Jenkins CI environment metadata.')
         job = insert_jenkins_metadata(job, config)
 
-    # Upload job
-    if not config.test:
-        log.info('Uploading Job JSON to {0}.'.format(config.api_url))
-        job.dispatch(api_user=config.api_user,
-                     api_password=config.api_password,
-                     api_url=config.api_url)
-
-    if config.show_json:
-        print(json.dumps(job.json,
-                         sort_keys=True, indent=4, separators=(',', ': ')))
-
-    # Write a json file
-    if config.output_filepath is not None:
-        log.info('Writing Job JSON to {0}.'.format(config.output_filepath))
-        job.write(config.output_filepath)
+    return job
 
 
 def insert_lsstsw_metadata(job, config):
@@ -303,7 +516,15 @@ class Configuration(object):
     allowed_env = ('jenkins',)
 
     def __init__(self, args):
+        self.drain = args.drain
+
         self.json_paths = args.json_paths
+        if self.drain and self.json_paths:
+            message = '--drain cannot be used with Job JSON files'
+            raise RuntimeError(message)
+        if not self.drain and not self.json_paths:
+            message = 'At least one Job JSON file is required'
+            raise RuntimeError(message)
 
         self.test = args.test
 
@@ -321,7 +542,9 @@ class Configuration(object):
         self.lsstsw = args.lsstsw or os.getenv('LSSTSW')
         if self.lsstsw is not None:
             self.lsstsw = os.path.abspath(self.lsstsw)
-        if not self.ignore_lsstsw and not os.path.isdir(self.lsstsw):
+        # Jobs aren't enriched when draining the spool
+        if not (self.ignore_lsstsw or self.drain) and \
+                not os.path.isdir(self.lsstsw):
             message = 'lsstsw directory not found at {0}'.format(self.lsstsw)
             raise RuntimeError(message)
 
@@ -338,17 +561,58 @@ class Configuration(object):
         default_url = 'https://squash.lsst.codes/dashboard/api'
         self.api_url = args.api_url or os.getenv('SQUASH_URL', default_url)
 
+        self.spool = args.spool
+        self.spool_dir = args.spool_dir
+        # Spooled Jobs are uploaded by --drain, which requires credentials
+        upload = not (self.test or self.spool)
+
         self.api_user = args.api_user or os.getenv('SQUASH_USER')
-        if not self.test and self.api_user is None:
+        if upload and self.api_user is None:
                 message = '--user or $SQUASH_USER configuration required'
                 raise RuntimeError(message)
 
         self.api_password = args.api_password or os.getenv('SQUASH_password')
-        if not self.test and self.api_password is None:
+        if upload and self.api_password is None:
                 message = ('--password or $SQUASH_password configuration '
                            'required')
                 raise RuntimeError(message)
 
+        # Compress if forced, otherwise if the SQUASH API supports it
+        if args.compress or os.getenv('SQUASH_GZIP'):
+            self.compress = True
+        else:
+            self.compress = None
+
+        self.stream = args.stream
+
+        self.chunked = args.chunked
+        if self.chunked and self.stream:
+            message = '--chunked and --stream cannot be used together'
+            raise RuntimeError(message)
+
+        self.many = args.many
+        incompatible = (self.output_filepath is not None, self.chunked,
+                        self.stream)
+        if self.many and any(incompatible):
+            message = ('--many cannot be used with --write, --chunked or '
+                       '--stream')
+            raise RuntimeError(message)
+        if self.many and sys.version_info < (3, 7):
+            message = '--many requires Python 3.7 or later'
+            raise RuntimeError(message)
+
+        if self.spool and (self.chunked or self.stream):
+            message = '--spool cannot be used with --chunked or --stream'
+            raise RuntimeError(message)
+        if self.spool and self.drain:
+            message = '--spool and --drain cannot be used together'
+            raise RuntimeError(message)
+
+        self.concurrency = args.concurrency
+        if self.concurrency < 1:
+            message = '--concurrency must be at least 1'
+            raise RuntimeError(message)
+
     def __str__(self):
         configs = {
             'json_paths': self.json_paths,
@@ -361,6 +625,14 @@ class Configuration(object):
             'extra_package_paths': self.extra_package_paths,
             'api_url': self.api_url,
             'api_user': self.api_user,
+            'compress': self.compress,
+            'stream': self.stream,
+            'chunked': self.chunked,
+            'many': self.many,
+            'concurrency': self.concurrency,
+            'spool': self.spool,
+            'drain': self.drain,
+            'spool_dir': self.spool_dir,
         }
         if self.api_password is None:
             configs['api_password'] = None
@@ -22,7 +22,7 @@
 #
 from __future__ import print_function, division
 
-__all__ = ['Blob']
+__all__ = ['Blob', 'register_blob_type']
 
 from past.builtins import basestring
 
@@ -32,6 +32,33 @@ from .jsonmixin import JsonSerializationMixin
 from .datum import Datum
 
 
+# Blob subclasses, keyed by their ``type``, that Blob.deserialize can
+# dispatch serialized blobs to.
+_BLOB_TYPES = {}
+
+
+def register_blob_type(blob_class):
+    """Register a `Blob` subclass so that serialized blobs of its ``type``
+    are deserialized as instances of that class.
+
+    Parameters
+    ----------
+    blob_class : `Blob`-type class
+        A `Blob` subclass with a ``type`` class attribute. This function can
+        be used as a class decorator.
+
+    Returns
+    -------
+    blob_class : `Blob`-type class
+        The class, unchanged.
+    """
+    if blob_class.type is None:
+        message = 'Blob class {0!r} does not define a type'
+        raise TypeError(message.format(blob_class))
+    _BLOB_TYPES[blob_class.type] = blob_class
+    return blob_class
+
+
 class Blob(JsonSerializationMixin):
     """Blobs is a flexible container of data, as Datums, that are serializable
     to JSON.
@@ -50,6 +77,17 @@ class Blob(JsonSerializationMixin):
         Datum-types. Each `Datum` can be later retrived from the Blob by key.
     """
 
+    type = None
+    """Name of a specialized blob type (`str`), or `None` for generic blobs.
+
+    Specialized blob classes are registered with `register_blob_type` and
+    include their ``type`` in their JSON serialization so they can be
+    deserialized as the same class.
+    """
+
+    mergeable = False
+    """`True` if blobs of this class support `merge` (`bool`)."""
+
     def __init__(self, name, **datums):
         # Internal read-only instance ID, access with the name attribute
         self._id = uuid.uuid4().hex
@@ -76,7 +114,7 @@ class Blob(JsonSerializationMixin):
         return self._id
 
     @classmethod
-    def deserialize(cls, identifier=None, name=None, data=None):
+    def deserialize(cls, identifier=None, name=None, data=None, type=None):
         """Deserialize fields from a blob JSON object into a `Blob` instance.
 
         Parameters
@@ -87,6 +125,10 @@ class Blob(JsonSerializationMixin):
             Name of the blob type.
         data : `dict`
             Dictionary of named ``name: datum object`` key-value pairs.
+        type : `str`, optional
+            Type of a specialized blob, such as ``'histogram'``. If set, the
+            blob is deserialized by the `Blob` subclass registered for that
+            type.
 
         Returns
         -------
@@ -104,6 +146,15 @@ class Blob(JsonSerializationMixin):
         >>> json_data = blob.json
         >>> new_blob = Blob.deserialize(**json_data)
         """
+        if type is not None and type != cls.type:
+            try:
+                blob_class = _BLOB_TYPES[type]
+            except KeyError:
+                message = 'Unknown blob type {0!r}'.format(type)
+                raise TypeError(message)
+            return blob_class.deserialize(identifier=identifier, name=name,
+                                          data=data, type=type)
+
         datums = {}
         if data is not None:
             for datum_key, datum_doc in data.items():
@@ -120,8 +171,33 @@ class Blob(JsonSerializationMixin):
             'identifier': self.identifier,
             'name': self.name,
             'data': self._datums})
+        if self.type is not None:
+            json_doc['type'] = self.type
         return json_doc
 
+    def merge(self, other):
+        """Merge the data of another blob into this one.
+
+        Only blob classes with ``mergeable = True`` implement merging.
+
+        Parameters
+        ----------
+        other : `Blob`
+            Another blob of the same type.
+
+        Returns
+        -------
+        self : `Blob`
+            This blob, updated in place.
+
+        Raises
+        ------
+        NotImplementedError
+            Raised for blob types that do not support merging.
+        """
+        message = 'Blobs of type {0!r} cannot be merged'
+        raise NotImplementedError(message.format(self.type))
+
     def __setitem__(self, key, value):
         if not isinstance(key, basestring):
             message = 'Key {0!r} is not a string.'.format(key)
@@ -123,6 +123,26 @@ class BlobSet(JsonSerializationMixin):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __iadd__(self, other):
+        """Merge another `BlobSet` into this one.
+
+        Parameters
+        ----------
+        other : `BlobSet`
+            Another `BlobSet`.
+
+        Returns
+        -------
+        self : `BlobSet`
+            This `BlobSet`.
+
+        Notes
+        -----
+        Equivalent to `update`.
+        """
+        self.update(other)
+        return self
+
     def __str__(self):
         count = len(self)
         if count == 0:
@@ -161,6 +181,47 @@ class BlobSet(JsonSerializationMixin):
         """Insert a blob into the set."""
         self[blob.identifier] = blob
 
+    def update(self, other):
+        """Merge another `BlobSet` into this one.
+
+        Parameters
+        ----------
+        other : `BlobSet`
+            Another `BlobSet`. Blobs in ``other`` are added to this set.
+            If this set already has a mergeable blob (see `Blob.mergeable`)
+            with the same name and type as a blob in ``other``, the blob in
+            ``other`` is merged into it (`Blob.merge`) instead.
+        """
+        for _, blob in other.items():
+            self.merge_blob(blob)
+
+    def merge_blob(self, blob):
+        """Merge a blob into the set.
+
+        Parameters
+        ----------
+        blob : `Blob`
+            A blob. If the set already has a mergeable blob with the same
+            name and type, ``blob`` is merged into that existing blob.
+            Otherwise ``blob`` is inserted.
+
+        Returns
+        -------
+        blob : `Blob`
+            The blob now held by the set under ``blob.name``; either the
+            existing (merged) blob or ``blob`` itself.
+        """
+        if blob.name in self._name_map:
+            existing = self[blob.name]
+            if existing is blob:
+                return existing
+            if existing.mergeable and type(existing) is type(blob):
+                existing.merge(blob)
+                return existing
+
+        self.insert(blob)
+        return blob
+
     @property
     def json(self):
         """A `dict` that can be serialized as JSON."""
@@ -0,0 +1,229 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+from __future__ import print_function, division
+
+__all__ = ['HistogramBlob']
+
+import numpy as np
+import astropy.units as u
+
+from .blob import Blob, register_blob_type
+from .datum import Datum
+
+
+@register_blob_type
+class HistogramBlob(Blob):
+    """A mergeable histogram with fixed bin edges.
+
+    Histograms made with the same bin edges can be merged, in any order, by
+    adding their counts. This makes `HistogramBlob` useful for combining
+    distributions measured in many independent jobs (such as per-CCD
+    processing) into a single distribution without retaining the raw values.
+
+    Parameters
+    ----------
+    name : `str`
+        Name of the blob.
+    edges : `astropy.units.Quantity` or sequence
+        Monotonically increasing bin edges. There are ``len(edges) - 1`` bins.
+    counts : sequence of `int`, optional
+        Initial counts in each bin. Counts are zero by default.
+    unit : `str`, optional
+        Units of ``edges``, if ``edges`` is not an `astropy.units.Quantity`.
+    label : `str`, optional
+        Label for the histogram's values, suitable for plot axes.
+    description : `str`, optional
+        Extended description of the histogram.
+
+    Examples
+    --------
+    >>> import astropy.units as u
+    >>> hist = HistogramBlob('residuals', [0., 1., 2., 3.] * u.mmag)
+    >>> hist.fill([0.5, 1.5, 1.7, 5.] * u.mmag)
+    >>> hist.counts.tolist()
+    [1, 2, 0]
+    >>> hist.overflow
+    1
+    """
+
+    type = 'histogram'
+
+    mergeable = True
+
+    def __init__(self, name, edges, counts=None, unit=None, label=None,
+                 description=None):
+        Blob.__init__(self, name)
+
+        if not isinstance(edges, u.Quantity):
+            edges = u.Quantity(edges, unit=unit or '')
+        edges = edges.astype(np.float64)
+        if edges.ndim != 1 or len(edges) < 2:
+            raise ValueError('edges must be a 1-D sequence of at least '
+                             'two values')
+        if np.any(np.diff(edges.value) <= 0):
+            raise ValueError('edges must be monotonically increasing')
+
+        if counts is None:
+            counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        else:
+            counts = np.asarray(counts, dtype=np.int64)
+        if counts.shape != (len(edges) - 1,):
+            message = 'Expected {0:d} counts, got shape {1!r}'
+            raise ValueError(message.format(len(edges) - 1, counts.shape))
+
+        self['edges'] = Datum(edges, label=label, description=description)
+        self._set_counts(counts, 0, 0)
+
+    @classmethod
+    def deserialize(cls, identifier=None, name=None, data=None, type=None):
+        """Deserialize fields from a histogram blob JSON object into a
+        `HistogramBlob` instance.
+
+        Parameters
+        ----------
+        identifier : `str`
+            Blob identifier.
+        name : `str`
+            Name of the blob.
+        data : `dict`
+            Dictionary of serialized datums, including ``edges``,
+            ``counts``, ``underflow`` and ``overflow``.
+        type : `str`, optional
+            Blob type; always ``'histogram'``.
+
+        Returns
+        -------
+        blob : `HistogramBlob`
+            The deserialized histogram.
+        """
+        edges = Datum.deserialize(**data['edges'])
+        counts = Datum.deserialize(**data['counts'])
+        instance = cls(name, edges.quantity,
+                       counts=counts.quantity.value,
+                       label=edges.label,
+                       description=edges.description)
+        instance._set_counts(instance.counts,
+                             data['underflow']['value'],
+                             data['overflow']['value'])
+        instance._id = identifier
+        return instance
+
+    def _set_counts(self, counts, underflow, overflow):
+        self['counts'] = Datum(u.Quantity(counts, dtype=np.int64),
+                               label='counts')
+        self['underflow'] = Datum(int(underflow), label='underflow')
+        self['overflow'] = Datum(int(overflow), label='overflow')
+
+    @property
+    def edges(self):
+        """Bin edges (`astropy.units.Quantity`)."""
+        return self['edges'].quantity
+
+    @property
+    def counts(self):
+        """Counts in each bin (`numpy.ndarray` of `int`)."""
+        return self['counts'].quantity.value.astype(np.int64)
+
+    @property
+    def underflow(self):
+        """Number of values below the lowest bin edge (`int`)."""
+        return self['underflow'].quantity
+
+    @property
+    def overflow(self):
+        """Number of values above the highest bin edge (`int`)."""
+        return self['overflow'].quantity
+
+    @property
+    def total(self):
+        """Total number of values filled, including underflows and
+        overflows (`int`).
+        """
+        return int(self.counts.sum()) + self.underflow + self.overflow
+
+    def fill(self, values):
+        """Add values to the histogram.
+
+        Parameters
+        ----------
+        values : `astropy.units.Quantity` or sequence
+            Values to add. Units must be compatible with `edges`. Non-finite
+            values are ignored.
+
+        Notes
+        -----
+        Bins are closed on their lower edge, except for the last bin, which
+        is also closed on its upper edge (the `numpy.histogram` convention).
+        """
+        if not isinstance(values, u.Quantity):
+            values = u.Quantity(values, unit=u.dimensionless_unscaled)
+        values = np.atleast_1d(values.to(self.edges.unit).value)
+        values = values[np.isfinite(values)]
+
+        edges = self.edges.value
+        new_counts, _ = np.histogram(values, bins=edges)
+        underflow = int(np.count_nonzero(values < edges[0]))
+        overflow = int(np.count_nonzero(values > edges[-1]))
+
+        self._set_counts(self.counts + new_counts,
+                         self.underflow + underflow,
+                         self.overflow + overflow)
+
+    def merge(self, other):
+        """Merge the counts of another histogram into this one.
+
+        Parameters
+        ----------
+        other : `HistogramBlob`
+            Another histogram with the same bin edges.
+
+        Returns
+        -------
+        self : `HistogramBlob`
+            This histogram, updated in place.
+
+        Raises
+        ------
+        TypeError
+            Raised if ``other`` is not a `HistogramBlob`.
+        ValueError
+            Raised if the histograms have different bin edges.
+        """
+        if not isinstance(other, HistogramBlob):
+            message = 'Cannot merge {0!r} into a HistogramBlob'
+            raise TypeError(message.format(other))
+
+        try:
+            other_edges = other.edges.to(self.edges.unit)
+        except u.UnitConversionError:
+            message = 'Histogram {0!r} has edges with incompatible units'
+            raise ValueError(message.format(other.name))
+        if other_edges.shape != self.edges.shape or \
+                not np.allclose(other_edges.value, self.edges.value):
+            message = 'Histogram {0!r} has different bin edges'
+            raise ValueError(message.format(other.name))
+
+        self._set_counts(self.counts + other.counts,
+                         self.underflow + other.underflow,
+                         self.overflow + other.overflow)
+        return self
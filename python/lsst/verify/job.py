@@ -24,15 +24,19 @@ from __future__ import print_function, division
 
 __all__ = ['Job']
 
+import copy
 import json
 import os
+import sys
 
 from .blobset import BlobSet
 from .jobmetadata import Metadata
 from .jsonmixin import JsonSerializationMixin
 from .measurementset import MeasurementSet
 from .metricset import MetricSet
+from .packagecache import _get_package_dir, package_registry
 from .specset import SpecificationSet
+from .spool import enqueue
 from . import squash
 
 
@@ -74,7 +78,8 @@ class Job(JsonSerializationMixin):
 
     @classmethod
     def load_metrics_package(cls, package_name_or_path='verify_metrics',
-                             subset=None, measurements=None, meta=None):
+                             subset=None, measurements=None, meta=None,
+                             lazy=False, processes=None):
         """Create a Job with metrics and specifications pre-loaded from a
         Verification Framework metrics package.
 
@@ -95,6 +100,14 @@ class Job(JsonSerializationMixin):
         meta : `dict`, optional
             Optional dictionary of metadata key-value entries to include
             in the Job.
+        lazy : `bool`, optional
+            If `True`, each package's metrics and specifications are only
+            loaded when they're first needed. See
+            `MetricSet.load_metrics_package` and
+            `SpecificationSet.load_metrics_package`. Default is `False`.
+        processes : `int`, optional
+            Number of worker processes used to parse YAML files. Files are
+            parsed serially by default.
 
         Returns
         -------
@@ -103,10 +116,10 @@ class Job(JsonSerializationMixin):
         """
         metrics = MetricSet.load_metrics_package(
             package_name_or_path=package_name_or_path,
-            subset=subset)
+            subset=subset, lazy=lazy, processes=processes)
         specs = SpecificationSet.load_metrics_package(
             package_name_or_path=package_name_or_path,
-            subset=subset)
+            subset=subset, lazy=lazy, processes=processes)
         instance = cls(measurements=measurements, metrics=metrics, specs=specs,
                        meta=meta)
         return instance
@@ -187,7 +200,19 @@ class Job(JsonSerializationMixin):
     @property
     def json(self):
         """`Job` data as a JSON-serialiable `dict`."""
-        # Gather blobs from all measurements
+        doc = JsonSerializationMixin.jsonify_dict({
+            'measurements': self._meas_set,
+            'blobs': self._gather_serialized_blobs(),
+            'metrics': self._metric_set,
+            'specs': self._spec_set,
+            'meta': self._meta
+        })
+        return doc
+
+    def _gather_serialized_blobs(self):
+        """Gather the blobs of all measurements that are serialized with
+        this job into a `BlobSet`.
+        """
         blob_set = BlobSet()
         for name, measurement in self._meas_set.items():
             for blob_name, blob in measurement.blobs.items():
@@ -195,15 +220,23 @@ class Job(JsonSerializationMixin):
                     # Don't serialize empty 'extras' blobs
                     continue
                 blob_set.insert(blob)
+        return blob_set
 
-        doc = JsonSerializationMixin.jsonify_dict({
-            'measurements': self._meas_set,
-            'blobs': blob_set,
-            'metrics': self._metric_set,
-            'specs': self._spec_set,
-            'meta': self._meta
-        })
-        return doc
+    def _gather_blobs(self):
+        """Gather the mergeable blobs linked to this job's measurements.
+
+        Returns
+        -------
+        blobs : `dict`
+            Mergeable blobs, keyed by ``(metric name, blob name)`` tuples.
+            Blob names are only unique within a measurement.
+        """
+        blobs = {}
+        for name, measurement in self._meas_set.items():
+            for blob_name, blob in measurement.blobs.items():
+                if blob.mergeable:
+                    blobs[(str(name), blob_name)] = blob
+        return blobs
 
     def __eq__(self, other):
         if self.measurements != other.measurements:
@@ -235,8 +268,37 @@ class Job(JsonSerializationMixin):
         -------
         self : `Job`
             This `Job` instance.
+
+        Notes
+        -----
+        Measurements in ``other`` replace measurements of the same metric in
+        this job. Mergeable blobs (see `lsst.verify.Blob.mergeable`), such as
+        `lsst.verify.HistogramBlob` and `lsst.verify.SketchBlob`, that are
+        linked under the same name to measurements of the same metric in
+        both jobs are merged rather than replaced, so that per-CCD
+        distributions combine into a single distribution. Blobs are merged
+        into copies, so this job is unchanged if a merge fails.
         """
+        # Merge copies of mergeable blobs (such as HistogramBlob) that the
+        # same metric's measurements link under the same name, before
+        # changing anything, so that a failed merge leaves this job intact.
+        blobs = self._gather_blobs()
+        merged_blobs = {}
+        merges = {}
+        for key, other_blob in other._gather_blobs().items():
+            blob = blobs.get(key)
+            if blob is None or type(blob) is not type(other_blob):
+                continue
+            # A blob shared by several measurements is merged once
+            pair = (id(blob), id(other_blob))
+            if pair not in merges:
+                merges[pair] = copy.deepcopy(blob).merge(other_blob)
+            merged_blobs[key] = merges[pair]
+
         self.measurements.update(other.measurements)
+        for (metric_name, blob_name), blob in merged_blobs.items():
+            self.measurements[metric_name].blobs[blob_name] = blob
+
         self.metrics.update(other.metrics)
         self.specs.update(other.specs)
         self.meta.update(other.meta)
@@ -269,10 +331,16 @@ class Job(JsonSerializationMixin):
         normalized into the units of the metric definition when a Job is
         serialized.
 
+        The package's YAML files are always read again: the package is
+        dropped from `lsst.verify.packagecache.package_registry` before it is
+        loaded, so edits to the package since it was last loaded in this
+        process are picked up.
+
         See also
         --------
         MeasurementSet.refresh_metrics
         """
+        package_registry.invalidate(_get_package_dir(package_name_or_path))
         metrics = MetricSet.load_metrics_package(
             package_name_or_path=package_name_or_path,
             subset=subset)
@@ -284,7 +352,33 @@ class Job(JsonSerializationMixin):
         self.specs.update(specs)
 
         # Insert mertics into measurements
-        self.measurements.refresh_metrics(metrics)
+        self.measurements.refresh_metrics(self.metrics)
+
+    def refresh_metrics_package(self):
+        """Reload metric and specification definitions from the YAML files
+        of the metrics package that were modified since they were loaded.
+
+        Returns
+        -------
+        changed : `list` of `str`
+            Paths of the YAML files that changed.
+
+        Notes
+        -----
+        Only changed files are parsed again, and only the affected part of
+        the specification inheritance graph is resolved again (see
+        `MetricSet.refresh` and `SpecificationSet.refresh`). This is much
+        faster than `reload_metrics_package` when iterating on a metrics
+        package in a long-lived process. Refreshed metrics are attached to
+        `Job.measurements` items.
+        """
+        changed = self.metrics.refresh()
+        changed.extend(self.specs.refresh())
+
+        if len(changed) > 0:
+            self.measurements.refresh_metrics(self.metrics)
+
+        return changed
 
     def write(self, filename):
         """Write a JSON serialization to the filesystem.
@@ -308,7 +402,7 @@ class Job(JsonSerializationMixin):
 
     def dispatch(self, api_user=None, api_password=None,
                  api_url='https://squash.lsst.codes/dashboard/api/',
-                 **kwargs):
+                 chunked=False, spool=False, spool_dir=None, **kwargs):
         """POST the job to SQUASH, LSST Data Management's metric dashboard.
 
         Parameters
@@ -319,17 +413,109 @@ class Job(JsonSerializationMixin):
             API username.
         api_password : `str`, optional
             API password.
+        chunked : `bool`, optional
+            Upload blobs, then measurements, in bounded-size chunks before
+            posting the job's metadata, with
+            `lsst.verify.squash.post_chunked`. Use this for large jobs.
+            Default is `False`.
+        spool : `bool`, optional
+            Instead of posting the job, add it to the durable upload spool
+            with `lsst.verify.spool.enqueue`, without using the network.
+            Spooled jobs are uploaded by `lsst.verify.spool.drain`, or by
+            ``dispatch_verify.py --drain``. Default is `False`.
+        spool_dir : `str`, optional
+            Spool directory, if ``spool`` is `True`. The value of
+            `lsst.verify.spool.get_spool_dir` is used by default.
         **kwargs : optional
-            Additional keyword arguments passed to `lsst.verify.squash.post`.
+            Additional keyword arguments passed to `lsst.verify.squash.post`,
+            or to `lsst.verify.squash.post_chunked` if ``chunked`` is `True`.
+
+        Returns
+        -------
+        content_hash : `str` or `None`
+            If ``spool`` is `True`, the content hash that identifies the
+            spooled job. `None` otherwise.
         """
-        full_json_doc = self.json
-        # subset JSON to just the 'job' fields; no metrics and specs
-        job_json = {k: full_json_doc[k]
-                    for k in ('measurements', 'blobs', 'meta')}
-        squash.post(api_url, 'jobs', json_doc=job_json,
+        if spool:
+            return enqueue(self._get_dispatch_json(), spool_dir=spool_dir)
+
+        if chunked:
+            blob_set = self._gather_serialized_blobs()
+            chunked_items = [
+                ('blobs', (blob.json for _, blob in blob_set.items())),
+                ('measurements',
+                 (meas.json for _, meas in self._meas_set.items()))]
+            squash.post_chunked(api_url, 'jobs',
+                                json_doc={'meta': self._meta.json},
+                                chunked_items=chunked_items,
+                                api_user=api_user, api_password=api_password,
+                                **kwargs)
+            return
+
+        squash.post(api_url, 'jobs', json_doc=self._get_dispatch_json(),
                     api_user=api_user, api_password=api_password,
                     **kwargs)
 
+    def dispatch_async(self, api_user=None, api_password=None,
+                       api_url='https://squash.lsst.codes/dashboard/api/',
+                       client=None, **kwargs):
+        """POST the job to SQUASH asynchronously.
+
+        This method requires Python 3.7 or later.
+
+        Parameters
+        ----------
+        api_url : `str`, optional
+            Root URL of the SQUASH API server. Ignored if ``client`` is set.
+        api_user : `str`, optional
+            API username. Ignored if ``client`` is set.
+        api_password : `str`, optional
+            API password. Ignored if ``client`` is set.
+        client : `lsst.verify.asyncsquash.AsyncClient`, optional
+            Client to post the job with, which can be shared by several
+            uploads. By default, a client is created for this upload.
+        **kwargs : optional
+            Additional keyword arguments passed to
+            `lsst.verify.asyncsquash.dispatch_job`.
+
+        Returns
+        -------
+        coroutine
+            Coroutine that uploads the job and returns the response.
+
+        Raises
+        ------
+        RuntimeError
+            Raised on versions of Python earlier than 3.7.
+
+        See also
+        --------
+        lsst.verify.asyncsquash.dispatch_many
+        """
+        if sys.version_info < (3, 7):
+            raise RuntimeError('Job.dispatch_async requires Python 3.7 or '
+                               'later')
+        # asyncsquash uses Python 3 syntax
+        from .asyncsquash import dispatch_job
+        return dispatch_job(self, client=client, api_url=api_url,
+                            api_user=api_user, api_password=api_password,
+                            **kwargs)
+
+    def _get_dispatch_json(self):
+        """Get the JSON document uploaded to SQUASH by `dispatch`: the job's
+        measurements, blobs and metadata, without metrics and
+        specifications.
+
+        The document is built directly rather than from `json`, so the
+        job's specifications are neither serialized nor loaded (if they are
+        lazily loaded).
+        """
+        return JsonSerializationMixin.jsonify_dict({
+            'measurements': self._meas_set,
+            'blobs': self._gather_serialized_blobs(),
+            'meta': self._meta
+        })
+
     def report(self, name=None, spec_tags=None, metric_tags=None):
         """Create a verification report that lists the pass/fail status of
         measurements against specifications in this job.
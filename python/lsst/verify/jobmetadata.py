@@ -24,18 +24,8 @@ from __future__ import print_function
 
 __all__ = ['Metadata']
 
-# Get ChainMap backport
-from future.standard_library import install_aliases
-install_aliases()  # noqa: E402
-
-try:
-    from collections import ChainMap
-except ImportError:
-    # future 0.16.0 doesn't do the import right; this will be fixed in 0.16.1
-    # https://github.com/PythonCharmers/python-future/issues/226
-    from future.backports.misc import ChainMap
+from collections import OrderedDict
 import json
-import re
 
 from .jsonmixin import JsonSerializationMixin
 
@@ -54,10 +44,17 @@ class Metadata(JsonSerializationMixin):
         (`lsst.verify.Measurement.meta`).
     data : `dict`, optional
         Dictionary to seed metadata with.
-    """
 
-    # Pattern for detecting metric name prefixes in names
-    _prefix_pattern = re.compile('^(\S+\.\S+)\.')
+    Notes
+    -----
+    A key is routed to a measurement's notes if its first two
+    dot-separated components name a measured metric. The rest of the key,
+    which may contain dots, is the note's name: ``'validate_drp.PA1.a.b'``
+    is the ``'a.b'`` note of the ``validate_drp.PA1`` measurement, as
+    ``Measurement.notes['a.b']`` would store it. Earlier versions took
+    everything before the last dot as the metric name, so such keys were
+    stored as job metadata instead.
+    """
 
     def __init__(self, measurement_set, data=None):
 
@@ -67,32 +64,71 @@ class Metadata(JsonSerializationMixin):
         # Measurement set to get measurement annotations from
         self._meas_set = measurement_set
 
-        # Initialize the ChainMap. The first item in the chain map is the
-        # Metadata object's own _data. This is generic metadata. Additional
-        # items in the chain are Measurement.notes annotations for all
-        # measurements in the measurement_set.
-        self._chain = ChainMap(self._data)
-        self._cached_prefixes = set()
-        self._refresh_chainmap()
+        # Measurement.notes annotations of the measurements in the
+        # measurement set: the notes' internal dicts, keyed by metric name
+        # (`str`). Rebuilt only when the measurement set's membership
+        # changes (as tracked by its version). Keys in _data take
+        # precedence over notes.
+        self._notes_maps = OrderedDict()
+        self._notes_version = None
+        self._refresh_notes_maps()
 
         if data is not None:
             self.update(data)
 
-    def _refresh_chainmap(self):
-        prefixes = set([str(name) for name in self._meas_set])
-
-        if self._cached_prefixes != prefixes:
-            self._cached_prefixes = prefixes
-
-            self._chain = ChainMap(self._data)
-            for _, measurement in self._meas_set.items():
+    def _refresh_notes_maps(self):
+        """Rebuild the index of measurement notes if measurements were
+        inserted into or deleted from the measurement set.
+        """
+        version = self._meas_set._version
+        if self._notes_version != version:
+            self._notes_maps = OrderedDict()
+            for metric_name, measurement in self._meas_set.items():
                 # Get the dict instance directly so we don't use
                 # the MeasurementNotes's key auto-prefixing.
-                self._chain.maps.append(measurement.notes._data)
+                self._notes_maps[str(metric_name)] = measurement.notes._data
+            self._notes_version = version
+
+    @staticmethod
+    def _get_metric_name(key):
+        """Get the metric name that prefixes a key, or `None`.
+
+        Notes
+        -----
+        Notes keys are prefixed by a metric name, which is always a package
+        and a metric (``validate_drp.PA1.`` in
+        ``validate_drp.PA1.filter_name``). The rest of the key may contain
+        dots, so ``'validate_drp.PA1.a.b'`` is prefixed by
+        ``validate_drp.PA1`` rather than ``validate_drp.PA1.a``.
+        """
+        parts = key.split('.', 2)
+        if len(parts) < 3:
+            return None
+        return parts[0] + '.' + parts[1]
+
+    def _get_notes_map(self, key):
+        """Get the notes of the measurement whose metric name prefixes a
+        key, or `None`.
+        """
+        self._refresh_notes_maps()
+        metric_name = Metadata._get_metric_name(key)
+        if metric_name is None:
+            return None
+        return self._notes_maps.get(metric_name)
+
+    def _flatten(self):
+        """Merge job metadata and measurement notes into a single `dict`.
+        """
+        self._refresh_notes_maps()
+        merged = {}
+        for notes_map in self._notes_maps.values():
+            merged.update(notes_map)
+        merged.update(self._data)
+        return merged
 
     @staticmethod
     def _get_prefix(key):
-        """Get the prefix of a measurement not, if it exists.
+        """Get the prefix of a measurement note, if it exists.
 
         Examples
         --------
@@ -100,6 +136,8 @@ class Metadata(JsonSerializationMixin):
         True
         >>> Metadata._get_prefix('validate_drp.PA1.note')
         'validate_drp.PA1.'
+        >>> Metadata._get_prefix('validate_drp.PA1.dotted.note')
+        'validate_drp.PA1.'
 
         To get the metric name:
 
@@ -107,61 +145,75 @@ class Metadata(JsonSerializationMixin):
         >>> prefix.rstrip('.')
         'validate_drp.PA1'
         """
-        match = Metadata._prefix_pattern.match(key)
-        if match is not None:
-            return match.group(0)
+        metric_name = Metadata._get_metric_name(key)
+        if metric_name is not None:
+            return metric_name + '.'
         else:
             return None
 
     def __getitem__(self, key):
-        self._refresh_chainmap()
-        return self._chain[key]
+        try:
+            return self._data[key]
+        except KeyError:
+            notes_map = self._get_notes_map(key)
+            if notes_map is None:
+                raise
+            return notes_map[key]
 
     def __setitem__(self, key, value):
-        prefix = Metadata._get_prefix(key)
-        if prefix is not None:
-            metric_name = prefix.rstrip('.')
-            if metric_name in self._meas_set:
-                # turn prefix into a metric name
-                self._meas_set[metric_name].notes[key] = value
-                return
-
-        # No matching measurement; insert into general metadata
-        self._data[key] = value
+        notes_map = self._get_notes_map(key)
+        if notes_map is not None:
+            # Keys are already prefixed by the metric name
+            notes_map[key] = value
+        else:
+            # No matching measurement; insert into general metadata
+            self._data[key] = value
 
     def __delitem__(self, key):
-        prefix = Metadata._get_prefix(key)
-        if prefix is not None:
-            metric_name = prefix.rstrip('.')
-            if metric_name in self._meas_set:
-                del self._meas_set[metric_name].notes[key]
-                return
-
-        # No matching measurement; delete from general metadata
-        del self._data[key]
+        notes_map = self._get_notes_map(key)
+        if notes_map is not None:
+            del notes_map[key]
+        else:
+            # No matching measurement; delete from general metadata
+            del self._data[key]
 
     def __contains__(self, key):
-        self._refresh_chainmap()
-        return key in self._chain
+        if key in self._data:
+            return True
+        notes_map = self._get_notes_map(key)
+        return notes_map is not None and key in notes_map
 
     def __len__(self):
-        self._refresh_chainmap()
-        return len(self._chain)
+        self._refresh_notes_maps()
+        count = sum(len(notes_map) for notes_map in self._notes_maps.values())
+        # Keys in both _data and notes are counted once
+        for key in self._data:
+            metric_name = Metadata._get_metric_name(key)
+            notes_map = None if metric_name is None \
+                else self._notes_maps.get(metric_name)
+            if notes_map is None or key not in notes_map:
+                count += 1
+        return count
 
     def __iter__(self):
-        self._refresh_chainmap()
-        for key in self._chain:
+        for key in self._data:
             yield key
+        self._refresh_notes_maps()
+        for notes_map in self._notes_maps.values():
+            for key in notes_map:
+                if key not in self._data:
+                    yield key
 
     def __eq__(self, other):
-        # No explicit chain refresh because __len__ already does it
         if len(self) != len(other):
             return False
 
+        merged = self._flatten()
         for key, value in other.items():
-            if key not in self:
-                return False
-            if value != self[key]:
+            try:
+                if value != merged[key]:
+                    return False
+            except KeyError:
                 return False
 
         return True
@@ -174,7 +226,7 @@ class Metadata(JsonSerializationMixin):
         return json.dumps(json_data, sort_keys=True, indent=4)
 
     def __repr__(self):
-        return repr(self._chain)
+        return repr(self._flatten())
 
     def _repr_html_(self):
         return self.__str__()
@@ -183,15 +235,64 @@ class Metadata(JsonSerializationMixin):
         return [key for key in self]
 
     def items(self):
-        self._refresh_chainmap()
-        for item in self._chain.items():
-            yield item
+        for key, value in self._data.items():
+            yield key, value
+        self._refresh_notes_maps()
+        for notes_map in self._notes_maps.values():
+            for key, value in notes_map.items():
+                if key not in self._data:
+                    yield key, value
+
+    def get_notes(self, metric_name):
+        """Get the notes of a metric's measurement.
+
+        Parameters
+        ----------
+        metric_name : `str` or `lsst.verify.Name`
+            Name of a metric.
+
+        Returns
+        -------
+        notes : `dict`
+            Notes of the metric's measurement, keyed by their metric-prefixed
+            names. Empty if the metric has no measurement.
+        """
+        self._refresh_notes_maps()
+        return dict(self._notes_maps.get(str(metric_name), {}))
 
     def update(self, data):
-        for key, value in data.items():
-            self[key] = value
+        self.update_many(data)
+
+    def update_many(self, data):
+        """Insert several metadata terms at once.
+
+        Terms are grouped by the measurement whose notes they belong to, and
+        each group is inserted in bulk.
+
+        Parameters
+        ----------
+        data : `dict` or iterable of (`str`, value) pairs
+            Metadata to insert. Terms whose keys are prefixed with the name
+            of a measured metric are inserted into that measurement's notes.
+        """
+        if hasattr(data, 'items'):
+            data = data.items()
+
+        self._refresh_notes_maps()
+        groups = OrderedDict()
+        for key, value in data:
+            metric_name = Metadata._get_metric_name(key)
+            if metric_name not in self._notes_maps:
+                # No matching measurement; general metadata
+                metric_name = None
+            groups.setdefault(metric_name, []).append((key, value))
+
+        for metric_name, items in groups.items():
+            if metric_name is None:
+                self._data.update(items)
+            else:
+                self._notes_maps[metric_name].update(items)
 
     @property
     def json(self):
-        self._refresh_chainmap()
-        return self.jsonify_dict(self._chain)
+        return self.jsonify_dict(self._flatten())
@@ -0,0 +1,466 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Validation of the metric and specification YAML files of a metrics
+package, as run by ``lint_metrics.py``.
+
+Unlike loading a package with ``load_metrics_package``, linting reports all
+errors rather than the first one, and times each phase of loading each file:
+
+- ``parse``: parsing and normalizing the YAML documents.
+- ``resolve``: merging specifications and partials with their bases.
+- ``deserialize``: creating `~lsst.verify.Metric` and specification objects.
+
+Files that passed a previous lint, and whose content (and the content of
+the files they inherit from) hasn't changed, are skipped.
+"""
+
+from __future__ import print_function, division
+
+__all__ = ['LintResult', 'lint_metrics_package']
+
+from collections import OrderedDict
+import glob
+import hashlib
+import os
+import pickle
+from timeit import default_timer
+
+import astropy.units as u
+from astropy.table import Table
+
+from .metricset import MetricSet, _parse_metrics_yaml
+from .naming import Name
+from .packagecache import get_cache_dir, _write_atomic
+from .specset import SpecificationSet
+from .yamlutils import map_yaml_files
+
+
+# Version of the lint state file layout
+_STATE_VERSION = 1
+
+PHASES = ('parse', 'resolve', 'deserialize')
+"""Timed phases of linting a file."""
+
+
+class LintResult(object):
+    r"""Errors and timings from linting a metrics package.
+
+    Parameters
+    ----------
+    package_dir : `str`
+        Root directory of the metrics package.
+
+    Attributes
+    ----------
+    package_dir : `str`
+        Root directory of the metrics package.
+    errors : `list`
+        ``(path, message)`` tuples for each error found.
+    timings : `collections.OrderedDict`
+        Time spent on each file, in seconds. Keys are file paths and values
+        are `~collections.OrderedDict`\ s keyed by phase (see `PHASES`).
+    checked : `list` of `str`
+        Paths of the files that were linted.
+    skipped : `list` of `str`
+        Paths of the files that were skipped since they passed the last
+        lint and haven't changed.
+    """
+
+    def __init__(self, package_dir):
+        self.package_dir = package_dir
+        self.errors = []
+        self.timings = OrderedDict()
+        self.checked = []
+        self.skipped = []
+
+    @property
+    def passed(self):
+        """`True` if no errors were found (`bool`)."""
+        return len(self.errors) == 0
+
+    def add_error(self, path, error):
+        """Record an error (an exception or message) for a file."""
+        if isinstance(error, Exception):
+            error = _format_error(error)
+        self.errors.append((path, error))
+
+    def add_time(self, path, phase, duration):
+        """Add time spent, in seconds, on a phase of linting a file."""
+        if path not in self.timings:
+            self.timings[path] = OrderedDict((p, 0.) for p in PHASES)
+        self.timings[path][phase] += duration
+
+    @property
+    def phase_totals(self):
+        """Total time spent in each phase, in seconds
+        (`~collections.OrderedDict`).
+        """
+        totals = OrderedDict((phase, 0.) for phase in PHASES)
+        for file_timings in self.timings.values():
+            for phase, duration in file_timings.items():
+                totals[phase] += duration
+        return totals
+
+    def timing_table(self):
+        """Make a table of the time spent on each file and phase.
+
+        Returns
+        -------
+        table : `astropy.table.Table`
+            Table with a row per file, sorted by total time (slowest first).
+            Times are in milliseconds.
+        """
+        paths = sorted(self.timings,
+                       key=lambda path: -sum(self.timings[path].values()))
+        columns = [[os.path.relpath(path, self.package_dir)
+                    for path in paths]]
+        names = ['File']
+        for phase in PHASES:
+            columns.append(u.Quantity(
+                [self.timings[path][phase] for path in paths], u.s).to(u.ms))
+            names.append(phase.capitalize())
+        columns.append(u.Quantity(
+            [sum(self.timings[path].values()) for path in paths],
+            u.s).to(u.ms))
+        names.append('Total')
+        table = Table(columns, names=names)
+        for name in names[1:]:
+            table[name].format = '.2f'
+        return table
+
+
+def lint_metrics_package(package_dir, processes=None, incremental=True,
+                         state_path=None):
+    """Lint the metric and specification YAML files of a metrics package.
+
+    Parameters
+    ----------
+    package_dir : `str`
+        Root directory of the metrics package, containing ``metrics/`` and
+        ``specs/`` directories.
+    processes : `int`, optional
+        Number of worker processes used to parse YAML files and
+        deserialize metrics (see `lsst.verify.yamlutils.map_yaml_files`).
+        Files are linted serially by default.
+    incremental : `bool`, optional
+        If `True` (default), skip files that passed the last lint and whose
+        content hasn't changed. If `False`, lint all files.
+    state_path : `str`, optional
+        Path of the file recording the files that passed. The default is
+        a file in the metrics package cache directory
+        (`lsst.verify.packagecache.get_cache_dir`).
+
+    Returns
+    -------
+    result : `LintResult`
+        Errors and timings.
+
+    Notes
+    -----
+    Each file is recorded with a digest of its content. Specification files
+    are also recorded with the digests of the files they inherit from,
+    directly or not, so that a file is linted again when one of its bases
+    changes. Files with errors are never recorded, and are linted again on
+    the next run, as are files that inherit from them.
+
+    Files that are skipped are still parsed and resolved if a linted file
+    inherits from them.
+    """
+    package_dir = os.path.abspath(package_dir)
+    if state_path is None:
+        state_path = _get_state_path(package_dir)
+    result = LintResult(package_dir)
+
+    metrics_paths = sorted(
+        glob.glob(os.path.join(package_dir, 'metrics', '*.yaml')))
+
+    # Specification files, with their package's directory
+    spec_dirnames = OrderedDict()
+    specs_dirname = os.path.join(package_dir, 'specs')
+    if os.path.isdir(specs_dirname):
+        for name in sorted(os.listdir(specs_dirname)):
+            package_specs_dirname = os.path.join(specs_dirname, name)
+            if not os.path.isdir(package_specs_dirname):
+                continue
+            for path in SpecificationSet._list_yaml_files(
+                    package_specs_dirname):
+                spec_dirnames[path] = package_specs_dirname
+
+    digests = OrderedDict()
+    for path in metrics_paths + list(spec_dirnames):
+        digests[path] = _compute_file_digest(path)
+
+    state = _read_state(state_path) if incremental else {}
+
+    def is_clean(path):
+        entry = state.get(path)
+        if entry is None or entry['digest'] != digests[path]:
+            return False
+        return all(digests.get(dep_path) == dep_digest
+                   for dep_path, dep_digest in entry['deps'].items())
+
+    for path in digests:
+        if is_clean(path):
+            result.skipped.append(path)
+        else:
+            result.checked.append(path)
+
+    # Index of the specifications and partials in unchanged files, to find
+    # the files with the bases of the changed files.
+    key_index = {}
+    for path, entry in state.items():
+        if digests.get(path) == entry['digest']:
+            for key in entry['keys']:
+                key_index[key] = path
+
+    new_state = OrderedDict((path, state[path]) for path in result.skipped)
+
+    # Metrics files are independent of each other
+    metrics_args = [('metrics', path, None) for path in result.checked
+                    if path not in spec_dirnames]
+    spec_paths = [path for path in result.checked if path in spec_dirnames]
+    spec_args = [('specs', path, spec_dirnames[path]) for path in spec_paths]
+    outputs = map_yaml_files(_lint_file, metrics_args + spec_args,
+                             processes=processes)
+
+    for (_, path, _), (_, error, timings) in zip(
+            metrics_args, outputs[:len(metrics_args)]):
+        for phase, duration in timings.items():
+            result.add_time(path, phase, duration)
+        if error is None:
+            new_state[path] = {'digest': digests[path], 'deps': {},
+                               'keys': []}
+        else:
+            result.add_error(path, error)
+
+    # Parse the changed specification files, and then, until all bases are
+    # available, the files with their bases.
+    parsed = OrderedDict()
+    defined_keys = set()
+    unnamed_keys = set()
+    outputs = outputs[len(metrics_args):]
+    while len(spec_args) > 0:
+        new_docs = []
+        for (_, path, _), (docs, error, timings) in zip(spec_args, outputs):
+            for phase, duration in timings.items():
+                result.add_time(path, phase, duration)
+            if error is not None:
+                result.add_error(path, error)
+            parsed[path] = []
+            new_docs.extend((path, doc) for doc in docs)
+
+        valid_docs = []
+        for path, doc in new_docs:
+            try:
+                base_keys = SpecificationSet._get_base_keys(doc)
+            except Exception as error:
+                result.add_error(path, error)
+                continue
+            parsed[path].append(doc)
+            valid_docs.append((path, base_keys))
+            key = SpecificationSet._get_document_key(doc)
+            if key is None:
+                unnamed_keys.add((doc.get('package'), str(doc['name'])))
+            else:
+                defined_keys.add(key)
+
+        needed = set()
+        for path, base_keys in valid_docs:
+            for base_key in base_keys:
+                if base_key in defined_keys:
+                    continue
+                if isinstance(base_key, Name) and \
+                        (base_key.package, base_key.spec) in unnamed_keys:
+                    continue
+                try:
+                    needed.add(key_index[base_key])
+                except KeyError:
+                    # Unknown, or new: parse everything
+                    needed.update(spec_dirnames)
+
+        spec_args = [('specs', path, spec_dirnames[path])
+                     for path in spec_dirnames
+                     if path in needed and path not in parsed]
+        if len(spec_args) > 0:
+            outputs = map_yaml_files(_lint_file, spec_args,
+                                     processes=processes)
+
+    # Resolve and deserialize specifications, in this process since
+    # inheritance crosses files
+    docs = []
+    doc_files = {}
+    for path, file_docs in parsed.items():
+        for doc in file_docs:
+            doc_files[id(doc)] = path
+        docs.extend(file_docs)
+
+    spec_set = _TimedSpecificationSet(result, doc_files)
+    ingest_errors = []
+    spec_set._ingest_documents(docs, doc_files=doc_files,
+                               errors=ingest_errors)
+    for doc, error in ingest_errors:
+        result.add_error(doc_files[id(doc)], error)
+
+    failed_paths = set(path for path, _ in result.errors)
+    for path in parsed:
+        if path in failed_paths:
+            new_state.pop(path, None)
+            continue
+        new_state[path] = {
+            'digest': digests[path],
+            'deps': _get_dependency_digests(spec_set, path, digests),
+            'keys': sorted(spec_set._file_keys.get(path, ()), key=str)}
+    for path in failed_paths:
+        new_state.pop(path, None)
+
+    try:
+        _write_atomic(state_path, {'version': _STATE_VERSION,
+                                   'files': new_state})
+    except Exception:
+        # Without a state file, the next lint is just not incremental
+        pass
+
+    return result
+
+
+class _TimedSpecificationSet(SpecificationSet):
+    """SpecificationSet that records the time spent resolving and
+    deserializing each document in a `LintResult`.
+    """
+
+    def __init__(self, result, doc_files):
+        SpecificationSet.__init__(self)
+        self._lint_result = result
+        self._lint_doc_files = doc_files
+        self._resolve_time = 0.
+
+    def resolve_document(self, spec_doc):
+        start = default_timer()
+        try:
+            return SpecificationSet.resolve_document(self, spec_doc)
+        finally:
+            self._resolve_time += default_timer() - start
+
+    def _ingest_document(self, doc):
+        path = self._lint_doc_files[id(doc)]
+        self._resolve_time = 0.
+        start = default_timer()
+        try:
+            return SpecificationSet._ingest_document(self, doc)
+        finally:
+            duration = default_timer() - start
+            self._lint_result.add_time(path, 'resolve', self._resolve_time)
+            self._lint_result.add_time(path, 'deserialize',
+                                       duration - self._resolve_time)
+
+
+def _lint_file(args):
+    """Parse a metrics or specification YAML file, and deserialize metrics
+    (module-level so that it can run in worker processes).
+
+    Parameters
+    ----------
+    args : `tuple`
+        Kind of file (``'metrics'`` or ``'specs'``), path of the file, and
+        for specifications, path of the package's specification directory.
+
+    Returns
+    -------
+    docs : `list`
+        Specification and partial documents (specifications only).
+    error : `str`
+        Error message, or `None`.
+    timings : `collections.OrderedDict`
+        Time spent in each phase, in seconds.
+    """
+    kind, path, package_dirname = args
+    docs = []
+    timings = OrderedDict()
+    start = default_timer()
+    try:
+        if kind == 'metrics':
+            yaml_doc = _parse_metrics_yaml(path)
+            timings['parse'] = default_timer() - start
+
+            start = default_timer()
+            MetricSet._load_metrics_yaml(path, yaml_doc=yaml_doc)
+            timings['deserialize'] = default_timer() - start
+        else:
+            spec_docs, partial_docs = SpecificationSet._load_yaml_file(
+                path, package_dirname)
+            docs = partial_docs + spec_docs
+            timings['parse'] = default_timer() - start
+    except Exception as error:
+        phase = 'parse' if 'parse' not in timings else 'deserialize'
+        timings[phase] = default_timer() - start
+        return [], _format_error(error), timings
+    return docs, None, timings
+
+
+def _format_error(error):
+    return '{0}: {1}'.format(type(error).__name__, error)
+
+
+def _compute_file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def _get_dependency_digests(spec_set, path, digests):
+    """Get the digests of the files that a file's specifications and
+    partials inherit from, directly or not, keyed by path.
+    """
+    deps = {}
+    pending = list(spec_set._file_keys.get(path, ()))
+    seen = set(pending)
+    while len(pending) > 0:
+        doc = spec_set._key_docs.get(pending.pop())
+        if doc is None:
+            continue
+        for base_key in SpecificationSet._get_base_keys(doc):
+            if base_key in seen:
+                continue
+            seen.add(base_key)
+            pending.append(base_key)
+            base_path = spec_set._key_files.get(base_key)
+            if base_path is not None and base_path != path:
+                deps[base_path] = digests[base_path]
+    return deps
+
+
+def _get_state_path(package_dir):
+    key = os.path.abspath(package_dir).encode('utf-8')
+    filename = 'lint-' + hashlib.sha1(key).hexdigest() + '.pickle'
+    return os.path.join(get_cache_dir(), filename)
+
+
+def _read_state(state_path):
+    """Read the files recorded by the last lint, keyed by path."""
+    try:
+        with open(state_path, 'rb') as f:
+            state = pickle.load(f)
+    except Exception:
+        return {}
+    if state.get('version') != _STATE_VERSION:
+        return {}
+    return state['files']
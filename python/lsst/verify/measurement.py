@@ -385,19 +385,39 @@ class MeasurementNotes(object):
         # Enforced key prefix for all notes
         self._prefix = '{self._metric_name}.'.format(self=self)
         self._data = {}
+        # Prefixed forms of the keys that have been set, keyed by both the
+        # unprefixed and prefixed forms, so that repeated access to a note
+        # doesn't rebuild its key.
+        self._keys = {}
 
     def _format_key(self, key):
         """Ensures the key includes the metric name prefix."""
-        if not key.startswith(self._prefix):
-            key = self._prefix + key
-        return key
+        try:
+            return self._keys[key]
+        except KeyError:
+            if not key.startswith(self._prefix):
+                key = self._prefix + key
+            return key
+
+    def _add_key(self, key):
+        """Prefix a key that is being set, caching its prefixed form."""
+        try:
+            return self._keys[key]
+        except KeyError:
+            if key.startswith(self._prefix):
+                prefixed_key = key
+            else:
+                prefixed_key = self._prefix + key
+            self._keys[key] = prefixed_key
+            self._keys[prefixed_key] = prefixed_key
+            return prefixed_key
 
     def __getitem__(self, key):
         key = self._format_key(key)
         return self._data[key]
 
     def __setitem__(self, key, value):
-        key = self._format_key(key)
+        key = self._add_key(key)
         self._data[key] = value
 
     def __delitem__(self, key):
@@ -436,5 +456,15 @@ class MeasurementNotes(object):
             yield item
 
     def update(self, data):
-        for key, value in data.items():
-            self[key] = value
+        """Insert several notes at once.
+
+        Parameters
+        ----------
+        data : `dict` or iterable of (`str`, value) pairs
+            Notes to insert. Keys may or may not include the metric name
+            prefix.
+        """
+        if hasattr(data, 'items'):
+            data = data.items()
+        add_key = self._add_key
+        self._data.update((add_key(key), value) for key, value in data)
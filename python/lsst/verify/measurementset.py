@@ -40,6 +40,12 @@ class MeasurementSet(JsonSerializationMixin):
 
     def __init__(self, measurements=None):
         self._items = {}
+
+        # Incremented whenever measurements are inserted, replaced or
+        # deleted, so that dependents (like `lsst.verify.Metadata`) can
+        # tell when to refresh what they derive from the set.
+        self._version = 0
+
         if measurements is not None:
             for measurement in measurements:
                 self[measurement.metric_name] = measurement
@@ -110,6 +116,7 @@ class MeasurementSet(JsonSerializationMixin):
             raise KeyError(message.format(key, value.metric_name))
 
         self._items[key] = value
+        self._version += 1
 
     def __len__(self):
         return len(self._items)
@@ -125,6 +132,7 @@ class MeasurementSet(JsonSerializationMixin):
             key = Name(metric=key)
 
         del self._items[key]
+        self._version += 1
 
     def __iter__(self):
         for key in self._items:
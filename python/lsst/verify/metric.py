@@ -78,6 +78,10 @@ class Metric(JsonSerializationMixin):
     reference_page = None
     """Page number in the document that specifies this metric (`int`)."""
 
+    # Replaced whenever the tags of any metric are assigned, so that metric
+    # sets can tell that their tag indexes may be out of date
+    _tags_token = object()
+
     def __init__(self, name, description, unit, tags=None,
                  reference_doc=None, reference_url=None, reference_page=None):
         self.name = name
@@ -195,6 +199,7 @@ class Metric(JsonSerializationMixin):
         if isinstance(t, basestring):
             t = [t]
         self._tags = set(t)
+        Metric._tags_token = object()
 
     @property
     def reference(self):
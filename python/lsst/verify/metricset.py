@@ -24,17 +24,17 @@ from __future__ import print_function, division
 
 __all__ = ['MetricSet']
 
+import copy
 import os
 import glob
 
 from astropy.table import Table
 
-import lsst.pex.exceptions
-from lsst.utils import getPackageDir
 from .jsonmixin import JsonSerializationMixin
 from .metric import Metric
 from .naming import Name
-from .yamlutils import load_ordered_yaml
+from .packagecache import _get_package_dir, load_package_cached
+from .yamlutils import load_ordered_yaml, map_yaml_files
 
 
 class MetricSet(JsonSerializationMixin):
@@ -51,16 +51,46 @@ class MetricSet(JsonSerializationMixin):
         # own mapping API.
         self._metrics = {}
 
+        # Inverted index of metric tags: keys are tags and values are sets
+        # of metric Names. The tags each metric was indexed with are kept
+        # so that it can be unindexed even if its tags were modified. The
+        # index is up to date as long as Metric._tags_token is _tags_token,
+        # since no metric's tags have been assigned since.
+        self._tag_index = {}
+        self._indexed_tags = {}
+        self._tags_token = Metric._tags_token
+
+        # Metrics YAML files of packages that haven't been loaded yet (in
+        # lazy mode), keyed by package name.
+        self._pending_packages = {}
+
+        # Records of loaded metrics YAML files, for refresh(): directories
+        # of metrics packages that were loaded whole; (mtime, size) of each
+        # file; and the names of the metrics from each file.
+        self._metrics_dirs = set()
+        self._file_states = {}
+        self._file_metrics = {}
+
+        # True if _metrics and _pending_packages may be shared with a copy of
+        # this set; they're copied before being modified.
+        self._shared = False
+
+        # Owner of the metrics inserted into this set, and the owner of each
+        # metric, keyed by Name. Metrics with another owner may be shared
+        # with other sets, and are copied when they're fetched.
+        self._owner = object()
+        self._metric_owners = {}
+
         if metrics is not None:
             for metric in metrics:
                 if not isinstance(metric, Metric):
                     message = '{0!r} is not a Metric-type'.format(metric)
                     raise TypeError(message)
-                self._metrics[metric.name] = metric
+                self._add_metric(metric)
 
     @classmethod
     def load_metrics_package(cls, package_name_or_path='verify_metrics',
-                             subset=None):
+                             subset=None, lazy=False, processes=None):
         """Create a MetricSet from a Verification Framework metrics package.
 
         Parameters
@@ -75,6 +105,16 @@ class MetricSet(JsonSerializationMixin):
             ``subset='validate_drp'``, only ``validate_drp`` metrics are
             included in the `MetricSet`. This argument is equivalent to the
             `MetricSet.subset` method. Default is `None`.
+        lazy : `bool`, optional
+            If `True`, only the names of the package YAML files are read now.
+            Each package's metrics are loaded the first time a metric of that
+            package is looked up, or when the set is iterated over or
+            subset. Default is `False`.
+        processes : `int`, optional
+            Number of worker processes used to parse the YAML files (see
+            `lsst.verify.yamlutils.map_yaml_files`). Files are parsed
+            serially by default. The result doesn't depend on the number
+            of processes.
 
         Returns
         -------
@@ -96,23 +136,19 @@ class MetricSet(JsonSerializationMixin):
         To make a `MetricSet` from a single package's YAML metric definition
         file that **is not** contained in a metrics package,
         use `load_single_package` instead.
+
+        Loaded packages are cached in memory and on disk (see
+        `lsst.verify.packagecache`). Repeated loads in a process return
+        independent copies of the set loaded first, which are faster to make
+        than loading the package again. Lazy sets are not cached.
         """
-        try:
-            # Try an EUPS package name
-            package_dir = getPackageDir(package_name_or_path)
-        except lsst.pex.exceptions.NotFoundError:
-            # Try as a filesystem path instead
-            package_dir = package_name_or_path
-        finally:
-            package_dir = os.path.abspath(package_dir)
+        package_dir = _get_package_dir(package_name_or_path)
 
         metrics_dirname = os.path.join(package_dir, 'metrics')
         if not os.path.isdir(metrics_dirname):
             message = 'Metrics directory {0} not found'
             raise OSError(message.format(metrics_dirname))
 
-        metrics = []
-
         if subset is not None:
             # Load only a single package's YAML file
             metrics_yaml_paths = [os.path.join(metrics_dirname,
@@ -122,11 +158,36 @@ class MetricSet(JsonSerializationMixin):
             metrics_yaml_paths = glob.glob(os.path.join(metrics_dirname,
                                                         '*.yaml'))
 
-        for metrics_yaml_path in metrics_yaml_paths:
-            new_metrics = MetricSet._load_metrics_yaml(metrics_yaml_path)
-            metrics.extend(new_metrics)
-
-        return cls(metrics)
+        if lazy:
+            instance = cls()
+            if subset is None:
+                instance._metrics_dirs.add(metrics_dirname)
+            for metrics_yaml_path in metrics_yaml_paths:
+                package_name = os.path.splitext(
+                    os.path.basename(metrics_yaml_path))[0]
+                instance._pending_packages[package_name] = metrics_yaml_path
+            return instance
+
+        def load():
+            instance = cls()
+            if subset is None:
+                instance._metrics_dirs.add(metrics_dirname)
+
+            # Files are parsed in parallel (if requested), and metrics are
+            # built from the parsed documents here.
+            stats = [os.stat(path) for path in metrics_yaml_paths]
+            yaml_docs = map_yaml_files(_parse_metrics_yaml,
+                                       metrics_yaml_paths,
+                                       processes=processes)
+            for metrics_yaml_path, stat, yaml_doc in zip(
+                    metrics_yaml_paths, stats, yaml_docs):
+                instance._load_tracked_yaml(metrics_yaml_path,
+                                            yaml_doc=yaml_doc, stat=stat)
+
+            return instance
+
+        kind = '{0}.{1}'.format(cls.__module__, cls.__name__)
+        return load_package_cached(kind, package_dir, subset, load)
 
     @classmethod
     def load_single_package(cls, metrics_yaml_path):
@@ -154,22 +215,89 @@ class MetricSet(JsonSerializationMixin):
         metrics = MetricSet._load_metrics_yaml(metrics_yaml_path)
         return cls(metrics)
 
+    def _load_tracked_yaml(self, metrics_yaml_path, yaml_doc=None,
+                           stat=None):
+        """Load metrics from a YAML file into the set, and record the
+        file's state for `refresh`.
+
+        The file is parsed unless its parsed document (``yaml_doc``) is
+        given, along with its `os.stat` result from before parsing
+        (``stat``).
+        """
+        metrics_yaml_path = os.path.abspath(metrics_yaml_path)
+        if stat is None:
+            stat = os.stat(metrics_yaml_path)
+        metrics = MetricSet._load_metrics_yaml(metrics_yaml_path,
+                                               yaml_doc=yaml_doc)
+
+        self._unshare()
+        self._file_states[metrics_yaml_path] = (stat.st_mtime, stat.st_size)
+        self._file_metrics[metrics_yaml_path] = [metric.name
+                                                 for metric in metrics]
+        for metric in metrics:
+            self._add_metric(metric)
+
+    def refresh(self):
+        """Reload metrics YAML files that were modified, added or removed
+        since they were loaded.
+
+        Returns
+        -------
+        changed : `list` of `str`
+            Paths of the YAML files that changed. The list is empty if the
+            set is up to date.
+
+        Notes
+        -----
+        Files are checked for changes by their modification time and size.
+        Only metrics from changed files are replaced. Files of packages
+        that haven't been loaded yet (in lazy mode) are skipped.
+        """
+        self._unshare()
+
+        paths = set(self._file_states)
+        for metrics_dirname in self._metrics_dirs:
+            paths.update(glob.glob(os.path.join(metrics_dirname, '*.yaml')))
+        paths.difference_update(self._pending_packages.values())
+
+        changed = []
+        for path in sorted(paths):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Removed
+                changed.append(path)
+                continue
+            if self._file_states.get(path) != (stat.st_mtime, stat.st_size):
+                changed.append(path)
+
+        for path in changed:
+            for metric_name in self._file_metrics.pop(path, []):
+                if metric_name in self._metrics:
+                    self._remove_metric(metric_name)
+            self._file_states.pop(path, None)
+            if os.path.exists(path):
+                self._load_tracked_yaml(path)
+
+        return changed
+
     @staticmethod
-    def _load_metrics_yaml(metrics_yaml_path):
+    def _load_metrics_yaml(metrics_yaml_path, yaml_doc=None):
         # package name is inferred from YAML file name (by definition)
         metrics_yaml_path = os.path.abspath(metrics_yaml_path)
         package_name = os.path.splitext(os.path.basename(metrics_yaml_path))[0]
 
+        if yaml_doc is None:
+            yaml_doc = _parse_metrics_yaml(metrics_yaml_path)
+
         metrics = []
-        with open(metrics_yaml_path) as f:
-            yaml_doc = load_ordered_yaml(f)
-            for metric_name, metric_doc in yaml_doc.items():
-                name = Name(package=package_name, metric=metric_name)
-                # throw away a 'name' field if there happens to be one
-                metric_doc.pop('name', None)
-                # Create metric instance
-                metric = Metric.deserialize(name=name, **metric_doc)
-                metrics.append(metric)
+        for metric_name, metric_doc in yaml_doc.items():
+            name = Name(package=package_name, metric=metric_name)
+            # throw away a 'name' field if there happens to be one
+            metric_doc.pop('name', None)
+            # Create metric instance
+            metric = Metric.deserialize(name=name, **metric_doc)
+            metrics.append(metric)
         return metrics
 
     @classmethod
@@ -197,14 +325,15 @@ class MetricSet(JsonSerializationMixin):
     def json(self):
         """A JSON-serializable object (`list`)."""
         doc = JsonSerializationMixin._jsonify_list(
-            [metric for name, metric in self.items()]
+            [metric for name, metric in self._iter_stored()]
         )
         return doc
 
     def __getitem__(self, key):
         if not isinstance(key, Name):
             key = Name(metric=key)
-        return self._metrics[key]
+        self._load_pending(key.package)
+        return self._get_metric(key)
 
     def __setitem__(self, key, value):
         if not isinstance(key, Name):
@@ -226,22 +355,205 @@ class MetricSet(JsonSerializationMixin):
             message = 'Key {0!s} inconsistent with Metric {0!s}'
             raise KeyError(message.format(key, value))
 
-        self._metrics[key] = value
+        # Load the package first, so that it doesn't replace this metric
+        self._load_pending(key.package)
+        self._add_metric(value)
 
     def __delitem__(self, key):
         if not isinstance(key, Name):
             key = Name(metric=key)
-        del self._metrics[key]
+        self._load_pending(key.package)
+        self._remove_metric(key)
+
+    def __copy__(self):
+        """Make a shallow copy of the set.
+
+        The copy is cheap: the two sets share their internal containers until
+        either one is modified, and their `Metric` instances until they're
+        fetched (copy-on-write). A metric that either set gets by name or
+        iteration is copied first, with `copy.deepcopy`, so modifying it
+        never affects the other set.
+        """
+        copied = self.__class__.__new__(self.__class__)
+        copied.__dict__.update(self.__dict__)
+        copied._shared = True
+        self._shared = True
+        # Neither set owns the metrics anymore
+        copied._owner = object()
+        self._owner = object()
+        return copied
+
+    def _unshare(self):
+        """Copy internal containers that may be shared with a copy of
+        this set, before modifying them.
+        """
+        if self._shared:
+            self._metrics = dict(self._metrics)
+            self._tag_index = {k: set(v) for k, v in self._tag_index.items()}
+            self._indexed_tags = dict(self._indexed_tags)
+            self._pending_packages = dict(self._pending_packages)
+            self._metrics_dirs = set(self._metrics_dirs)
+            self._file_states = dict(self._file_states)
+            self._file_metrics = dict(self._file_metrics)
+            self._metric_owners = dict(self._metric_owners)
+            self._shared = False
+
+    def _get_metric(self, name):
+        """Get a metric to hand out, copying it first if it may be shared
+        with another set.
+        """
+        metric = self._metrics[name]
+        if self._metric_owners[name] is not self._owner:
+            metric = copy.deepcopy(metric)
+            # Copy shared containers, without materializing views
+            MetricSet._unshare(self)
+            self._metrics[name] = metric
+            self._metric_owners[name] = self._owner
+        return metric
+
+    def _iter_stored(self):
+        """Iterate over ``(name, metric)`` pairs without copying shared
+        metrics, which must not be modified.
+        """
+        for name in list(self.keys()):
+            yield name, self._metrics[name]
+
+    def _add_metric(self, metric, owner=None):
+        """Add a metric to the internal dict and tag index, replacing any
+        metric of the same name.
+
+        Parameters
+        ----------
+        metric : `Metric`
+            Metric to add.
+        owner : `object`, optional
+            Owner of the metric, if it may be shared with another set. By
+            default, the metric is owned by this set.
+        """
+        self._unshare()
+        name = metric.name
+        if name in self._metrics:
+            self._remove_metric(name)
+        self._metrics[name] = metric
+        self._metric_owners[name] = self._owner if owner is None else owner
+        self._index_tags(metric)
+
+    def _remove_metric(self, name):
+        """Remove a metric from the internal dict and tag index."""
+        self._unshare()
+        del self._metrics[name]
+        del self._metric_owners[name]
+        self._unindex_tags(name)
+
+    def _index_tags(self, metric):
+        """Add a metric's tags to the tag index."""
+        tags = frozenset(metric.tags)
+        self._indexed_tags[metric.name] = tags
+        for tag in tags:
+            self._tag_index.setdefault(tag, set()).add(metric.name)
+
+    def _unindex_tags(self, name):
+        """Remove a metric from the tag index."""
+        for tag in self._indexed_tags.pop(name):
+            names = self._tag_index[tag]
+            names.discard(name)
+            if len(names) == 0:
+                del self._tag_index[tag]
+
+    def _sync_tag_index(self):
+        """Re-index the metrics whose tags were assigned since they were
+        indexed.
+        """
+        tags_token = Metric._tags_token
+        if self._tags_token is tags_token:
+            return
+        for name, metric in list(self._metrics.items()):
+            if metric.tags != self._indexed_tags[name]:
+                # Copy shared indexes, without materializing views
+                MetricSet._unshare(self)
+                self._unindex_tags(name)
+                self._index_tags(metric)
+        self._tags_token = tags_token
+
+    def _find_tagged(self, tags):
+        """Find the metrics that have all the given tags, using the tag
+        index.
+
+        Parameters
+        ----------
+        tags : `set` of `str`
+            Tags to select metrics by.
+
+        Returns
+        -------
+        names : `set` of `lsst.verify.Name`
+            Names of the metrics whose tags are a superset of ``tags``.
+
+        Notes
+        -----
+        The index's sets of names for each tag are intersected, starting
+        with the smallest one, so the cost is proportional to the number
+        of metrics with the rarest tag rather than to the size of the set.
+        The index is first brought up to date if the tags of any metric were
+        assigned since it was last updated. Tags added to a metric's
+        `~Metric.tags` in place are only indexed when the metric is inserted
+        again.
+        """
+        if len(tags) == 0:
+            return set(self._metrics)
+
+        self._sync_tag_index()
+
+        postings = []
+        for tag in tags:
+            try:
+                postings.append(self._tag_index[tag])
+            except KeyError:
+                return set()
+        postings.sort(key=len)
+        names = set(postings[0])
+        for other_names in postings[1:]:
+            names &= other_names
+        # Guard against tags removed from a metric after it was indexed
+        return set(name for name in names
+                   if tags <= self._metrics[name].tags)
+
+    def _load_pending(self, package=None):
+        """Load the metrics of packages that haven't been loaded yet
+        (lazy mode).
+
+        Parameters
+        ----------
+        package : `str`, optional
+            Name of the package to load, if it's pending. If `None`, all
+            pending packages are loaded.
+        """
+        if len(self._pending_packages) == 0:
+            return
+        if package is None:
+            package_names = sorted(self._pending_packages)
+        elif package in self._pending_packages:
+            package_names = [package]
+        else:
+            return
+
+        self._unshare()
+        for package_name in package_names:
+            metrics_yaml_path = self._pending_packages.pop(package_name)
+            self._load_tracked_yaml(metrics_yaml_path)
 
     def __len__(self):
+        self._load_pending()
         return len(self._metrics)
 
     def __contains__(self, key):
         if not isinstance(key, Name):
             key = Name(metric=key)
+        self._load_pending(key.package)
         return key in self._metrics
 
     def __iter__(self):
+        self._load_pending()
         for key in self._metrics:
             yield key
 
@@ -306,6 +618,7 @@ class MetricSet(JsonSerializationMixin):
         self[metric.name] = metric
 
     def keys(self):
+        self._load_pending()
         return self._metrics.keys()
 
     def items(self):
@@ -319,8 +632,9 @@ class MetricSet(JsonSerializationMixin):
             - `Name` of the `Metric`
             - `Metric` instance
         """
-        for item in self._metrics.items():
-            yield item
+        self._load_pending()
+        for name in list(self._metrics.keys()):
+            yield name, self._get_metric(name)
 
     def subset(self, package=None, tags=None):
         """Create a new `MetricSet` with metrics belonging to a single
@@ -349,30 +663,34 @@ class MetricSet(JsonSerializationMixin):
         `MetricSet` contains the **intersection** of the package-based and
         tag-based selections. That is, metrics will belong to ``package``
         and posess the tag ``tag``.
+
+        The subset is a view: it shares this set's metrics and filters them
+        as it is read, so making a subset doesn't copy the set. The view
+        is turned into an independent set the first time it is modified.
+        Later changes to this set don't affect the subset.
         """
         if package is not None and not isinstance(package, Name):
             package = Name(package=package)
 
-        if tags is not None:
-            tags = set(tags)
-
-        if package is not None and tags is None:
-            metrics = [metric for metric_name, metric in self._metrics.items()
-                       if metric_name in package]
+        if package is not None:
+            self._load_pending(package.package)
+        else:
+            self._load_pending()
 
-        elif package is not None and tags is not None:
-            metrics = [metric for metric_name, metric in self._metrics.items()
-                       if metric_name in package
-                       if tags <= metric.tags]
+        if package is None and tags is None:
+            # Nothing is selected
+            return _MetricSetView(self, names=set())
 
-        elif package is None and tags is not None:
-            metrics = [metric for metric_name, metric in self._metrics.items()
-                       if tags <= metric.tags]
+        names = None
+        if tags is not None:
+            # Select through the tag index
+            names = self._find_tagged(set(tags))
 
-        else:
-            metrics = []
+        predicates = []
+        if package is not None:
+            predicates.append(lambda metric: metric.name in package)
 
-        return MetricSet(metrics)
+        return _MetricSetView(self, names=names, predicates=predicates)
 
     def update(self, other):
         """Merge another `MetricSet` into this one.
@@ -383,9 +701,19 @@ class MetricSet(JsonSerializationMixin):
             Another `MetricSet`. Metrics in ``other`` that do exist in this
             set are added to this one. Metrics in ``other`` replace metrics of
             the same name in this one.
+
+        Notes
+        -----
+        Metrics are shared with ``other``. Metrics that ``other`` shares
+        with a copy of itself remain shared, and are only copied when they
+        are fetched from this set.
         """
-        for _, metric in other.items():
-            self.insert(metric)
+        for name, metric in other._iter_stored():
+            owner = other._metric_owners[name]
+            if owner is other._owner:
+                owner = None
+            self._load_pending(name.package)
+            self._add_metric(metric, owner=owner)
 
     def _repr_html_(self):
         """Make an HTML representation of metrics for Jupyter notebooks.
@@ -419,3 +747,139 @@ class MetricSet(JsonSerializationMixin):
                       names=['Name', 'Description', 'Units', 'Reference',
                              'Tags'])
         return table._repr_html_()
+
+
+class _MetricSetView(MetricSet):
+    """A lazily filtered view of a `MetricSet`, made by `MetricSet.subset`.
+
+    Parameters
+    ----------
+    parent : `MetricSet`
+        Set to make a view of (possibly another view).
+    names : `set` of `lsst.verify.Name`, optional
+        Names of the metrics that may be selected. All metrics may be
+        selected if `None`.
+    predicates : sequence of callables, optional
+        Functions that take a `Metric` and return `True` if it's selected.
+
+    Notes
+    -----
+    The view shares the internal containers of ``parent`` (as a copy made
+    with `copy.copy` does) and applies its filters as it is read. Views of
+    views compose their filters. The selected metrics are only listed when
+    the view is iterated over or its length is needed. Before the view is
+    modified, it is materialized: its containers are copied, without the
+    metrics that aren't selected, and it behaves like a plain `MetricSet`
+    from then on.
+    """
+
+    def __init__(self, parent, names=None, predicates=()):
+        self.__dict__.update(parent.__dict__)
+        parent._shared = True
+        self._shared = True
+        # Packages that weren't needed to make the subset aren't part of it
+        self._pending_packages = {}
+
+        predicates = tuple(predicates)
+        if isinstance(parent, _MetricSetView):
+            if parent._view_names is not None:
+                if names is None:
+                    names = parent._view_names
+                else:
+                    names = names & parent._view_names
+            predicates = parent._view_predicates + predicates
+        self._view_names = names
+        self._view_predicates = predicates
+        # Selected names, listed on demand
+        self._view_keys = None
+
+    def __reduce__(self):
+        # Pickle the selected metrics, as a plain MetricSet
+        return (MetricSet, ([metric for _, metric in self.items()],))
+
+    @property
+    def _is_filtered(self):
+        return self._view_names is not None or len(self._view_predicates) > 0
+
+    def _view_contains(self, key):
+        """Check if a metric is in the set and selected by the view."""
+        if self._view_names is not None and key not in self._view_names:
+            return False
+        try:
+            metric = self._metrics[key]
+        except KeyError:
+            return False
+        return all(predicate(metric) for predicate in self._view_predicates)
+
+    def _get_view_keys(self):
+        """List the names of the selected metrics."""
+        if self._view_keys is None:
+            if self._view_names is not None:
+                candidates = sorted(self._view_names)
+            else:
+                candidates = self._metrics
+            self._view_keys = [key for key in candidates
+                               if self._view_contains(key)]
+        return self._view_keys
+
+    def _unshare(self):
+        if self._is_filtered:
+            # Materialize the view
+            keys = set(self._get_view_keys())
+            self._view_names = None
+            self._view_predicates = ()
+            self._view_keys = None
+            MetricSet._unshare(self)
+            for key in list(self._metrics.keys()):
+                if key not in keys:
+                    self._remove_metric(key)
+        else:
+            MetricSet._unshare(self)
+
+    def _find_tagged(self, tags):
+        names = MetricSet._find_tagged(self, tags)
+        if not self._is_filtered:
+            return names
+        return set(name for name in names if self._view_contains(name))
+
+    def __getitem__(self, key):
+        metric = MetricSet.__getitem__(self, key)
+        if self._is_filtered and not self._view_contains(metric.name):
+            raise KeyError(key)
+        return metric
+
+    def __len__(self):
+        if not self._is_filtered:
+            return MetricSet.__len__(self)
+        return len(self._get_view_keys())
+
+    def __contains__(self, key):
+        if not self._is_filtered:
+            return MetricSet.__contains__(self, key)
+        if not isinstance(key, Name):
+            key = Name(metric=key)
+        return self._view_contains(key)
+
+    def __iter__(self):
+        if not self._is_filtered:
+            return MetricSet.__iter__(self)
+        return iter(self._get_view_keys())
+
+    def keys(self):
+        if not self._is_filtered:
+            return MetricSet.keys(self)
+        return list(self._get_view_keys())
+
+    def items(self):
+        if not self._is_filtered:
+            return MetricSet.items(self)
+        return ((key, self._get_metric(key))
+                for key in self._get_view_keys())
+
+
+def _parse_metrics_yaml(metrics_yaml_path):
+    """Parse a metrics YAML file (module-level so that it can run in worker
+    processes).
+    """
+    with open(metrics_yaml_path) as f:
+        return load_ordered_yaml(f)
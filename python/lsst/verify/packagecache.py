@@ -0,0 +1,410 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Caches of loaded metrics packages.
+
+Loading a metrics package means walking its ``metrics/`` and ``specs/``
+directories, parsing every YAML file, and resolving specification
+inheritance. Loaded `~lsst.verify.MetricSet` and
+`~lsst.verify.SpecificationSet` objects are cached at two levels:
+
+- Within a process, by the `package_registry` (a `PackageRegistry`).
+  Callers get copy-on-write copies of the registered sets, made with
+  `copy.copy`, which share the registered metrics and specifications until
+  they're fetched.
+- Optionally, across processes, as pickles in a user cache directory that
+  are reused while the package's files are unchanged. Set
+  ``LSST_VERIFY_PERSISTENT_CACHE`` to a non-empty value to enable this
+  cache, which also persists the SQUASH endpoint URLs discovered by
+  `lsst.verify.squash`.
+
+The cache directory is ``$LSST_VERIFY_CACHE_DIR`` if set, or else
+``lsst_verify`` in ``$XDG_CACHE_HOME`` (``~/.cache`` by default). Only the
+most recent entry of each loaded package is kept. Set
+``LSST_VERIFY_NO_CACHE`` to a non-empty value to disable both caches.
+"""
+
+from __future__ import print_function, division
+
+__all__ = ['get_cache_dir', 'clear_cache', 'compute_package_digest',
+           'PackageRegistry', 'package_registry']
+
+import copy
+import fnmatch
+import hashlib
+import os
+import pickle
+import tempfile
+
+import lsst.pex.exceptions
+from lsst.utils import getPackageDir
+
+# Increment if the cached representation changes to invalidate old entries
+_CACHE_VERSION = 7
+
+# Cache entries are named 'package-v<version>-<key>-<digest>.pickle', where
+# <key> is a hash of the kind of loaded object, the package and the subset
+_CACHE_PREFIX = 'package-'
+
+# os.rename is atomic on POSIX, but doesn't replace existing files on Windows
+_replace = getattr(os, 'replace', os.rename)
+
+
+def get_cache_dir():
+    """Get the directory of the metrics package cache.
+
+    Returns
+    -------
+    cache_dir : `str`
+        Path of the cache directory. The directory may not exist yet.
+    """
+    cache_dir = os.environ.get('LSST_VERIFY_CACHE_DIR')
+    if cache_dir:
+        return cache_dir
+
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(xdg_cache_home, 'lsst_verify')
+
+
+def clear_cache():
+    """Delete all cached metrics packages.
+
+    Other files in the cache directory, such as the state of
+    `lsst.verify.lint.lint_metrics_package`, are kept.
+    """
+    _remove_entries(lambda filename: True)
+
+
+def _remove_entries(predicate):
+    """Remove metrics package entries from the cache directory.
+
+    Parameters
+    ----------
+    predicate : callable
+        Function that takes the name of an entry's file, and returns `True`
+        if the entry is to be removed.
+    """
+    cache_dir = get_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return
+    for filename in fnmatch.filter(os.listdir(cache_dir),
+                                   _CACHE_PREFIX + '*.pickle'):
+        if not predicate(filename):
+            continue
+        try:
+            os.remove(os.path.join(cache_dir, filename))
+        except OSError:
+            # Removed concurrently
+            pass
+
+
+def _get_package_dir(package_name_or_path):
+    """Resolve the root directory of a metrics package.
+
+    Parameters
+    ----------
+    package_name_or_path : `str`
+        Name of an EUPS package **or** the file path to a metrics package.
+
+    Returns
+    -------
+    package_dir : `str`
+        Absolute path of the package's root directory.
+    """
+    try:
+        # Try an EUPS package name
+        package_dir = getPackageDir(package_name_or_path)
+    except lsst.pex.exceptions.NotFoundError:
+        # Try as a filesystem path instead
+        package_dir = package_name_or_path
+    return os.path.abspath(package_dir)
+
+
+def compute_package_digest(package_dir):
+    """Compute a digest of the state of a metrics package's files.
+
+    Parameters
+    ----------
+    package_dir : `str`
+        Root directory of a metrics package.
+
+    Returns
+    -------
+    digest : `str`
+        Hexadecimal digest of the relative paths, modification times and
+        sizes of all files in the package's ``metrics/`` and ``specs/``
+        directories. The digest changes if a file is added, removed,
+        or modified.
+
+    Notes
+    -----
+    File contents are not read, so computing the digest costs one
+    `os.stat` per file.
+    """
+    package_dir = os.path.abspath(package_dir)
+    digest = hashlib.sha1()
+    for dirname in ('metrics', 'specs'):
+        top_dir = os.path.join(package_dir, dirname)
+        for root_dir, dirnames, filenames in os.walk(top_dir):
+            # Walk in a deterministic order
+            dirnames.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(root_dir, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    # Removed concurrently
+                    continue
+                record = '{0}\0{1!r}\0{2:d}\n'.format(
+                    os.path.relpath(path, package_dir),
+                    stat.st_mtime,
+                    stat.st_size)
+                digest.update(record.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _get_version_prefix():
+    """Get the prefix of the names of the cache files written by this
+    version of the module.
+    """
+    return '{0}v{1:d}-'.format(_CACHE_PREFIX, _CACHE_VERSION)
+
+
+def _get_cache_prefix(kind, package_dir, subset):
+    """Get the prefix of the names of the cache files of a loaded metrics
+    package, which is followed by the package's digest.
+    """
+    key = '\0'.join((kind, os.path.abspath(package_dir), str(subset)))
+    return '{0}{1}-'.format(_get_version_prefix(),
+                            hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+class PackageRegistry(object):
+    """Process-wide registry of loaded metrics packages.
+
+    Parameters
+    ----------
+    check_mtime : `bool`, optional
+        If `True`, registered packages are reloaded when the modification
+        times or sizes of their files change (see `compute_package_digest`).
+        This costs one `os.stat` per package file on each access. If
+        `False` (default), registered packages are reused until they are
+        invalidated.
+
+    Notes
+    -----
+    Packages are registered by the kind of loaded object, the resolved
+    package path, and the subset. Accessing a registered package returns a
+    copy of the registered object, made with `copy.copy`. The copies of
+    `~lsst.verify.MetricSet` and `~lsst.verify.SpecificationSet` objects
+    are copy-on-write: they share the registered set's containers until
+    they're modified, and each `~lsst.verify.Metric` or
+    `~lsst.verify.Specification` until it's fetched from the copy, when
+    that item alone is copied. So copies cost little more than a lookup,
+    and modifying a copy or its items never affects the registry or other
+    copies.
+    """
+
+    def __init__(self, check_mtime=False):
+        self.check_mtime = check_mtime
+        # Values are (digest, loaded object) tuples, keyed by
+        # (kind, package_dir, subset).
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, kind, package_dir, subset, loader):
+        """Get a loaded metrics package, loading it if necessary.
+
+        Parameters
+        ----------
+        kind : `str`
+            Identifier of the kind of loaded object, such as the class name
+            (``'MetricSet'`` or ``'SpecificationSet'``).
+        package_dir : `str`
+            Root directory of the metrics package.
+        subset : `str` or `None`
+            Package subset being loaded.
+        loader : callable
+            Function, taking no arguments, that loads the package if it
+            isn't cached.
+
+        Returns
+        -------
+        loaded : obj
+            Copy of the object returned by ``loader``.
+        """
+        package_dir = os.path.abspath(package_dir)
+        key = (kind, package_dir, subset)
+
+        try:
+            digest, loaded = self._entries[key]
+        except KeyError:
+            pass
+        else:
+            if not self.check_mtime or \
+                    compute_package_digest(package_dir) == digest:
+                return copy.copy(loaded)
+
+        digest = compute_package_digest(package_dir)
+        loaded = _load_persistent(kind, package_dir, subset, digest, loader)
+        self._entries[key] = (digest, loaded)
+        return copy.copy(loaded)
+
+    def invalidate(self, package_dir=None):
+        """Drop registered packages so that they're loaded again.
+
+        Parameters
+        ----------
+        package_dir : `str`, optional
+            Root directory of a metrics package. If `None` (default), all
+            packages are dropped.
+        """
+        if package_dir is None:
+            self._entries.clear()
+            return
+
+        package_dir = os.path.abspath(package_dir)
+        for key in list(self._entries.keys()):
+            if key[1] == package_dir:
+                # May be invalidated concurrently
+                self._entries.pop(key, None)
+
+
+package_registry = PackageRegistry()
+"""Process-wide `PackageRegistry` used by the ``load_metrics_package``
+methods.
+"""
+
+
+def load_package_cached(kind, package_dir, subset, loader):
+    """Load a metrics package through the in-process `package_registry` and
+    the persistent cache.
+
+    Parameters
+    ----------
+    kind : `str`
+        Identifier of the kind of loaded object, such as the class name
+        (``'MetricSet'`` or ``'SpecificationSet'``).
+    package_dir : `str`
+        Root directory of the metrics package.
+    subset : `str` or `None`
+        Package subset being loaded.
+    loader : callable
+        Function, taking no arguments, that loads the package if it isn't
+        cached.
+
+    Returns
+    -------
+    loaded : obj
+        Object returned by ``loader``, or a copy of it.
+    """
+    if os.environ.get('LSST_VERIFY_NO_CACHE'):
+        return loader()
+
+    return package_registry.get(kind, package_dir, subset, loader)
+
+
+def _is_persistent():
+    """Check if the persistent cache is enabled."""
+    return bool(os.environ.get('LSST_VERIFY_PERSISTENT_CACHE'))
+
+
+def _load_persistent(kind, package_dir, subset, digest, loader):
+    """Load a metrics package through the persistent cache, if it is
+    enabled.
+
+    Notes
+    -----
+    Cache entries are keyed by the package path, ``kind``, ``subset``, and a
+    digest of the package files (`compute_package_digest`), so modifying the
+    package makes its entries stale. Stale entries of the package, and
+    entries written by other versions of this module, are removed when a new
+    entry is written.
+
+    A new entry is written to a temporary file in the cache directory and
+    then renamed into place. Renames are atomic, so concurrent readers never
+    see a partial entry, and concurrent writers of the same entry simply
+    replace each other's (equivalent) results. Unreadable entries are
+    rebuilt, and failures to write the cache are ignored.
+    """
+    if not _is_persistent():
+        return loader()
+
+    prefix = _get_cache_prefix(kind, package_dir, subset)
+    filename = prefix + digest + '.pickle'
+    cache_path = os.path.join(get_cache_dir(), filename)
+
+    try:
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        # Not cached, or the entry is unreadable: rebuild it
+        pass
+
+    loaded = loader()
+
+    try:
+        _write_atomic(cache_path, loaded)
+        # Remove the package's stale entries, and other versions' entries
+        version_prefix = _get_version_prefix()
+
+        def is_stale(name):
+            if name == filename:
+                return False
+            return name.startswith(prefix) or \
+                not name.startswith(version_prefix)
+
+        _remove_entries(is_stale)
+    except Exception:
+        # The cache is an optimization; carry on without it
+        pass
+
+    return loaded
+
+
+def _write_atomic(path, obj):
+    """Pickle an object to a file, atomically."""
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # Created concurrently
+            if not os.path.isdir(dirname):
+                raise
+
+    fd, temp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        _replace(temp_path, path)
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
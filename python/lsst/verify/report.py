@@ -26,8 +26,6 @@ __all__ = ['Report']
 
 from astropy.table import Table
 
-from .naming import Name
-
 
 class Report(object):
     """Report tabulating specification pass/fail status for a set of
@@ -70,23 +68,14 @@ class Report(object):
         metric_tags = []
         spec_tags = []
 
-        spec_names = list(self._spec_set.keys())
-        spec_names.sort()
-
-        for spec_name in spec_names:
-            # Test if there is a measurement for this specification,
-            # if not, we just skip it.
-            metric_name = Name(package=spec_name.package,
-                               metric=spec_name.metric)
-            try:
-                meas = self._meas_set[metric_name]
-            except KeyError:
-                # No measurement for this specification, just skip it.
-                continue
+        # Test all specifications that have a measurement at once
+        results = self._spec_set.evaluate(self._meas_set)
 
+        for spec_name, metric_name, passed in results:
+            meas = self._meas_set[metric_name]
             spec = self._spec_set[spec_name]
 
-            if spec.check(meas.quantity):
+            if passed:
                 # Passed
                 # http://emojipedia.org/white-heavy-check-mark/
                 statuses.append(u'\U00002705')
@@ -0,0 +1,367 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+from __future__ import print_function, division
+
+__all__ = ['SketchBlob']
+
+import math
+
+import numpy as np
+import astropy.units as u
+
+from .blob import Blob, register_blob_type
+from .datum import Datum
+
+
+@register_blob_type
+class SketchBlob(Blob):
+    """A mergeable quantile sketch of a distribution, with relative-error
+    guarantees.
+
+    The sketch follows the DDSketch algorithm: values are counted in
+    logarithmically-spaced buckets so that any quantile is estimated with
+    a relative error no larger than ``relative_accuracy``. Sketches with the
+    same accuracy and units can be merged, in any order, by adding bucket
+    counts. Memory is bounded by ``max_bins`` buckets for each sign of value.
+
+    Parameters
+    ----------
+    name : `str`
+        Name of the blob.
+    unit : `str` or `astropy.units.Unit`, optional
+        Units of the sketched values. Default is dimensionless.
+    relative_accuracy : `float`, optional
+        Relative accuracy of quantile estimates. Default is ``0.01``.
+    max_bins : `int`, optional
+        Maximum number of buckets for positive values, and separately for
+        negative values. When exceeded, the buckets for values of smallest
+        magnitude are collapsed together. Default is ``2048``.
+    label : `str`, optional
+        Label for the sketched values, suitable for plot axes.
+    description : `str`, optional
+        Extended description of the sketch.
+
+    Examples
+    --------
+    >>> import numpy as np
+    >>> import astropy.units as u
+    >>> sketch = SketchBlob('residuals', unit='mmag')
+    >>> sketch.add(np.arange(1, 1001) * u.mmag)
+    >>> median = sketch.quantile(0.5)
+    >>> bool(abs(median.value - 500.) < 0.01 * 500.)
+    True
+    """
+
+    type = 'sketch'
+
+    mergeable = True
+
+    def __init__(self, name, unit='', relative_accuracy=0.01, max_bins=2048,
+                 label=None, description=None):
+        Blob.__init__(self, name)
+
+        if not 0. < relative_accuracy < 1.:
+            raise ValueError('relative_accuracy must be between 0 and 1')
+        if max_bins < 1:
+            raise ValueError('max_bins must be positive')
+
+        self._unit = u.Unit(unit)
+        self._relative_accuracy = float(relative_accuracy)
+        self._max_bins = int(max_bins)
+        self._gamma = (1. + relative_accuracy) / (1. - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._label = label
+        self._description = description
+
+        # Bucket counts, keyed by bucket index, for positive values and for
+        # the magnitudes of negative values.
+        self._positive = {}
+        self._negative = {}
+        self._zero_count = 0
+        self._min = None
+        self._max = None
+
+        self._update_datums()
+
+    @classmethod
+    def deserialize(cls, identifier=None, name=None, data=None, type=None):
+        """Deserialize fields from a sketch blob JSON object into a
+        `SketchBlob` instance.
+
+        Parameters
+        ----------
+        identifier : `str`
+            Blob identifier.
+        name : `str`
+            Name of the blob.
+        data : `dict`
+            Dictionary of serialized datums.
+        type : `str`, optional
+            Blob type; always ``'sketch'``.
+
+        Returns
+        -------
+        blob : `SketchBlob`
+            The deserialized sketch.
+        """
+        datums = {key: Datum.deserialize(**datum_doc)
+                  for key, datum_doc in data.items()}
+        instance = cls(name,
+                       unit=datums['unit'].quantity,
+                       relative_accuracy=datums['relative_accuracy'].quantity,
+                       max_bins=datums['max_bins'].quantity,
+                       label=datums['min'].label,
+                       description=datums['min'].description)
+        instance._positive = SketchBlob._read_store(
+            datums['positive_keys'], datums['positive_counts'])
+        instance._negative = SketchBlob._read_store(
+            datums['negative_keys'], datums['negative_counts'])
+        instance._zero_count = datums['zero_count'].quantity
+        for attr in ('min', 'max'):
+            q = datums[attr].quantity
+            if q is not None:
+                value = float(q.to(instance._unit).value)
+                setattr(instance, '_' + attr, value)
+        instance._update_datums()
+        instance._id = identifier
+        return instance
+
+    @staticmethod
+    def _read_store(keys_datum, counts_datum):
+        keys = keys_datum.quantity.value.astype(np.int64)
+        counts = counts_datum.quantity.value.astype(np.int64)
+        return {int(k): int(c) for k, c in zip(keys, counts)}
+
+    @staticmethod
+    def _store_datums(store):
+        keys = sorted(store)
+        counts = [store[k] for k in keys]
+        return (Datum(u.Quantity(keys, dtype=np.int64)),
+                Datum(u.Quantity(counts, dtype=np.int64)))
+
+    def _update_datums(self):
+        # Datums are the serialized state of the sketch; refresh them after
+        # each mutation.
+        self['positive_keys'], self['positive_counts'] = \
+            SketchBlob._store_datums(self._positive)
+        self['negative_keys'], self['negative_counts'] = \
+            SketchBlob._store_datums(self._negative)
+        self['zero_count'] = Datum(int(self._zero_count))
+        self['relative_accuracy'] = Datum(
+            u.Quantity(self._relative_accuracy))
+        self['max_bins'] = Datum(self._max_bins)
+        self['unit'] = Datum(self._unit.to_string())
+        for attr in ('min', 'max'):
+            value = getattr(self, '_' + attr)
+            if value is not None:
+                value = value * self._unit
+            self[attr] = Datum(value, label=self._label,
+                               description=self._description)
+
+    @property
+    def unit(self):
+        """Units of the sketched values (`astropy.units.Unit`)."""
+        return self._unit
+
+    @property
+    def relative_accuracy(self):
+        """Relative accuracy of quantile estimates (`float`)."""
+        return self._relative_accuracy
+
+    @property
+    def count(self):
+        """Number of values added to the sketch (`int`)."""
+        return self._zero_count + sum(self._positive.values()) + \
+            sum(self._negative.values())
+
+    @property
+    def min(self):
+        """Minimum value added (`astropy.units.Quantity`, or `None` if the
+        sketch is empty).
+        """
+        if self._min is None:
+            return None
+        return self._min * self._unit
+
+    @property
+    def max(self):
+        """Maximum value added (`astropy.units.Quantity`, or `None` if the
+        sketch is empty).
+        """
+        if self._max is None:
+            return None
+        return self._max * self._unit
+
+    def add(self, values):
+        """Add values to the sketch.
+
+        Parameters
+        ----------
+        values : `astropy.units.Quantity` or sequence
+            Values to add. Units must be compatible with `unit`. Non-finite
+            values are ignored.
+        """
+        if not isinstance(values, u.Quantity):
+            values = u.Quantity(values, unit=u.dimensionless_unscaled)
+        values = np.atleast_1d(values.to(self._unit).value)
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return
+
+        magnitudes = np.abs(values)
+        is_zero = magnitudes < np.finfo(np.float64).tiny
+        self._zero_count += int(np.count_nonzero(is_zero))
+        self._add_to_store(self._positive, values[(values > 0) & ~is_zero])
+        self._add_to_store(self._negative,
+                           magnitudes[(values < 0) & ~is_zero])
+
+        self._min = _none_min(self._min, float(values.min()))
+        self._max = _none_max(self._max, float(values.max()))
+        self._update_datums()
+
+    def _add_to_store(self, store, magnitudes):
+        if len(magnitudes) == 0:
+            return
+        keys = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+        unique_keys, counts = np.unique(keys, return_counts=True)
+        for key, count in zip(unique_keys.tolist(), counts.tolist()):
+            store[key] = store.get(key, 0) + count
+        self._collapse(store)
+
+    def _collapse(self, store):
+        # Collapse the lowest-magnitude buckets into the lowest retained
+        # bucket. This keeps the guarantee for the largest magnitudes and is
+        # independent of the order in which sketches are merged.
+        if len(store) <= self._max_bins:
+            return
+        keys = sorted(store)
+        n_collapse = len(keys) - self._max_bins
+        target = keys[n_collapse]
+        for key in keys[:n_collapse]:
+            store[target] += store.pop(key)
+
+    def _bucket_value(self, key):
+        return 2. * self._gamma ** key / (self._gamma + 1.)
+
+    def quantile(self, q):
+        """Estimate a quantile of the sketched distribution.
+
+        Parameters
+        ----------
+        q : `float`
+            Quantile, between 0 and 1 (inclusive).
+
+        Returns
+        -------
+        value : `astropy.units.Quantity` or `None`
+            Estimated quantile, or `None` if the sketch is empty.
+        """
+        if not 0. <= q <= 1.:
+            raise ValueError('Quantile {0!r} is not between 0 and 1'.format(q))
+        count = self.count
+        if count == 0:
+            return None
+
+        rank = q * (count - 1)
+        cumulative = 0
+        value = None
+        for key in sorted(self._negative, reverse=True):
+            cumulative += self._negative[key]
+            if cumulative > rank:
+                value = -self._bucket_value(key)
+                break
+        if value is None:
+            cumulative += self._zero_count
+            if cumulative > rank:
+                value = 0.
+        if value is None:
+            for key in sorted(self._positive):
+                cumulative += self._positive[key]
+                if cumulative > rank:
+                    value = self._bucket_value(key)
+                    break
+        if value is None:
+            value = self._max
+
+        value = min(max(value, self._min), self._max)
+        return value * self._unit
+
+    def merge(self, other):
+        """Merge the buckets of another sketch into this one.
+
+        Parameters
+        ----------
+        other : `SketchBlob`
+            Another sketch with the same relative accuracy and units.
+
+        Returns
+        -------
+        self : `SketchBlob`
+            This sketch, updated in place.
+
+        Raises
+        ------
+        TypeError
+            Raised if ``other`` is not a `SketchBlob`.
+        ValueError
+            Raised if the sketches have different relative accuracies or
+            units.
+        """
+        if not isinstance(other, SketchBlob):
+            message = 'Cannot merge {0!r} into a SketchBlob'
+            raise TypeError(message.format(other))
+        if other._relative_accuracy != self._relative_accuracy:
+            message = 'Sketch {0!r} has a different relative accuracy'
+            raise ValueError(message.format(other.name))
+        if other._unit != self._unit:
+            message = 'Sketch {0!r} has different units'
+            raise ValueError(message.format(other.name))
+
+        for store, other_store in ((self._positive, other._positive),
+                                   (self._negative, other._negative)):
+            for key, count in other_store.items():
+                store[key] = store.get(key, 0) + count
+            self._collapse(store)
+        self._zero_count += other._zero_count
+        self._min = _none_min(self._min, other._min)
+        self._max = _none_max(self._max, other._max)
+        self._update_datums()
+        return self
+
+
+def _none_min(a, b):
+    """Minimum of two values, either of which may be `None`."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a, b)
+
+
+def _none_max(a, b):
+    """Maximum of two values, either of which may be `None`."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
@@ -47,6 +47,10 @@ class Specification(with_metaclass(abc.ABCMeta, JsonSerializationMixin)):
     instance).
     """
 
+    # Replaced whenever the tags of any specification are assigned, so that
+    # specification sets can tell that their tag indexes may be out of date
+    _tags_token = object()
+
     def __init__(self, name, **kwargs):
         # interal object behind self.tags
         self._tags = set()
@@ -60,6 +64,9 @@ class Specification(with_metaclass(abc.ABCMeta, JsonSerializationMixin)):
             message = 'name {0!r} does not represent a specification'
             raise TypeError(message.format(self._name))
 
+        # Cached by the metric_name property
+        self._metric_name = None
+
         if 'metadata_query' in kwargs:
             self.metadata_query = MetadataQuery(kwargs['metadata_query'])
         else:
@@ -77,7 +84,10 @@ class Specification(with_metaclass(abc.ABCMeta, JsonSerializationMixin)):
     def metric_name(self):
         """Name of the metric this specification corresponds to
         (`lsst.verify.Name`)."""
-        return Name(package=self.name.package, metric=self.name.metric)
+        if self._metric_name is None:
+            self._metric_name = Name(package=self.name.package,
+                                     metric=self.name.metric)
+        return self._metric_name
 
     @property
     def tags(self):
@@ -90,6 +100,7 @@ class Specification(with_metaclass(abc.ABCMeta, JsonSerializationMixin)):
         if isinstance(t, basestring):
             t = [t]
         self._tags = set(t)
+        Specification._tags_token = object()
 
     @abc.abstractproperty
     def type(self):
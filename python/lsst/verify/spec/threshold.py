@@ -69,12 +69,27 @@ class ThresholdSpecification(Specification):
         operator.
     """
 
-    threshold = None
-    """The specification threshold level (`astropy.units.Quantity`)."""
+    # Binary comparison operator functions, keyed by operator string.
+    _operators = {'>=': operator.ge,
+                  '>': operator.gt,
+                  '<': operator.lt,
+                  '<=': operator.le,
+                  '==': operator.eq,
+                  '!=': operator.ne}
+
+    # Replaced whenever the threshold or operator of any threshold
+    # specification is assigned, so that specification sets can tell that
+    # their threshold arrays may be out of date
+    _thresholds_token = object()
 
     def __init__(self, name, threshold, operator_str, **kwargs):
         Specification.__init__(self, name, **kwargs)
 
+        # Compiled predicates and converted threshold values, keyed by
+        # astropy.units.Unit. Reset if the threshold or operator changes.
+        self._predicates = {}
+        self._threshold_values = {}
+
         self.threshold = threshold
         if not isinstance(self.threshold, u.Quantity):
             message = 'threshold {0!r} must be an astropy.units.Quantity'
@@ -92,6 +107,18 @@ class ThresholdSpecification(Specification):
     def type(self):
         return 'threshold'
 
+    @property
+    def threshold(self):
+        """The specification threshold level (`astropy.units.Quantity`)."""
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        self._threshold = value
+        self._predicates = {}
+        self._threshold_values = {}
+        ThresholdSpecification._thresholds_token = object()
+
     def __eq__(self, other):
         return (self.type == other.type) and \
             (self.name == other.name) and \
@@ -101,6 +128,12 @@ class ThresholdSpecification(Specification):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __getstate__(self):
+        # Compiled predicates are closures, which can't be pickled
+        state = self.__dict__.copy()
+        state['_predicates'] = {}
+        return state
+
     def __repr__(self):
         return "ThresholdSpecification({0!r}, {1!r}, {2!r})".format(
             self.name,
@@ -203,6 +236,8 @@ class ThresholdSpecification(Specification):
         # Cache the operator function as a means of validating the input too
         self._operator = ThresholdSpecification.convert_operator_str(v)
         self._operator_str = v
+        self._predicates = {}
+        ThresholdSpecification._thresholds_token = object()
 
     @property
     def operator(self):
@@ -251,14 +286,8 @@ class ThresholdSpecification(Specification):
         ValueError
             Raised if ``op_str`` is not a supported binary comparison operator.
         """
-        operators = {'>=': operator.ge,
-                     '>': operator.gt,
-                     '<': operator.lt,
-                     '<=': operator.le,
-                     '==': operator.eq,
-                     '!=': operator.ne}
         try:
-            return operators[op_str]
+            return ThresholdSpecification._operators[op_str]
         except KeyError:
             message = '{0!r} is not a supported threshold operator'.format(
                 op_str)
@@ -286,4 +315,86 @@ class ThresholdSpecification(Specification):
             For example, if the measurement is not an `astropy.units.Quantity`
             or if the units are not compatible.
         """
-        return self.operator(measurement, self.threshold)
+        # Plain numbers are treated as dimensionless quantities, as they
+        # are in comparisons with astropy Quantities.
+        measurement = u.Quantity(measurement)
+        predicate = self.compile(measurement.unit)
+        return predicate(measurement.value)
+
+    def _threshold_value(self, unit):
+        """Get the threshold as a plain value in the given units.
+
+        Raises
+        ------
+        astropy.units.UnitError
+            Raised if ``unit`` is not compatible with the threshold.
+        """
+        try:
+            return self._threshold_values[unit]
+        except KeyError:
+            value = self.threshold.to_value(unit)
+            self._threshold_values[unit] = value
+            return value
+
+    def compile(self, unit=None):
+        """Compile the specification test into a predicate function that
+        tests plain values, rather than `~astropy.units.Quantity` objects.
+
+        Parameters
+        ----------
+        unit : `str` or `astropy.units.Unit`, optional
+            Units of the values that the predicate tests, typically the units
+            of the metric definition. The threshold's own units are used by
+            default.
+
+        Returns
+        -------
+        predicate : callable
+            Function that takes a `float` or `numpy.ndarray` of values in
+            ``unit`` and returns `True` (or an array of `bool`) where values
+            pass the specification. The threshold is converted to ``unit``
+            once, when the predicate is compiled. If the predicate is given an
+            `astropy.units.Quantity` instead, the quantity is converted to
+            ``unit`` first.
+
+        Raises
+        ------
+        astropy.units.UnitError
+            Raised if ``unit`` is not compatible with the threshold, or if
+            the predicate is given a `~astropy.units.Quantity` with
+            incompatible units.
+
+        Notes
+        -----
+        Predicates are cached by unit, so repeated compilation is cheap.
+
+        Examples
+        --------
+        >>> import astropy.units as u
+        >>> spec = ThresholdSpecification('design', 5. * u.mmag, '<')
+        >>> passes = spec.compile(u.mag)
+        >>> bool(passes(0.004))
+        True
+        >>> bool(passes(6. * u.mmag))
+        False
+        """
+        if unit is None:
+            unit = self.threshold.unit
+        else:
+            unit = u.Unit(unit)
+
+        try:
+            return self._predicates[unit]
+        except KeyError:
+            pass
+
+        threshold_value = self._threshold_value(unit)
+        op = self.operator
+
+        def predicate(value):
+            if isinstance(value, u.Quantity):
+                value = value.to_value(unit)
+            return op(value, threshold_value)
+
+        self._predicates[unit] = predicate
+        return predicate
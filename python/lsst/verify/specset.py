@@ -28,20 +28,21 @@ from past.builtins import basestring
 
 from collections import OrderedDict
 import copy
+import itertools
 import os
 import re
 
+import numpy as np
 from astropy.table import Table
 
-import lsst.pex.exceptions
-from lsst.utils import getPackageDir
-
 from .errors import SpecificationResolutionError
 from .jsonmixin import JsonSerializationMixin
 from .naming import Name
+from .packagecache import _get_package_dir, load_package_cached
 from .spec.base import Specification
 from .spec.threshold import ThresholdSpecification
-from .yamlutils import merge_documents, load_all_ordered_yaml
+from .yamlutils import (merge_documents, load_all_ordered_yaml,
+                        map_yaml_files)
 from .report import Report
 
 
@@ -71,13 +72,87 @@ class SpecificationSet(JsonSerializationMixin):
         # name: ``package_name:yaml_id#name``.
         self._partials = {}
 
+        # Specifications grouped by metric: keys are metric Names and
+        # values are dicts of specifications keyed by specification Name.
+        self._metric_index = {}
+
+        # Inverted index of metadata query terms. Keys are term keys; values
+        # are dicts that map term values to sets of specification Names.
+        self._meta_index = {}
+
+        # Number of metadata query terms for each specification in
+        # _meta_index, keyed by specification Name.
+        self._meta_term_counts = {}
+
+        # Names of specifications without metadata query terms; these apply
+        # to any metadata.
+        self._unconstrained_specs = set()
+
+        # Names of specifications with query terms that can't be indexed
+        # (unhashable values). Their queries are evaluated individually.
+        self._unindexed_specs = set()
+
+        # Inverted index of specification tags: keys are tags and values are
+        # sets of specification Names. The tags each specification was
+        # indexed with are kept so that it can be unindexed even if its tags
+        # were modified. The index is up to date as long as
+        # Specification._tags_token is _tags_token, since no specification's
+        # tags have been assigned since.
+        self._tag_index = {}
+        self._indexed_tags = {}
+        self._tags_token = Specification._tags_token
+
+        # Threshold arrays used by evaluate(), keyed by metric Name and then
+        # by unit. Entries are built lazily and dropped whenever the metric's
+        # specifications change. All entries are dropped unless
+        # ThresholdSpecification._thresholds_token is _thresholds_token,
+        # since a specification's threshold or operator may have been
+        # assigned.
+        self._metric_thresholds = {}
+        self._thresholds_token = ThresholdSpecification._thresholds_token
+
+        # Merged base documents used by resolve_document, keyed by the
+        # tuple of base keys (partial IDs and specification Names).
+        self._resolved_bases = {}
+
+        # Keys of _resolved_bases entries that include each base key, so
+        # entries can be dropped when a base is replaced.
+        self._resolved_base_dependents = {}
+
+        # Specification directories of packages that haven't been loaded yet
+        # (in lazy mode), keyed by package name.
+        self._pending_packages = {}
+
+        # Records of loaded package directories and YAML files, for
+        # refresh(): the package directories; (mtime, size) of each file;
+        # keys (partial IDs and specification Names) of the documents each
+        # file produced; the original document and file of each key; and
+        # the keys of documents that inherit from each base key.
+        self._package_dirs = set()
+        self._file_states = {}
+        self._file_keys = {}
+        self._key_docs = {}
+        self._key_files = {}
+        self._doc_dependents = {}
+
+        # True if the containers above may be shared with a copy of this
+        # set; they're copied before being modified.
+        self._shared = False
+
+        # Owner of the specifications inserted into this set, and the owner
+        # of each specification, keyed by Name. Specifications with another
+        # owner may be shared with other sets, and are copied when they're
+        # fetched.
+        self._owner = object()
+        self._spec_owners = {}
+
         if specifications is not None:
             for spec in specifications:
                 if not isinstance(spec, Specification):
                     message = '{0!r} must be a Specification type'
                     raise TypeError(message.format(spec))
 
-                self._specs[spec.name] = spec
+                self._add_spec(spec)
 
         if partials is not None:
             for partial in partials:
@@ -85,7 +160,7 @@ class SpecificationSet(JsonSerializationMixin):
                     message = '{0!r} must be a SpecificationPartial type'
                     raise TypeError(message.format(partial))
 
-                self._partials[partial.name] = partial
+                self._set_partial(partial)
 
     @classmethod
     def deserialize(cls, specifications=None):
@@ -120,7 +195,7 @@ class SpecificationSet(JsonSerializationMixin):
 
     @classmethod
     def load_metrics_package(cls, package_name_or_path='verify_metrics',
-                             subset=None):
+                             subset=None, lazy=False, processes=None):
         """Create a SpecificationSet from an Verification Framework metrics
         package.
 
@@ -137,6 +212,19 @@ class SpecificationSet(JsonSerializationMixin):
             specifications are included in the SpecificationSet. This argument
             is equivalent to the `SpecificationSet.subset` method. Default
             is `None`.
+        lazy : `bool`, optional
+            If `True`, only the package directories in ``specs/`` are listed
+            now. Each package's specifications are loaded and resolved the
+            first time a specification or partial of that package is looked
+            up (including as the base of a specification in another
+            package), or when the set is iterated over or subset. Default
+            is `False`.
+        processes : `int`, optional
+            Number of worker processes used to parse the YAML files (see
+            `lsst.verify.yamlutils.map_yaml_files`). Files are parsed
+            serially by default. Inheritance is always resolved in this
+            process, and the result doesn't depend on the number of
+            processes.
 
         Returns
         -------
@@ -162,37 +250,46 @@ class SpecificationSet(JsonSerializationMixin):
         To make a `SpecificationSet` from a single package's YAML definition
         directory that **is not** contained in a metrics package, use
         `load_single_package` instead.
+
+        Loaded packages are cached in memory and on disk (see
+        `lsst.verify.packagecache`). Repeated loads in a process return
+        independent copies of the set loaded first, which are faster to make
+        than loading the package again. Lazy sets are not cached.
         """
-        try:
-            # Try an EUPS package name
-            package_dir = getPackageDir(package_name_or_path)
-        except lsst.pex.exceptions.NotFoundError:
-            # Try as a filesystem path instead
-            package_dir = package_name_or_path
-        finally:
-            package_dir = os.path.abspath(package_dir)
+        package_dir = _get_package_dir(package_name_or_path)
 
         specs_dirname = os.path.join(package_dir, 'specs')
         if not os.path.isdir(specs_dirname):
             message = 'Specifications directory {0} not found'
             raise OSError(message.format(specs_dirname))
 
-        instance = cls()
-
         if subset is not None:
             # Load specifications only for the package given by `subset`
             package_names = [subset]
         else:
             # Load specifications for each 'package' within specs/
-            package_names = os.listdir(specs_dirname)
+            package_names = sorted(os.listdir(specs_dirname))
 
-        for name in package_names:
-            package_specs_dirname = os.path.join(specs_dirname, name)
-            if not os.path.isdir(package_specs_dirname):
-                continue
-            instance._load_package_dir(package_specs_dirname)
+        if lazy:
+            instance = cls()
+            for name in package_names:
+                package_specs_dirname = os.path.join(specs_dirname, name)
+                if os.path.isdir(package_specs_dirname):
+                    instance._pending_packages[name] = package_specs_dirname
+            return instance
 
-        return instance
+        def load():
+            instance = cls()
+            package_specs_dirnames = [
+                os.path.join(specs_dirname, name) for name in package_names
+                if os.path.isdir(os.path.join(specs_dirname, name))]
+            instance._load_package_dirs(package_specs_dirnames,
+                                        processes=processes)
+
+            return instance
+
+        kind = '{0}.{1}'.format(cls.__module__, cls.__name__)
+        return load_package_cached(kind, package_dir, subset, load)
 
     @classmethod
     def load_single_package(cls, package_specs_dirname):
@@ -232,69 +329,453 @@ class SpecificationSet(JsonSerializationMixin):
         return instance
 
     def _load_package_dir(self, package_specs_dirname):
-        yaml_extensions = ('.yaml', '.yml')
-        package_specs_dirname = os.path.abspath(package_specs_dirname)
+        self._load_package_dirs([package_specs_dirname])
+
+    def _load_package_dirs(self, package_specs_dirnames, processes=None):
+        """Load specifications and partials from package directories.
+
+        Parameters
+        ----------
+        package_specs_dirnames : `list` of `str`
+            Directories containing specification YAML files, each for a
+            single package.
+        processes : `int`, optional
+            Number of worker processes used to parse the YAML files.
+
+        Notes
+        -----
+        All YAML files are parsed first (in parallel, if requested). Then
+        the documents of all packages are resolved together, so bases may
+        be in any of the packages.
+        """
+        self._unshare()
+
+        file_args = []
+        for package_specs_dirname in package_specs_dirnames:
+            package_specs_dirname = os.path.abspath(package_specs_dirname)
+            self._package_dirs.add(package_specs_dirname)
+            for filename in SpecificationSet._list_yaml_files(
+                    package_specs_dirname):
+                file_args.append((filename, package_specs_dirname))
+
+        stats = [os.stat(filename) for filename, _ in file_args]
+        parsed = map_yaml_files(_parse_specification_yaml_file, file_args,
+                                processes=processes)
 
         all_docs = []
+        doc_files = {}
+        for (filename, _), stat, (spec_docs, partial_docs) in zip(
+                file_args, stats, parsed):
+            all_docs.extend(self._record_yaml_file(
+                filename, stat, spec_docs, partial_docs, doc_files))
 
+        self._ingest_documents(all_docs, doc_files=doc_files)
+
+    @staticmethod
+    def _list_yaml_files(package_specs_dirname):
+        """List the specification YAML files in a package directory."""
+        yaml_extensions = ('.yaml', '.yml')
+        paths = []
         for (root_dir, _, filenames) in os.walk(package_specs_dirname):
             for filename in filenames:
                 if os.path.splitext(filename)[-1] not in yaml_extensions:
                     continue
-                filename = os.path.join(root_dir, filename)
-                spec_docs, partial_docs = SpecificationSet._load_yaml_file(
-                    filename,
-                    package_specs_dirname)
-                all_docs.extend(partial_docs)
-                all_docs.extend(spec_docs)
-
-        # resolve inheritance and Specification* instances when possible
-        while len(all_docs) > 0:
-            redo_queue = []
-
-            for doc in all_docs:
-                try:
-                    doc = self.resolve_document(doc)
-                except SpecificationResolutionError:
-                    # try again later
-                    redo_queue.append(doc)
-                    continue
+                paths.append(os.path.join(root_dir, filename))
+        paths.sort()
+        return paths
+
+    def _load_tracked_yaml_file(self, filename, package_specs_dirname,
+                                doc_files):
+        """Load documents from a specification YAML file, and record the
+        file's state for `refresh`.
+
+        Parameters
+        ----------
+        filename : `str`
+            Path of the YAML file.
+        package_specs_dirname : `str`
+            Path of the root directory for the package's specifications.
+        doc_files : `dict`
+            The file path is added to this dict for each loaded document,
+            keyed by the document's `id`.
+
+        Returns
+        -------
+        docs : `list`
+            Partial and specification documents (partials first).
+        """
+        stat = os.stat(filename)
+        spec_docs, partial_docs = SpecificationSet._load_yaml_file(
+            filename,
+            package_specs_dirname)
+        return self._record_yaml_file(filename, stat, spec_docs,
+                                      partial_docs, doc_files)
+
+    def _record_yaml_file(self, filename, stat, spec_docs, partial_docs,
+                          doc_files):
+        """Record the state of a parsed specification YAML file for
+        `refresh`, and the file of each of its documents in ``doc_files``.
+
+        Returns
+        -------
+        docs : `list`
+            Partial and specification documents (partials first).
+        """
+        self._file_states[filename] = (stat.st_mtime, stat.st_size)
+        docs = partial_docs + spec_docs
+        for doc in docs:
+            doc_files[id(doc)] = filename
+        return docs
+
+    def refresh(self):
+        """Reload specification YAML files that were modified, added or
+        removed since they were loaded.
+
+        Returns
+        -------
+        changed : `list` of `str`
+            Paths of the YAML files that changed. The list is empty if the
+            set is up to date.
+
+        Raises
+        ------
+        SpecificationResolutionError
+            Raised if the inheritance of the changed documents can't be
+            resolved.
+
+        Notes
+        -----
+        Files are checked for changes by their modification time and size,
+        within the package directories that were loaded from a metrics
+        package (and `load_single_package`). Only changed files are parsed
+        again. Specifications and partials from changed files are removed,
+        along with everything that inherits from them (directly or through
+        other documents). Then the documents from the changed files and the
+        original documents of the inheriting specifications and partials are
+        resolved again. Specifications added with `insert` (rather than
+        loaded from a file) are not affected.
+        """
+        self._unshare()
+
+        # Current YAML files, keyed by path, with their package directories
+        current = OrderedDict()
+        for package_specs_dirname in sorted(self._package_dirs):
+            for filename in SpecificationSet._list_yaml_files(
+                    package_specs_dirname):
+                current[filename] = package_specs_dirname
+
+        changed = []
+        for filename in sorted(set(current) | set(self._file_states)):
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                # Removed
+                current.pop(filename, None)
+                changed.append(filename)
+                continue
+            if self._file_states.get(filename) != \
+                    (stat.st_mtime, stat.st_size):
+                changed.append(filename)
+
+        if len(changed) == 0:
+            return changed
+
+        # Find keys of documents from the changed files and, transitively,
+        # the documents that inherit from them.
+        stale = OrderedDict()
+        queue = [key for filename in changed
+                 for key in self._file_keys.get(filename, ())]
+        while len(queue) > 0:
+            key = queue.pop()
+            if key in stale:
+                continue
+            stale[key] = None
+            queue.extend(self._doc_dependents.get(key, ()))
+
+        docs = []
+        doc_files = {}
+        changed_files = set(changed)
+        for key in stale:
+            doc = self._key_docs[key]
+            filename = self._key_files[key]
+            if filename not in changed_files:
+                # Re-resolve the original document of an unchanged file
+                docs.append(doc)
+                doc_files[id(doc)] = filename
+            self._forget_document(key)
+
+        for filename in changed:
+            self._file_states.pop(filename, None)
+            self._file_keys.pop(filename, None)
+            if filename in current:
+                docs.extend(self._load_tracked_yaml_file(
+                    filename, current[filename], doc_files))
+
+        self._ingest_documents(docs, doc_files=doc_files)
+        return changed
+
+    def _track_document(self, key, doc, doc_files):
+        """Record the file and bases of an ingested document, for
+        `refresh`.
+        """
+        if doc_files is None or id(doc) not in doc_files:
+            return
+        filename = doc_files[id(doc)]
+        self._key_docs[key] = doc
+        self._key_files[key] = filename
+        self._file_keys.setdefault(filename, set()).add(key)
+        for base_key in SpecificationSet._get_base_keys(doc):
+            self._doc_dependents.setdefault(base_key, set()).add(key)
+
+    def _forget_document(self, key):
+        """Remove a specification or partial that was loaded from a file,
+        and its records.
+        """
+        doc = self._key_docs.pop(key)
+        filename = self._key_files.pop(key)
+        self._file_keys.get(filename, set()).discard(key)
+        for base_key in SpecificationSet._get_base_keys(doc):
+            self._doc_dependents.get(base_key, set()).discard(key)
+
+        if isinstance(key, Name):
+            if key in self._specs:
+                self._remove_spec(key)
+        elif key in self._partials:
+            self._remove_partial(key)
+
+    def _ingest_documents(self, docs, doc_files=None, errors=None):
+        """Resolve specification and partial documents in dependency order
+        and add them to the set.
+
+        Parameters
+        ----------
+        docs : `list`
+            Specification and partial documents, as processed by
+            `_load_yaml_file`.
+        doc_files : `dict`, optional
+            Paths of the YAML files that documents were loaded from, keyed
+            by the `id` of the documents. These are recorded for `refresh`.
+        errors : `list`, optional
+            If given, errors are appended to this list as ``(doc, error)``
+            tuples instead of being raised, and the remaining documents are
+            still ingested. Documents that inherit from a document with an
+            error are not ingested either, and have errors of their own.
+
+        Raises
+        ------
+        SpecificationResolutionError
+            Raised if the documents' bases form a cycle, or if a base is
+            neither among ``docs`` nor already in the set. The message
+            includes the full chain of bases that lead to the problem.
+            Errors aren't raised if ``errors`` is given.
+
+        Notes
+        -----
+        The ``base`` fields of the documents define a dependency graph.
+        Documents are visited with an (iterative) depth-first search so that
+        each document is resolved exactly once, after all of its bases.
+        The cost is linear in the number of documents and bases.
+        """
+        # Dependency graph nodes: documents keyed by partial ID (`str`) or
+        # by specification `Name`. Some specifications inherit their metric,
+        # and so their fully-qualified name, from a base. Those are indexed
+        # by package and specification name, and resolved on demand when a
+        # base with a matching name is needed.
+        nodes = OrderedDict()
+        unnamed_docs = OrderedDict()
+        for doc in docs:
+            key = SpecificationSet._get_document_key(doc)
+            if key is None:
+                unnamed_key = (doc.get('package'), str(doc['name']))
+                unnamed_docs.setdefault(unnamed_key, []).append(doc)
+            else:
+                nodes[key] = doc
+
+        roots = list(nodes.values())
+        for candidates in unnamed_docs.values():
+            roots.extend(candidates)
+
+        done = set()  # keys of resolved documents
+        resolved_ids = set()  # ids of resolved documents
+        failed = set()  # keys of documents with errors
+        failed_ids = set()  # ids of documents with errors
+
+        def fail(stack, error):
+            # Record an error for the document at the top of the stack,
+            # and drop it
+            if errors is None:
+                raise error
+            doc, _ = stack.pop()
+            visiting.discard(id(doc))
+            errors.append((doc, error))
+            failed_ids.add(id(doc))
+            key = SpecificationSet._get_document_key(doc)
+            if key is not None:
+                failed.add(key)
+
+        for root_doc in roots:
+            if id(root_doc) in resolved_ids or id(root_doc) in failed_ids:
+                continue
+
+            stack = [(root_doc,
+                      iter(SpecificationSet._get_base_keys(root_doc)))]
+            visiting = set([id(root_doc)])
+            while len(stack) > 0:
+                doc, base_keys = stack[-1]
+
+                for base_key in base_keys:
+                    if base_key in done:
+                        continue
+                    if base_key in failed:
+                        message = 'Specification base {0!s} has errors: {1}'
+                        fail(stack, SpecificationResolutionError(
+                            message.format(
+                                base_key,
+                                SpecificationSet._format_chain(stack,
+                                                               base_key))))
+                        break
+
+                    if base_key in nodes:
+                        base_docs = [nodes[base_key]]
+                    elif base_key in self:
+                        # Base was loaded previously
+                        continue
+                    else:
+                        base_docs = None
+                        if isinstance(base_key, Name):
+                            base_docs = unnamed_docs.pop(
+                                (base_key.package, base_key.spec), None)
+                        if not base_docs:
+                            chain = SpecificationSet._format_chain(
+                                stack, base_key)
+                            message = ('Specification base {0!s} not found: '
+                                       '{1}'.format(base_key, chain))
+                            fail(stack, SpecificationResolutionError(message))
+                            break
+                        # Check the base again once these are resolved
+                        stack[-1] = (doc, itertools.chain([base_key],
+                                                          base_keys))
+
+                    if any(id(base_doc) in visiting
+                           for base_doc in base_docs):
+                        chain = SpecificationSet._format_chain(
+                            stack, base_key)
+                        message = ('Specification inheritance cycle: '
+                                   '{0}'.format(chain))
+                        fail(stack, SpecificationResolutionError(message))
+                        break
+                    for base_doc in base_docs:
+                        if id(base_doc) in resolved_ids or \
+                                id(base_doc) in failed_ids:
+                            continue
+                        visiting.add(id(base_doc))
+                        stack.append(
+                            (base_doc,
+                             iter(SpecificationSet._get_base_keys(base_doc))))
+                    break
 
-                if 'id' in doc:
-                    partial = SpecificationPartial(doc)
-                    self._partials[partial.name] = partial
                 else:
-                    # Make sure the name is fully qualified
-                    # since _process_specification_yaml_doc may not have
-                    # finished this yet
-                    doc['name'] = SpecificationSet._normalize_spec_name(
-                        doc['name'], metric=doc.get('metric', None),
-                        package=doc.get('package', None))
-
-                    # FIXME DM-8477 Need a registry to support multiple types
-                    if 'threshold' not in doc:
-                        message = ("We only support threshold-type "
-                                   "specifications\n"
-                                   "{0!r}".format(doc))
-                        raise NotImplementedError(message)
-                    spec = ThresholdSpecification.deserialize(**doc)
-
-                    name = spec.name
-
-                    if not name.is_fq:
-                        message = (
-                            'Fully-qualified name not resolved for'
-                            '{0!s}'.format(spec))
-                        raise SpecificationResolutionError(message)
-
-                    self._specs[name] = spec
-
-            if len(redo_queue) == len(all_docs):
-                message = ("There are unresolved specification "
-                           "documents: {0!r}")
-                raise SpecificationResolutionError(message.format(redo_queue))
-
-            all_docs = redo_queue
+                    # All bases are resolved
+                    if errors is not None:
+                        try:
+                            key = self._ingest_document(doc)
+                        except Exception as error:
+                            fail(stack, error)
+                            continue
+                    else:
+                        key = self._ingest_document(doc)
+                    stack.pop()
+                    visiting.discard(id(doc))
+                    done.add(key)
+                    resolved_ids.add(id(doc))
+                    self._track_document(key, doc, doc_files)
+
+    def _ingest_document(self, doc):
+        """Resolve a single specification or partial document (whose bases
+        are already in the set) and add it to the set.
+
+        Returns
+        -------
+        key : `str` or `lsst.verify.Name`
+            Partial ID or specification name of the added document.
+        """
+        doc = self.resolve_document(doc)
+
+        if 'id' in doc:
+            partial = SpecificationPartial(doc)
+            self._set_partial(partial)
+            return partial.name
+        else:
+            # Make sure the name is fully qualified
+            # since _process_specification_yaml_doc may not have
+            # finished this yet
+            doc['name'] = SpecificationSet._normalize_spec_name(
+                doc['name'], metric=doc.get('metric', None),
+                package=doc.get('package', None))
+
+            # FIXME DM-8477 Need a registry to support multiple types
+            if 'threshold' not in doc:
+                message = ("We only support threshold-type "
+                           "specifications\n"
+                           "{0!r}".format(doc))
+                raise NotImplementedError(message)
+            # The resolved document shares content with its bases; copy it
+            # so that the specification doesn't.
+            spec = ThresholdSpecification.deserialize(**copy.deepcopy(doc))
+
+            name = spec.name
+
+            if not name.is_fq:
+                message = (
+                    'Fully-qualified name not resolved for'
+                    '{0!s}'.format(spec))
+                raise SpecificationResolutionError(message)
+
+            self._add_spec(spec)
+            return name
+
+    @staticmethod
+    def _get_document_key(doc):
+        """Get the key of a specification or partial document in the
+        dependency graph (partial ID or specification `Name`), or `None` if
+        the specification's name can't be fully qualified yet.
+        """
+        if 'id' in doc:
+            return doc['id']
+        try:
+            name = Name(doc['name'])
+        except (TypeError, ValueError):
+            return None
+        if name.is_spec and name.is_fq:
+            return name
+        else:
+            return None
+
+    @staticmethod
+    def _get_base_keys(doc):
+        """Get the dependency graph keys of a document's bases, consistent
+        with how `resolve_document` looks them up.
+        """
+        bases = doc.get('base', [])
+        if isinstance(bases, basestring):
+            bases = [bases]
+
+        keys = []
+        for base_name in bases:
+            if '#' in base_name:
+                keys.append(base_name)
+            else:
+                keys.append(Name(package=doc['package'], spec=base_name))
+        return keys
+
+    @staticmethod
+    def _format_chain(stack, base_key):
+        """Format the chain of bases from a dependency search stack, ending
+        at ``base_key``, for error messages.
+        """
+        chain = [doc.get('id', doc.get('name')) for doc, _ in stack]
+        chain.append(base_key)
+        return ' -> '.join(str(key) for key in chain)
 
     @staticmethod
     def _load_yaml_file(yaml_file_path, package_dirname):
@@ -509,7 +990,7 @@ class SpecificationSet(JsonSerializationMixin):
     @property
     def json(self):
         doc = JsonSerializationMixin._jsonify_list(
-            [spec for name, spec in self.items()]
+            [spec for name, spec in self._iter_stored()]
         )
         return doc
 
@@ -525,12 +1006,14 @@ class SpecificationSet(JsonSerializationMixin):
 
     def __len__(self):
         """Number of `Specifications` in the set."""
+        self._load_pending()
         return len(self._specs)
 
     def __contains__(self, name):
         """Check if the set contains a `Specification` by name."""
         if isinstance(name, basestring) and '#' in name:
             # must be a partial's name
+            self._load_pending(SpecificationSet._get_partial_package(name))
             return name in self._partials
 
         else:
@@ -538,12 +1021,14 @@ class SpecificationSet(JsonSerializationMixin):
             if not isinstance(name, Name):
                 name = Name(spec=name)
 
+            self._load_pending(name.package)
             return name in self._specs
 
     def __getitem__(self, name):
         """Retrive a Specification or a SpecificationPartial."""
         if isinstance(name, basestring) and '#' in name:
             # must be a partial's name
+            self._load_pending(SpecificationSet._get_partial_package(name))
             return self._partials[name]
 
         else:
@@ -555,11 +1040,14 @@ class SpecificationSet(JsonSerializationMixin):
                 message = 'Expected key {0!r} to resolve a specification'
                 raise KeyError(message.format(name))
 
-            return self._specs[name]
+            self._load_pending(name.package)
+            return self._get_spec(name)
 
     def __setitem__(self, key, value):
         if isinstance(key, basestring) and '#' in key:
             # must be a partial's name
+            # Load the package first, so that it doesn't replace this partial
+            self._load_pending(SpecificationSet._get_partial_package(key))
             if not isinstance(value, SpecificationPartial):
                 message = ('Expected {0!s}={1!r} to be a '
                            'SpecificationPartial-type')
@@ -570,7 +1058,7 @@ class SpecificationSet(JsonSerializationMixin):
                 message = ("Key {0!s} does not match the "
                            "SpecificationPartial's name {1!s})")
                 raise KeyError(message.format(key, value.name))
-            self._partials[key] = value
+            self._set_partial(value)
 
         else:
             # must be a specification.
@@ -592,21 +1080,350 @@ class SpecificationSet(JsonSerializationMixin):
                            "Specification's name {1!s})")
                 raise KeyError(message.format(key, value.name))
 
-            self._specs[key] = value
+            # Load the package first, so that it doesn't replace this
+            # specification
+            self._load_pending(key.package)
+            self._add_spec(value)
 
     def __delitem__(self, key):
         if isinstance(key, basestring) and '#' in key:
             # must be a partial's name
-            del self._partials[key]
+            self._load_pending(SpecificationSet._get_partial_package(key))
+            self._remove_partial(key)
 
         else:
             # must be a specification
             if not isinstance(key, Name):
                 key = Name(spec=key)
 
-            del self._specs[key]
+            self._load_pending(key.package)
+            self._remove_spec(key)
+
+    @staticmethod
+    def _get_partial_package(name):
+        """Get the package name from a partial's fully-qualified name,
+        ``package:path#name``, or `None`.
+        """
+        match = PARTIAL_PATTERN.match(name)
+        if match is None:
+            return None
+        return match.group('package')
+
+    def _load_pending(self, package=None):
+        """Load and resolve the specifications of packages that haven't
+        been loaded yet (lazy mode).
+
+        Parameters
+        ----------
+        package : `str`, optional
+            Name of the package to load, if it's pending. If `None`, all
+            pending packages are loaded.
+
+        Notes
+        -----
+        Packages are removed from the pending packages before they're
+        loaded, so a package whose specifications have bases in another
+        pending package loads that package on demand.
+        """
+        if len(self._pending_packages) == 0:
+            return
+        if package is None:
+            package_names = sorted(self._pending_packages)
+        elif package in self._pending_packages:
+            package_names = [package]
+        else:
+            return
+
+        self._unshare()
+        for package_name in package_names:
+            # May have been loaded on demand by a previous package
+            package_specs_dirname = self._pending_packages.pop(package_name,
+                                                               None)
+            if package_specs_dirname is not None:
+                self._load_package_dir(package_specs_dirname)
+
+    def __copy__(self):
+        """Make a shallow copy of the set.
+
+        The copy is cheap: the two sets share their internal containers and
+        indexes until either one is modified, and their `Specification`
+        instances until they're fetched (copy-on-write). A specification
+        that either set gets by name, by metric or by iteration is copied
+        first, with `copy.deepcopy`, so modifying it never affects the other
+        set. `SpecificationPartial` instances are shared.
+        """
+        copied = self.__class__.__new__(self.__class__)
+        copied.__dict__.update(self.__dict__)
+        copied._shared = True
+        self._shared = True
+        # Neither set owns the specifications anymore
+        copied._owner = object()
+        self._owner = object()
+        return copied
+
+    def _unshare(self):
+        """Copy internal containers and indexes that may be shared with a
+        copy of this set, before modifying them.
+        """
+        if not self._shared:
+            return
+        self._specs = dict(self._specs)
+        self._partials = dict(self._partials)
+        self._metric_index = {k: dict(v)
+                              for k, v in self._metric_index.items()}
+        self._meta_index = {k: {value: set(names)
+                                for value, names in v.items()}
+                            for k, v in self._meta_index.items()}
+        self._meta_term_counts = dict(self._meta_term_counts)
+        self._unconstrained_specs = set(self._unconstrained_specs)
+        self._unindexed_specs = set(self._unindexed_specs)
+        self._tag_index = {k: set(v) for k, v in self._tag_index.items()}
+        self._indexed_tags = dict(self._indexed_tags)
+        self._metric_thresholds = {k: dict(v)
+                                   for k, v in self._metric_thresholds.items()}
+        self._resolved_bases = dict(self._resolved_bases)
+        self._resolved_base_dependents = {
+            k: set(v) for k, v in self._resolved_base_dependents.items()}
+        self._pending_packages = dict(self._pending_packages)
+        self._package_dirs = set(self._package_dirs)
+        self._file_states = dict(self._file_states)
+        self._file_keys = {k: set(v) for k, v in self._file_keys.items()}
+        self._key_docs = dict(self._key_docs)
+        self._key_files = dict(self._key_files)
+        self._doc_dependents = {k: set(v)
+                                for k, v in self._doc_dependents.items()}
+        self._spec_owners = dict(self._spec_owners)
+        self._shared = False
+
+    def _get_spec(self, name):
+        """Get a specification to hand out, copying it first if it may be
+        shared with another set.
+        """
+        spec = self._specs[name]
+        if self._spec_owners[name] is not self._owner:
+            spec = copy.deepcopy(spec)
+            # Copy shared containers, without materializing views
+            SpecificationSet._unshare(self)
+            self._specs[name] = spec
+            self._metric_index[spec.metric_name][name] = spec
+            # Threshold arrays may refer to the shared specification
+            self._metric_thresholds.pop(spec.metric_name, None)
+            self._spec_owners[name] = self._owner
+        return spec
+
+    def _iter_stored(self):
+        """Iterate over ``(name, specification)`` pairs without copying
+        shared specifications, which must not be modified.
+        """
+        for name in list(self.keys()):
+            yield name, self._specs[name]
+
+    def _set_partial(self, partial):
+        """Add a partial, replacing any partial of the same name."""
+        self._unshare()
+        self._partials[partial.name] = partial
+        self._invalidate_resolved_bases(partial.name)
+
+    def _remove_partial(self, name):
+        """Remove a partial."""
+        self._unshare()
+        del self._partials[name]
+        self._invalidate_resolved_bases(name)
+
+    def _add_spec(self, spec, owner=None):
+        """Add a specification to the internal dict and metric index,
+        replacing any specification of the same name.
+
+        Parameters
+        ----------
+        spec : `Specification`
+            Specification to add.
+        owner : `object`, optional
+            Owner of the specification, if it may be shared with another
+            set. By default, the specification is owned by this set.
+        """
+        self._unshare()
+        name = spec.name
+        if name in self._specs:
+            self._remove_spec(name)
+        self._specs[name] = spec
+        self._spec_owners[name] = self._owner if owner is None else owner
+        metric_name = spec.metric_name
+        self._metric_index.setdefault(metric_name, {})[name] = spec
+        self._metric_thresholds.pop(metric_name, None)
+        self._index_metadata_query(spec)
+        self._index_tags(spec)
+        self._invalidate_resolved_bases(name)
+
+    def _remove_spec(self, name):
+        """Remove a specification from the internal dict and metric index.
+        """
+        self._unshare()
+        spec = self._specs.pop(name)
+        del self._spec_owners[name]
+        metric_name = spec.metric_name
+        metric_specs = self._metric_index[metric_name]
+        del metric_specs[name]
+        if len(metric_specs) == 0:
+            del self._metric_index[metric_name]
+        self._metric_thresholds.pop(metric_name, None)
+        self._unindex_metadata_query(spec)
+        self._unindex_tags(name)
+        self._invalidate_resolved_bases(name)
+
+    def _index_metadata_query(self, spec):
+        """Add a specification's metadata query terms to the inverted
+        metadata index.
+        """
+        name = spec.name
+        terms = spec.metadata_query.terms
+        if len(terms) == 0:
+            self._unconstrained_specs.add(name)
+            return
+
+        try:
+            for term_value in terms.values():
+                hash(term_value)
+        except TypeError:
+            self._unindexed_specs.add(name)
+            return
+
+        for term_key, term_value in terms.items():
+            values = self._meta_index.setdefault(term_key, {})
+            values.setdefault(term_value, set()).add(name)
+        self._meta_term_counts[name] = len(terms)
+
+    def _unindex_metadata_query(self, spec):
+        """Remove a specification's metadata query terms from the inverted
+        metadata index.
+        """
+        name = spec.name
+        self._unconstrained_specs.discard(name)
+        self._unindexed_specs.discard(name)
+        if self._meta_term_counts.pop(name, None) is None:
+            return
+
+        for term_key, term_value in spec.metadata_query.terms.items():
+            values = self._meta_index[term_key]
+            names = values[term_value]
+            names.discard(name)
+            if len(names) == 0:
+                del values[term_value]
+            if len(values) == 0:
+                del self._meta_index[term_key]
+
+    def _index_tags(self, spec):
+        """Add a specification's tags to the inverted tag index."""
+        tags = frozenset(spec.tags)
+        self._indexed_tags[spec.name] = tags
+        for tag in tags:
+            self._tag_index.setdefault(tag, set()).add(spec.name)
+
+    def _unindex_tags(self, name):
+        """Remove a specification from the inverted tag index."""
+        for tag in self._indexed_tags.pop(name):
+            names = self._tag_index[tag]
+            names.discard(name)
+            if len(names) == 0:
+                del self._tag_index[tag]
+
+    def _sync_tag_index(self):
+        """Re-index the specifications whose tags were assigned since they
+        were indexed.
+        """
+        tags_token = Specification._tags_token
+        if self._tags_token is tags_token:
+            return
+        for name, spec in list(self._specs.items()):
+            if spec.tags != self._indexed_tags[name]:
+                # Copy shared indexes, without materializing views
+                SpecificationSet._unshare(self)
+                self._unindex_tags(name)
+                self._index_tags(spec)
+        self._tags_token = tags_token
+
+    def _find_tagged(self, tags):
+        """Find the specifications that have all the given tags, using the
+        inverted tag index.
+
+        Parameters
+        ----------
+        tags : `set` of `str`
+            Tags to select specifications by.
+
+        Returns
+        -------
+        spec_names : `set` of `lsst.verify.Name`
+            Names of specifications whose tags are a superset of ``tags``.
+
+        Notes
+        -----
+        The index's sets of names for each tag are intersected, starting
+        with the smallest one, so the cost is proportional to the number of
+        specifications with the rarest tag rather than to the size of the
+        set. The index is first brought up to date if the tags of any
+        specification were assigned since it was last updated. Tags added to
+        a specification's `~Specification.tags` in place are only indexed
+        when the specification is inserted again.
+        """
+        if len(tags) == 0:
+            return set(self._specs)
+
+        self._sync_tag_index()
+
+        postings = []
+        for tag in tags:
+            try:
+                postings.append(self._tag_index[tag])
+            except KeyError:
+                return set()
+        postings.sort(key=len)
+        names = set(postings[0])
+        for other_names in postings[1:]:
+            names &= other_names
+        # Guard against tags removed from a specification after it was
+        # indexed
+        return set(name for name in names
+                   if tags <= self._specs[name].tags)
+
+    def _match_metadata(self, meta):
+        """Find the specifications whose metadata queries match the
+        metadata, using the inverted metadata index.
+
+        Parameters
+        ----------
+        meta : `lsst.verify.Metadata` or `dict`-type
+            Metadata mapping.
+
+        Returns
+        -------
+        spec_names : `set` of `lsst.verify.Name`
+            Names of specifications that apply to ``meta``.
+        """
+        matched = set(self._unconstrained_specs)
+
+        # Count how many of each specification's terms are matched; a
+        # specification applies if all its terms match.
+        hits = {}
+        for term_key, values in self._meta_index.items():
+            if term_key not in meta:
+                continue
+            try:
+                names = values[meta[term_key]]
+            except (KeyError, TypeError):
+                # No term with this value, or the value is unhashable
+                continue
+            for name in names:
+                hits[name] = hits.get(name, 0) + 1
+        matched.update(name for name, count in hits.items()
+                       if count == self._meta_term_counts[name])
+
+        matched.update(name for name in self._unindexed_specs
+                       if self._specs[name].query_metadata(meta))
+        return matched
 
     def __iter__(self):
+        self._load_pending()
         for key in self._specs:
             yield key
 
@@ -656,6 +1473,7 @@ class SpecificationSet(JsonSerializationMixin):
         keys : sequence of `Name`
             Keys to the specification set.
         """
+        self._load_pending()
         return self._specs.keys()
 
     def items(self):
@@ -669,8 +1487,9 @@ class SpecificationSet(JsonSerializationMixin):
             - `Name` of the specification.
             - `Specification`-type object.
         """
-        for name, spec in self._specs.items():
-            yield name, spec
+        self._load_pending()
+        for name in list(self._specs.keys()):
+            yield name, self._get_spec(name)
 
     def insert(self, spec):
         """Insert a Specification into the set.
@@ -694,9 +1513,19 @@ class SpecificationSet(JsonSerializationMixin):
             Another `SpecificationSet`. Specification in ``other`` that do
             exist in this set are added to this one. Specification in ``other``
             replace specifications of the same name in this one.
+
+        Notes
+        -----
+        Specifications are shared with ``other``. Specifications that
+        ``other`` shares with a copy of itself remain shared, and are only
+        copied when they are fetched from this set.
         """
-        for _, spec in other.items():
-            self.insert(spec)
+        for name, spec in other._iter_stored():
+            owner = other._spec_owners[name]
+            if owner is other._owner:
+                owner = None
+            self._load_pending(name.package)
+            self._add_spec(spec, owner=owner)
 
     def resolve_document(self, spec_doc):
         """Resolve inherited properties in a specification document using
@@ -714,6 +1543,10 @@ class SpecificationSet(JsonSerializationMixin):
         -------
         spec_doc : `OrderedDict`
             The specification document is returned with bases resolved.
+            The document is a new mapping, but it shares unchanged nested
+            content with ``spec_doc`` and the documents of its bases (see
+            `lsst.verify.yamlutils.merge_documents`). Make a deep copy before
+            modifying nested content.
 
         Raises
         ------
@@ -721,68 +1554,28 @@ class SpecificationSet(JsonSerializationMixin):
            Raised when a document's bases cannot be resolved (an inherited
            `~lsst.validate.base.Specification` cannot be found in the repo).
         """
-        # Create a copy of the spec_doc so that if the resolution is aborted
-        # we haven't modified the original document
-        spec_doc = copy.deepcopy(spec_doc)
+        # Create a shallow copy of the spec_doc so that if the resolution is
+        # aborted we haven't modified the original document. Nested content
+        # is shared rather than copied.
+        spec_doc = copy.copy(spec_doc)
 
         # Goal is to process all specifications and partials mentioned in
         # the 'base' field (first in, first out) and merge their information
         # to the spec_doc.
         if 'base' in spec_doc:
-            # Coerce 'base' field into a list for consistency
-            if isinstance(spec_doc['base'], basestring):
-                spec_doc['base'] = [spec_doc['base']]
-
-            built_doc = OrderedDict()
-
-            # Process all base dependencies into the specification
-            # document until all are merged
-            while len(spec_doc['base']) > 0:
-                # Select first base (first in, first out queue)
-                base_name = spec_doc['base'][0]
-
-                # Get the base: it's either another specification or a partial
-                if '#' in base_name:
-                    # We make base names fully qualifed when loading them
-                    try:
-                        base_spec = self._partials[base_name]
-                    except KeyError:
-                        # Abort because this base is not available yet
-                        raise SpecificationResolutionError
+            base_keys = tuple(SpecificationSet._get_base_keys(spec_doc))
+            del spec_doc['base']
 
-                else:
-                    # Must be a specification.
-                    # Resolve its name (use package info from present doc since
-                    # they're consistent).
-                    base_name = Name(package=spec_doc['package'],
-                                     spec=base_name)
-                    # Try getting the specification from the repo
-                    try:
-                        base_spec = self[base_name]
-                    except KeyError:
-                        # Abort because this base is not resolved
-                        # or not yet available
-                        raise SpecificationResolutionError
-
-                # Merge this spec_doc onto the base document using
-                # our inheritance algorithm
-                built_doc = merge_documents(built_doc, base_spec.json)
-
-                # Mix in metric information if available. This is useful
-                # because a specification may only assume its metric
-                # identity from inheritance.
-                try:
-                    built_doc['metric'] = base_spec.name.metric
-                except AttributeError:
-                    # base spec must be a partial
-                    pass
-
-                # Remove this base spec from the queue
-                del spec_doc['base'][0]
-
-            # if base list is empty remove it so we don't loop over it again
-            if len(spec_doc['base']) == 0:
-                del spec_doc['base']
+            # The merged bases are shared by all documents with the same
+            # bases, so they are cached.
+            try:
+                built_doc = self._resolved_bases[base_keys]
+            except KeyError:
+                built_doc = self._merge_bases(base_keys)
+                self._resolved_bases[base_keys] = built_doc
+                for base_key in base_keys:
+                    self._resolved_base_dependents.setdefault(
+                        base_key, set()).add(base_keys)
 
             # Merge this spec_doc onto the base document using
             # our inheritance algorithm
@@ -794,6 +1587,223 @@ class SpecificationSet(JsonSerializationMixin):
             # No inheritance to resolve
             return spec_doc
 
+    def _merge_bases(self, base_keys):
+        """Merge the documents of a sequence of bases (first in, first out).
+
+        Parameters
+        ----------
+        base_keys : `tuple`
+            Partial IDs (`str`) and specification names
+            (`lsst.verify.Name`) of the bases.
+
+        Returns
+        -------
+        built_doc : `OrderedDict`
+            The merged base document.
+
+        Raises
+        ------
+        SpecificationResolutionError
+           Raised when a base is not in the set.
+        """
+        built_doc = OrderedDict()
+        for base_key in base_keys:
+            # Get the base: it's either another specification or a partial
+            try:
+                base_spec = self[base_key]
+            except KeyError:
+                # Abort because this base is not resolved
+                # or not yet available
+                message = 'Specification base {0!s} not found'
+                raise SpecificationResolutionError(message.format(base_key))
+
+            # Merge this spec_doc onto the base document using
+            # our inheritance algorithm
+            built_doc = merge_documents(built_doc, base_spec.json)
+
+            # Mix in metric information if available. This is useful
+            # because a specification may only assume its metric
+            # identity from inheritance.
+            try:
+                built_doc['metric'] = base_spec.name.metric
+            except AttributeError:
+                # base spec must be a partial
+                pass
+
+        return built_doc
+
+    def _invalidate_resolved_bases(self, base_key):
+        """Drop cached merged base documents that include a partial or
+        specification, when it is replaced or deleted.
+        """
+        for cache_key in self._resolved_base_dependents.pop(base_key, ()):
+            self._resolved_bases.pop(cache_key, None)
+
+    def get_metric_specs(self, metric_name):
+        """Get the specifications for a metric.
+
+        Parameters
+        ----------
+        metric_name : `str` or `lsst.verify.Name`
+            Fully-qualified name of a metric.
+
+        Returns
+        -------
+        specs : `list` of `Specification`-types
+            Specifications of the metric. The list is empty if the set has no
+            specifications for the metric.
+
+        Notes
+        -----
+        Specifications are indexed by metric as they are inserted into (or
+        deleted from) the set, so this lookup does not scan the set.
+        """
+        if not isinstance(metric_name, Name):
+            metric_name = Name(metric=metric_name)
+        self._load_pending(metric_name.package)
+        try:
+            names = list(self._metric_index[metric_name].keys())
+        except KeyError:
+            return []
+        return [self._get_spec(name) for name in names]
+
+    def _get_metric_thresholds(self, metric_name, unit):
+        r"""Get a metric's threshold specifications grouped by comparison
+        operator, with thresholds pre-converted to plain values in the
+        given unit.
+
+        Returns
+        -------
+        groups : `list` of `tuple`
+            Each tuple contains:
+
+            - operator function (from `ThresholdSpecification.operator`).
+            - `numpy.ndarray` of specification `Name`\ s (object dtype).
+            - `numpy.ndarray` of threshold values, in ``unit``.
+        other_specs : `list`
+            Specifications of the metric that aren't threshold-type.
+
+        Raises
+        ------
+        astropy.units.UnitError
+            Raised if a threshold is not compatible with ``unit``.
+        """
+        thresholds_token = ThresholdSpecification._thresholds_token
+        if self._thresholds_token is not thresholds_token:
+            # A threshold or operator was assigned since the arrays were
+            # built. The dict may be shared with copies, so it's replaced.
+            self._metric_thresholds = {}
+            self._thresholds_token = thresholds_token
+
+        unit_cache = self._metric_thresholds.setdefault(metric_name, {})
+        try:
+            return unit_cache[unit]
+        except KeyError:
+            pass
+
+        grouped = OrderedDict()
+        other_specs = []
+        for spec_name, spec in self._metric_index[metric_name].items():
+            if not isinstance(spec, ThresholdSpecification):
+                other_specs.append(spec)
+                continue
+            if spec.operator_str not in grouped:
+                grouped[spec.operator_str] = (spec.operator, [], [])
+            _, spec_names, values = grouped[spec.operator_str]
+            spec_names.append(spec_name)
+            values.append(spec._threshold_value(unit))
+
+        groups = [(op, _object_array(spec_names),
+                   np.array(values, dtype=float))
+                  for op, spec_names, values in grouped.values()]
+        unit_cache[unit] = (groups, other_specs)
+        return groups, other_specs
+
+    def evaluate(self, measurements):
+        """Test measurements against all specifications in the set.
+
+        Parameters
+        ----------
+        measurements : `lsst.verify.MeasurementSet`
+            Measurements to test. Specifications without a corresponding
+            measurement (or whose measurement has no quantity) are skipped.
+
+        Returns
+        -------
+        results : `numpy.ndarray`
+            Structured array with one row for each tested specification,
+            sorted by specification name. Fields are:
+
+            - ``'spec'``: specification name (`lsst.verify.Name`).
+            - ``'metric'``: metric name (`lsst.verify.Name`).
+            - ``'passed'``: `True` if the measurement passed the
+              specification (`bool`).
+
+        Raises
+        ------
+        astropy.units.UnitError
+            Raised if a measurement's units are incompatible with a
+            specification's threshold.
+
+        Notes
+        -----
+        Measurements are matched to specifications through the set's
+        metric index, so the cost is proportional to the number of
+        measurements and matched specifications rather than the size of the
+        set. Each measurement is converted once to its metric's canonical
+        unit (the unit of `lsst.verify.Measurement.metric` if available, or
+        else the measurement's own unit). A metric's threshold
+        specifications are grouped by comparison operator, and their
+        thresholds are converted to that unit once and cached as `numpy`
+        arrays (until the metric's specifications, or any specification's
+        threshold or operator, change). Each group is tested with a single
+        vectorized comparison of plain values.
+        """
+        spec_cols = []
+        metric_cols = []
+        passed_cols = []
+
+        for metric_name, measurement in measurements.items():
+            self._load_pending(metric_name.package)
+            quantity = measurement.quantity
+            if quantity is None or metric_name not in self._metric_index:
+                continue
+
+            if measurement.metric is not None:
+                unit = measurement.metric.unit
+            else:
+                unit = quantity.unit
+            value = quantity.to_value(unit)
+
+            groups, other_specs = self._get_metric_thresholds(metric_name,
+                                                              unit)
+            for op, spec_names, thresholds in groups:
+                spec_cols.append(spec_names)
+                metric_cols.append(np.full(len(spec_names), metric_name,
+                                           dtype=object))
+                passed_cols.append(np.asarray(op(value, thresholds),
+                                              dtype=bool))
+
+            if other_specs:
+                spec_cols.append(_object_array(
+                    [spec.name for spec in other_specs]))
+                metric_cols.append(np.full(len(other_specs), metric_name,
+                                           dtype=object))
+                passed_cols.append(np.array(
+                    [bool(spec.check(quantity)) for spec in other_specs],
+                    dtype=bool))
+
+        results = np.zeros(sum(len(col) for col in spec_cols),
+                           dtype=[('spec', object), ('metric', object),
+                                  ('passed', bool)])
+        if len(results) > 0:
+            specs = np.concatenate(spec_cols)
+            order = np.argsort(specs, kind='stable')
+            results['spec'] = specs[order]
+            results['metric'] = np.concatenate(metric_cols)[order]
+            results['passed'] = np.concatenate(passed_cols)[order]
+        return results
+
     def subset(self, name=None, meta=None, spec_tags=None, metric_tags=None,
                metrics=None):
         """Create a new `SpecificationSet` with specifications belonging to
@@ -834,14 +1844,31 @@ class SpecificationSet(JsonSerializationMixin):
             belonging to the indicated package or metric, and/or that are
             compatible with the job metadata.. Any partials in
             the SpecificationSet are also included in ``spec_subset``.
+
+        Notes
+        -----
+        The subset is a view: it shares this set's specifications, partials
+        and indexes, and applies the filters as it is read, so making a
+        subset doesn't copy the set. Subsets of subsets compose their
+        filters. The view is turned into an independent set the first time
+        it is modified. Later changes to this set don't affect the subset.
         """
         if metric_tags is not None and metrics is None:
             message = ('A MetricSet must be provided through the metrics '
                        'argument when subsetting ith metric_tags.')
             raise ValueError(message)
 
-        all_partials = [partial
-                        for partial_name, partial in self._partials.items()]
+        if name is not None and meta is None and spec_tags is None and \
+                metric_tags is None:
+            # Only the named package is needed
+            if not isinstance(name, Name):
+                name = Name(name)
+            self._load_pending(name.package)
+        else:
+            self._load_pending()
+
+        # Names of selected specifications; None selects all of them.
+        selected = None
 
         # Filter by package or metric name
         if name is not None:
@@ -852,38 +1879,44 @@ class SpecificationSet(JsonSerializationMixin):
                 message = '{0!s} is not a fully-qualified name'.format(name)
                 raise RuntimeError(message)
 
-            specs = [spec for spec_name, spec in self._specs.items()
-                     if spec_name in name]
-
-            spec_subset = SpecificationSet(specifications=specs,
-                                           partials=all_partials)
-        else:
-            spec_subset = self
-
-        # Filter by metadata
+            # Select through the metric index so that only specifications
+            # of matching metrics are visited.
+            selected = set(
+                spec_name
+                for metric_name, specs in self._metric_index.items()
+                if metric_name == name or metric_name in name
+                for spec_name in specs
+                if spec_name in name)
+
+        # Filter by metadata, using the inverted index of metadata queries
+        # rather than evaluating each specification's query.
         if meta is not None:
-            specs = [spec for spec_name, spec in spec_subset.items()
-                     if spec.query_metadata(meta)]
-
-            spec_subset = SpecificationSet(specifications=specs,
-                                           partials=all_partials)
+            meta_selected = self._match_metadata(meta)
+            if selected is None:
+                selected = meta_selected
+            else:
+                selected &= meta_selected
 
-        # Filter by specifiation tags
+        # Filter by specifiation tags, using the inverted tag index
         if spec_tags is not None:
-            spec_tags = set(spec_tags)
-            specs = [spec for spec_name, spec in spec_subset.items()
-                     if spec_tags <= spec.tags]
-
-            spec_subset = SpecificationSet(specifications=specs,
-                                           partials=all_partials)
+            tagged = self._find_tagged(set(spec_tags))
+            if selected is None:
+                selected = tagged
+            else:
+                selected &= tagged
 
-        # Filter by metric tags
+        # Filter by metric tags, using the MetricSet's tag index and this
+        # set's metric index
         if metric_tags is not None:
-            metric_tags = set(metric_tags)
-            specs = [spec for spec_name, spec in spec_subset.items()
-                     if metric_tags <= metrics[spec.metric_name].tags]
+            tagged = set()
+            for metric_name in metrics._find_tagged(set(metric_tags)):
+                tagged.update(self._metric_index.get(metric_name, ()))
+            if selected is None:
+                selected = tagged
+            else:
+                selected &= tagged
 
-        return spec_subset
+        return _SpecificationSetView(self, names=selected)
 
     def report(self, measurements, name=None, meta=None, spec_tags=None,
                metric_tags=None, metrics=None):
@@ -959,6 +1992,196 @@ class SpecificationSet(JsonSerializationMixin):
         return table._repr_html_()
 
 
+class _SpecificationSetView(SpecificationSet):
+    """A lazily filtered view of a `SpecificationSet`, made by
+    `SpecificationSet.subset`.
+
+    Parameters
+    ----------
+    parent : `SpecificationSet`
+        Set to make a view of (possibly another view).
+    names : `set` of `lsst.verify.Name`, optional
+        Names of the selected specifications (names that aren't in the set
+        are ignored). All specifications are selected if `None`.
+
+    Notes
+    -----
+    The view shares the internal containers and indexes of ``parent`` (as
+    a copy made with `copy.copy` does) and filters them as it is read.
+    All partials are included. Views of views intersect their selections.
+    The selected specifications are only listed when the view is iterated
+    over or its length is needed. Before the view is modified, it is
+    materialized: its containers are copied, without the specifications
+    that aren't selected, and it behaves like a plain `SpecificationSet`
+    from then on.
+    """
+
+    def __init__(self, parent, names=None):
+        self.__dict__.update(parent.__dict__)
+        parent._shared = True
+        self._shared = True
+        # Packages that weren't needed to make the subset aren't part of it
+        self._pending_packages = {}
+
+        if isinstance(parent, _SpecificationSetView) and \
+                parent._view_names is not None:
+            if names is None:
+                names = parent._view_names
+            else:
+                names = names & parent._view_names
+        self._view_names = names
+        # Selected names, listed on demand
+        self._view_keys = None
+        # Grouped thresholds of selected specifications, by (metric, unit),
+        # with the parent's groups they were filtered from
+        self._view_thresholds = {}
+
+    def __reduce__(self):
+        # Pickle the selected specifications, as a plain SpecificationSet
+        return (SpecificationSet,
+                ([spec for _, spec in self.items()],
+                 list(self._partials.values())))
+
+    @property
+    def _is_filtered(self):
+        return self._view_names is not None
+
+    def _view_contains(self, name):
+        """Check if a specification is in the set and selected by the
+        view.
+        """
+        return name in self._view_names and name in self._specs
+
+    def _get_view_keys(self):
+        """List the names of the selected specifications."""
+        if self._view_keys is None:
+            self._view_keys = [name for name in sorted(self._view_names)
+                               if name in self._specs]
+        return self._view_keys
+
+    def _unshare(self):
+        if self._is_filtered:
+            # Materialize the view
+            names = set(self._get_view_keys())
+            self._view_names = None
+            self._view_keys = None
+            SpecificationSet._unshare(self)
+            for name in list(self._specs.keys()):
+                if name not in names:
+                    self._remove_spec(name)
+        else:
+            SpecificationSet._unshare(self)
+
+    def __len__(self):
+        if not self._is_filtered:
+            return SpecificationSet.__len__(self)
+        return len(self._get_view_keys())
+
+    def __contains__(self, name):
+        if not SpecificationSet.__contains__(self, name):
+            return False
+        if not self._is_filtered or \
+                (isinstance(name, basestring) and '#' in name):
+            return True
+        if not isinstance(name, Name):
+            name = Name(spec=name)
+        return self._view_contains(name)
+
+    def __getitem__(self, name):
+        item = SpecificationSet.__getitem__(self, name)
+        if self._is_filtered and isinstance(item, Specification) and \
+                not self._view_contains(item.name):
+            raise KeyError(name)
+        return item
+
+    def __iter__(self):
+        if not self._is_filtered:
+            return SpecificationSet.__iter__(self)
+        return iter(self._get_view_keys())
+
+    def keys(self):
+        if not self._is_filtered:
+            return SpecificationSet.keys(self)
+        return list(self._get_view_keys())
+
+    def items(self):
+        if not self._is_filtered:
+            return SpecificationSet.items(self)
+        return ((name, self._get_spec(name))
+                for name in self._get_view_keys())
+
+    def _find_tagged(self, tags):
+        names = SpecificationSet._find_tagged(self, tags)
+        if not self._is_filtered:
+            return names
+        return set(name for name in names if self._view_contains(name))
+
+    def get_metric_specs(self, metric_name):
+        specs = SpecificationSet.get_metric_specs(self, metric_name)
+        if not self._is_filtered:
+            return specs
+        return [spec for spec in specs if self._view_contains(spec.name)]
+
+    def _get_metric_thresholds(self, metric_name, unit):
+        # Filter the parent's grouped thresholds down to the view's
+        # selection once, so that evaluate only tests selected specifications
+        groups, other_specs = SpecificationSet._get_metric_thresholds(
+            self, metric_name, unit)
+        if not self._is_filtered:
+            return groups, other_specs
+
+        key = (metric_name, unit)
+        try:
+            source, filtered = self._view_thresholds[key]
+            if source is groups:
+                return filtered
+        except KeyError:
+            pass
+
+        filtered_groups = []
+        for op, spec_names, thresholds in groups:
+            selected = np.array([name in self._view_names
+                                 for name in spec_names], dtype=bool)
+            if selected.any():
+                filtered_groups.append((op, spec_names[selected],
+                                        thresholds[selected]))
+        filtered = (filtered_groups,
+                    [spec for spec in other_specs
+                     if spec.name in self._view_names])
+        self._view_thresholds[key] = (groups, filtered)
+        return filtered
+
+
+def _object_array(items):
+    r"""Make a 1-D `numpy.ndarray` of object dtype from a sequence of
+    objects (such as `lsst.verify.Name`\ s).
+    """
+    array = np.empty(len(items), dtype=object)
+    array[:] = items
+    return array
+
+
+def _parse_specification_yaml_file(args):
+    """Parse a specification YAML file (module-level so that it can run in
+    worker processes).
+
+    Parameters
+    ----------
+    args : `tuple`
+        Path of the YAML file and path of the package's specification
+        directory (arguments of `SpecificationSet._load_yaml_file`).
+
+    Returns
+    -------
+    spec_docs : `list`
+        Specification documents.
+    partial_docs : `list`
+        Partial documents.
+    """
+    yaml_file_path, package_dirname = args
+    return SpecificationSet._load_yaml_file(yaml_file_path, package_dirname)
+
+
 class SpecificationPartial(object):
     """A specification definition partial, used when parsing specification
     YAML repositories.
@@ -0,0 +1,471 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Durable spool of jobs waiting to be uploaded to SQUASH.
+
+`enqueue` writes a job's JSON document to the spool without using the
+network, so pipelines never wait on SQUASH. `drain` later uploads the
+spooled jobs.
+
+The spool directory is ``$LSST_VERIFY_SPOOL_DIR`` if set, or else
+``lsst_verify/spool`` in ``$XDG_DATA_HOME`` (``~/.local/share`` by default).
+It contains:
+
+- ``pending/``: gzip-compressed JSON documents waiting to be uploaded,
+  named by their content hash (see `enqueue`).
+- ``done/``: empty markers, named by content hash, of uploaded documents.
+  Documents with the content of an uploaded document are not enqueued or
+  uploaded again while the marker is kept (see `drain`).
+- ``rejected/``: documents that SQUASH rejected as invalid.
+"""
+
+from __future__ import print_function, division
+
+__all__ = ['get_spool_dir', 'enqueue', 'list_spooled', 'drain',
+           'DrainResult']
+
+from collections import namedtuple
+import hashlib
+import json
+from multiprocessing.pool import ThreadPool
+import os
+import tempfile
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    # Not POSIX; concurrent drains may upload a job twice
+    fcntl = None
+
+import requests
+
+import lsst.log
+
+from . import squash
+from .packagecache import _replace
+
+# File name suffix of spooled documents
+_SUFFIX = '.json.gz'
+
+# HTTP statuses with which SQUASH rejects the content of a document: bad
+# request, payload too large and unprocessable entity
+_REJECTION_STATUSES = (400, 413, 422)
+
+# Default age, in seconds, after which done markers are removed by `drain`
+_MAX_DONE_AGE = 30 * 24 * 3600.
+
+# Result of `drain`: `list`\ s of the content hashes of uploaded documents,
+# of documents that were already uploaded or being uploaded by another
+# drain, and of documents that failed to upload.
+DrainResult = namedtuple('DrainResult', ['uploaded', 'duplicates', 'failed'])
+
+
+def get_spool_dir():
+    """Get the spool directory.
+
+    Returns
+    -------
+    spool_dir : `str`
+        Path of the spool directory. The directory may not exist yet.
+    """
+    spool_dir = os.environ.get('LSST_VERIFY_SPOOL_DIR')
+    if spool_dir:
+        return spool_dir
+
+    xdg_data_home = os.environ.get('XDG_DATA_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.local', 'share')
+    return os.path.join(xdg_data_home, 'lsst_verify', 'spool')
+
+
+def _get_subdir(spool_dir, name):
+    """Get a subdirectory of the spool, creating it if necessary."""
+    if spool_dir is None:
+        spool_dir = get_spool_dir()
+    path = os.path.join(spool_dir, name)
+    if not os.path.isdir(path):
+        try:
+            os.makedirs(path)
+        except OSError:
+            # Created concurrently
+            if not os.path.isdir(path):
+                raise
+    return path
+
+
+def _is_done(spool_dir, content_hash):
+    return os.path.exists(
+        os.path.join(_get_subdir(spool_dir, 'done'), content_hash))
+
+
+def _canonicalize(json_doc):
+    """Get the canonical form of a job's JSON document, whose hash
+    identifies the document.
+
+    Measurement and blob identifiers are random UUIDs that change whenever
+    a job is built or deserialized, so they are replaced by numbers in order
+    of appearance. Only the ``identifier`` and ``blob_refs`` fields of
+    ``measurements`` and ``blobs`` items are replaced; other documents are
+    returned unchanged.
+    """
+    if not isinstance(json_doc, dict):
+        return json_doc
+
+    numbers = {}
+
+    def renumber(identifier):
+        return numbers.setdefault(identifier, len(numbers))
+
+    canonical = dict(json_doc)
+    for key in ('measurements', 'blobs'):
+        items = json_doc.get(key)
+        if not isinstance(items, list):
+            continue
+        canonical_items = []
+        for item in items:
+            if isinstance(item, dict):
+                item = dict(item)
+                if 'identifier' in item:
+                    item['identifier'] = renumber(item['identifier'])
+                if isinstance(item.get('blob_refs'), list):
+                    item['blob_refs'] = [renumber(identifier)
+                                         for identifier in item['blob_refs']]
+            canonical_items.append(item)
+        canonical[key] = canonical_items
+    return canonical
+
+
+def _compute_content_hash(json_doc):
+    """Compute the content hash of a JSON document: the SHA-256 digest of
+    its canonical form (`_canonicalize`), serialized with sorted keys.
+    """
+    digest = hashlib.sha256()
+    encoder = json.JSONEncoder(sort_keys=True)
+    for piece in encoder.iterencode(_canonicalize(json_doc)):
+        digest.update(piece.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def enqueue(json_doc, spool_dir=None):
+    """Add a JSON document to the spool.
+
+    Parameters
+    ----------
+    json_doc : `dict`
+        A JSON-serializable document, such as a job's.
+    spool_dir : `str`, optional
+        Spool directory. The value of `get_spool_dir` is used by default.
+
+    Returns
+    -------
+    content_hash : `str`
+        Content hash of the document: the hexadecimal SHA-256 digest of its
+        canonical JSON serialization, with sorted keys and with the random
+        identifiers of a job's measurements and blobs numbered in order of
+        appearance.
+
+    Notes
+    -----
+    The document is serialized and compressed incrementally to a temporary
+    file, which is then renamed into place. Renames are atomic, so a drain
+    never sees a partial document. A document with the content hash of a
+    spooled or uploaded document isn't enqueued again, so the same job can
+    be spooled repeatedly, even after being deserialized again.
+    """
+    pending_dir = _get_subdir(spool_dir, 'pending')
+
+    content_hash = _compute_content_hash(json_doc)
+    path = os.path.join(pending_dir, content_hash + _SUFFIX)
+    if os.path.exists(path) or _is_done(spool_dir, content_hash):
+        return content_hash
+
+    fd, temp_path = tempfile.mkstemp(dir=pending_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in squash._iter_gzip(squash._iter_json(json_doc)):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if os.path.exists(path) or _is_done(spool_dir, content_hash):
+            os.remove(temp_path)
+        else:
+            _replace(temp_path, path)
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    return content_hash
+
+
+def list_spooled(spool_dir=None):
+    """List the documents waiting in the spool.
+
+    Parameters
+    ----------
+    spool_dir : `str`, optional
+        Spool directory. The value of `get_spool_dir` is used by default.
+
+    Returns
+    -------
+    content_hashes : `list` of `str`
+        Content hashes of the spooled documents, oldest first.
+    """
+    pending_dir = _get_subdir(spool_dir, 'pending')
+    entries = []
+    for filename in os.listdir(pending_dir):
+        if not filename.endswith(_SUFFIX):
+            continue
+        try:
+            mtime = os.path.getmtime(os.path.join(pending_dir, filename))
+        except OSError:
+            # Drained concurrently
+            continue
+        entries.append((mtime, filename[:-len(_SUFFIX)]))
+    return [content_hash for _, content_hash in sorted(entries)]
+
+
+def _is_rejection(error):
+    """Test if an upload error means that SQUASH won't ever accept the
+    document.
+
+    Only errors about the document's content are rejections. Other client
+    errors, such as invalid credentials (401, 403) or a wrong API URL
+    (404), are fixed outside the spool, so their documents are retried by
+    later drains.
+    """
+    response = getattr(error, 'response', None)
+    if response is None:
+        return False
+    return response.status_code in _REJECTION_STATUSES
+
+
+def _is_transient(error):
+    """Test if an upload error may go away when the upload is retried
+    during the same drain.
+    """
+    response = getattr(error, 'response', None)
+    if response is None:
+        # Connection errors and timeouts
+        return True
+    return not 400 <= response.status_code < 500 or \
+        response.status_code in (408, 429)
+
+
+def _upload(spool_dir, content_hash, api_url, api_user, api_password,
+            compress, timeout, version, max_attempts):
+    """Upload a spooled document.
+
+    Returns
+    -------
+    outcome : `str`
+        ``'uploaded'``, ``'duplicate'`` or ``'failed'``.
+    """
+    log = lsst.log.Log.getLogger('verify.spool.drain')
+
+    pending_dir = _get_subdir(spool_dir, 'pending')
+    path = os.path.join(pending_dir, content_hash + _SUFFIX)
+    try:
+        f = open(path, 'rb')
+    except (IOError, OSError):
+        # Drained concurrently
+        return 'duplicate'
+
+    with f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                # Being uploaded by another drain
+                return 'duplicate'
+        if not os.path.exists(path) or _is_done(spool_dir, content_hash):
+            # Uploaded by another drain
+            if os.path.exists(path):
+                os.remove(path)
+            return 'duplicate'
+        data = f.read()
+
+        headers = None
+        attempt = 0
+        while True:
+            try:
+                # Endpoint discovery also fails if SQUASH is unreachable,
+                # so it is retried with the upload
+                api_endpoint_url = squash.get_endpoint_url(api_url, 'jobs')
+                if headers is None:
+                    if compress is None:
+                        compress = squash._accepts_gzip(api_url)
+                    headers = {'Accept': squash.make_accept_header(version),
+                               'Content-Type': 'application/json'}
+                    if compress:
+                        headers['Content-Encoding'] = 'gzip'
+                    else:
+                        data = zlib.decompress(data, 16 + zlib.MAX_WBITS)
+                squash._post_body(api_endpoint_url, {'data': data}, headers,
+                                  api_user=api_user,
+                                  api_password=api_password,
+                                  timeout=timeout)
+                break
+            except requests.exceptions.RequestException as e:
+                attempt += 1
+                if _is_rejection(e):
+                    log.error('Job {0} rejected: {1}'.format(
+                        content_hash, e))
+                    rejected_dir = _get_subdir(spool_dir, 'rejected')
+                    _replace(path, os.path.join(rejected_dir,
+                                                content_hash + _SUFFIX))
+                    return 'failed'
+                if attempt >= max_attempts or not _is_transient(e):
+                    log.error('Job {0} upload failed: {1}'.format(
+                        content_hash, e))
+                    return 'failed'
+                delay = squash._get_backoff(attempt)
+                log.warning('Job {0} upload failed ({1}); retrying in '
+                            '{2:.1f} s'.format(content_hash, e, delay))
+                time.sleep(delay)
+
+        # Mark the document as uploaded before removing it, so that it's
+        # never uploaded twice
+        marker_path = os.path.join(_get_subdir(spool_dir, 'done'),
+                                   content_hash)
+        with open(marker_path, 'w'):
+            pass
+        os.remove(path)
+
+    log.info('Job {0} uploaded'.format(content_hash))
+    return 'uploaded'
+
+
+def _prune_done(spool_dir, max_age):
+    """Remove the done markers older than ``max_age`` seconds."""
+    done_dir = _get_subdir(spool_dir, 'done')
+    oldest = time.time() - max_age
+    for content_hash in os.listdir(done_dir):
+        marker_path = os.path.join(done_dir, content_hash)
+        try:
+            if os.path.getmtime(marker_path) < oldest:
+                os.remove(marker_path)
+        except OSError:
+            # Pruned concurrently
+            pass
+
+
+def drain(api_url, api_user=None, api_password=None, spool_dir=None,
+          max_concurrency=4, max_attempts=5, compress=None, timeout=None,
+          version=None, max_done_age=_MAX_DONE_AGE):
+    """Upload the documents waiting in the spool to the SQUASH ``jobs``
+    endpoint.
+
+    Parameters
+    ----------
+    api_url : `str`
+        Root URL of the SQUASH API. For example,
+        ``'https://squash.lsst.codes/dashboard/api/'``.
+    api_user : `str`, optional
+        API username.
+    api_password : `str`, optional
+        API password.
+    spool_dir : `str`, optional
+        Spool directory. The value of `get_spool_dir` is used by default.
+    max_concurrency : `int`, optional
+        Maximum number of documents uploaded at once.
+    max_attempts : `int`, optional
+        Maximum number of times each document's upload is attempted. Failed
+        attempts are retried after a randomized, exponentially increasing
+        delay (see `lsst.verify.squash.configure_session`).
+    compress : `bool`, optional
+        Upload documents compressed with gzip, as they are spooled. By
+        default, documents are uploaded compressed if the server advertises
+        support for it (see `lsst.verify.squash.post`).
+    timeout : `float`, optional
+        Request timeout. The value of
+        `lsst.verify.squash.get_default_timeout` is used by default.
+    version : `str`, optional
+        API version. The value of
+        `lsst.verify.squash.get_default_api_version` is used by default.
+    max_done_age : `float`, optional
+        Age, in seconds, after which the markers of uploaded documents are
+        removed. Documents are only recognized as uploaded while their
+        marker is kept, so older documents may be enqueued and uploaded
+        again. Thirty days by default. If `None`, markers are never
+        removed.
+
+    Returns
+    -------
+    result : `DrainResult`
+        Content hashes of the uploaded, duplicate and failed documents.
+
+    Notes
+    -----
+    Uploaded documents are removed from the spool. Documents that failed to
+    upload remain in the spool for the next drain, unless SQUASH rejected
+    their content (with status 400, 413 or 422), in which case they are
+    moved to the spool's ``rejected/`` directory. Other client errors, such
+    as invalid credentials or a wrong API URL, aren't retried during the
+    drain, but leave the documents in the spool.
+
+    Failures are isolated to each document: a document that can't be
+    uploaded, for example because SQUASH is unreachable, is reported as
+    failed without stopping the upload of the others.
+
+    Several drains of the same spool can run at once: each document is
+    locked while it is uploaded, and uploaded at most once.
+    """
+    log = lsst.log.Log.getLogger('verify.spool.drain')
+
+    if max_done_age is not None:
+        _prune_done(spool_dir, max_done_age)
+
+    content_hashes = list_spooled(spool_dir)
+
+    def upload(content_hash):
+        try:
+            return _upload(spool_dir, content_hash, api_url, api_user,
+                           api_password, compress, timeout, version,
+                           max_attempts)
+        except Exception as e:
+            log.error('Job {0} upload failed: {1}'.format(content_hash, e))
+            return 'failed'
+
+    result = DrainResult([], [], [])
+    if not content_hashes:
+        return result
+
+    pool = ThreadPool(max_concurrency)
+    try:
+        outcomes = pool.map(upload, content_hashes, chunksize=1)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    for content_hash, outcome in zip(content_hashes, outcomes):
+        if outcome == 'uploaded':
+            result.uploaded.append(content_hash)
+        elif outcome == 'duplicate':
+            result.duplicates.append(content_hash)
+        else:
+            result.failed.append(content_hash)
+    return result
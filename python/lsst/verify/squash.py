@@ -32,22 +32,315 @@ from __future__ import print_function
 
 __all__ = ['get', 'post', 'get_endpoint_url', 'reset_endpoint_cache',
            'get_default_timeout', 'get_default_api_version',
-           'make_accept_header']
+           'make_accept_header', 'get_session', 'configure_session',
+           'close_session', 'get_session_stats', 'reset_session_stats',
+           'configure_endpoint_cache', 'post_chunked']
 
+from collections import OrderedDict
+from email.utils import parsedate_tz, mktime_tz
+import hashlib
 import json
+from multiprocessing.pool import ThreadPool
+import os
+import pickle
+import random
+import threading
+import time
+import zlib
 
 import requests
 
 import lsst.log
 
+from .packagecache import get_cache_dir, _is_persistent, _write_atomic
+
 # Version of the SQUASH API this client is compatible with
 _API_VERSION = '2.0'
 
+# Maximum number of characters of a failed request's response body that are
+# logged.
+_MAX_LOGGED_BODY = 1000
+
 # Default HTTP timeout (seconds) for all SQUASH client requests.
 _TIMEOUT = 30.0
 
+# Default configuration of the endpoint URL cache. See
+# `configure_endpoint_cache`.
+_DEFAULT_ENDPOINT_CACHE_CONFIG = {
+    'ttl': 3600.,
+    'persistent': None,
+    'path': None,
+}
+
+# Current endpoint URL cache configuration.
+_ENDPOINT_CACHE_CONFIG = dict(_DEFAULT_ENDPOINT_CACHE_CONFIG)
+
+# Default configuration of the HTTP session shared by all SQUASH client
+# requests. See `configure_session`.
+_DEFAULT_SESSION_CONFIG = {
+    'pool_connections': 10,
+    'pool_maxsize': 10,
+    'keep_alive': True,
+    'max_retries': 3,
+    'backoff_factor': 0.5,
+    'backoff_max': 30.0,
+}
+
+# Current session configuration, set by `configure_session()`.
+_SESSION_CONFIG = dict(_DEFAULT_SESSION_CONFIG)
+
+# The shared `requests.Session`, created by `get_session()`.
+_SESSION = None
+
+# Guards creation and replacement of _SESSION, and updates of _STATS.
+_SESSION_LOCK = threading.RLock()
+
+# Request and retry counters reported by `get_session_stats()`.
+_STATS = {
+    'requests': 0,
+    'retries': 0,
+    'retry_after_waits': 0,
+    'connection_errors': 0,
+}
+
+# HTTP methods that are retried after server errors and connection errors.
+# Other methods (POST) are only retried if the connection couldn't be made.
+_IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+# HTTP status codes of responses to idempotent requests that are retried.
+_RETRY_STATUSES = frozenset((429, 502, 503, 504))
+
+# Approximate size, in bytes, of the chunks of serialized JSON request bodies.
+_BODY_CHUNK_SIZE = 64 * 1024
+
+# Default maximum size, in bytes, of the items in a chunk uploaded by
+# `post_chunked()`.
+_MAX_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class _EndpointCache(object):
+    """Cache of the endpoint URLs of SQUASH API roots.
+
+    Entries expire after the configured TTL, and are optionally persisted to
+    a pickle in the user cache directory so that later processes can reuse
+    them (see `configure_endpoint_cache`). Concurrent lookups of the same
+    API root make a single discovery request.
+    """
+
+    def __init__(self):
+        # Guards _entries, _root_locks and _loaded
+        self._lock = threading.Lock()
+        # (discovery time, endpoint URL dict, frozenset of request content
+        # codings accepted by the server), keyed by API root URL
+        self._entries = {}
+        # Held while discovering endpoints, keyed by API root URL
+        self._root_locks = {}
+        # Whether persisted entries were read
+        self._loaded = False
+
+    @staticmethod
+    def _get_path():
+        """Get the path of the persisted cache, or `None` if persistence
+        is disabled.
+        """
+        persistent = _ENDPOINT_CACHE_CONFIG['persistent']
+        if persistent is None:
+            persistent = _is_persistent()
+        if not persistent or os.environ.get('LSST_VERIFY_NO_CACHE'):
+            return None
+        path = _ENDPOINT_CACHE_CONFIG['path']
+        if path is None:
+            path = os.path.join(get_cache_dir(), 'squash_endpoints.pickle')
+        return path
+
+    @staticmethod
+    def _read(path):
+        """Read persisted entries, returning an empty `dict` if they can't
+        be read.
+        """
+        try:
+            with open(path, 'rb') as f:
+                entries = pickle.load(f)
+        except Exception:
+            return {}
+        if not isinstance(entries, dict):
+            return {}
+        return entries
+
+    def _persist(self, api_url):
+        """Merge an entry into the persisted cache.
+
+        Must be called with ``self._lock`` held.
+        """
+        path = self._get_path()
+        if path is None:
+            return
+        entries = self._read(path)
+        if api_url in self._entries:
+            entries[api_url] = self._entries[api_url]
+        else:
+            entries.pop(api_url, None)
+        try:
+            _write_atomic(path, entries)
+        except Exception:
+            # The cache is an optimization; carry on without it
+            pass
+
+    def _lookup(self, api_url):
+        """Get the unexpired entry of an API root, or `None`."""
+        with self._lock:
+            if not self._loaded:
+                path = self._get_path()
+                if path is not None:
+                    for url, entry in self._read(path).items():
+                        self._entries.setdefault(url, entry)
+                self._loaded = True
+
+            entry = self._entries.get(api_url)
+            if entry is None or len(entry) != 3:
+                return None
+            if time.time() - entry[0] > _ENDPOINT_CACHE_CONFIG['ttl']:
+                return None
+            return entry
+
+    def get(self, api_url, **kwargs):
+        """Get the endpoint URLs of an API root, discovering them if they
+        aren't cached.
+
+        Parameters
+        ----------
+        api_url : `str`
+            Root URL of the SQUASH API.
+        **kwargs
+            Keyword arguments passed to `get` for discovery.
+
+        Returns
+        -------
+        endpoints : `dict`
+            Endpoint URLs, keyed by endpoint name.
+        """
+        return self._get_entry(api_url, **kwargs)[1]
+
+    def get_encodings(self, api_url, **kwargs):
+        """Get the request content codings accepted by an API root's
+        server, discovering its endpoints if they aren't cached.
+
+        Parameters
+        ----------
+        api_url : `str`
+            Root URL of the SQUASH API.
+        **kwargs
+            Keyword arguments passed to `get` for discovery.
+
+        Returns
+        -------
+        encodings : `frozenset` of `str`
+            Lower-case content codings, such as ``'gzip'``, listed by the
+            ``Accept-Encoding`` header of the API root's response.
+        """
+        return self._get_entry(api_url, **kwargs)[2]
+
+    def _get_entry(self, api_url, **kwargs):
+        entry = self._lookup(api_url)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            root_lock = self._root_locks.setdefault(api_url,
+                                                    threading.Lock())
+        with root_lock:
+            # Endpoints may have been discovered while waiting for the lock
+            entry = self._lookup(api_url)
+            if entry is None:
+                r = get(api_url, **kwargs)
+                entry = self.set(
+                    api_url, r.json(),
+                    _parse_accept_encoding(r.headers.get('Accept-Encoding')))
+        return entry
+
+    def set(self, api_url, endpoints, encodings=()):
+        """Cache the endpoint URLs of an API root.
+
+        Parameters
+        ----------
+        api_url : `str`
+            Root URL of the SQUASH API.
+        endpoints : `dict`
+            Endpoint URLs, keyed by endpoint name.
+        encodings : iterable of `str`, optional
+            Request content codings accepted by the server.
+
+        Returns
+        -------
+        entry : `tuple`
+            The cache entry.
+        """
+        entry = (time.time(), endpoints, frozenset(encodings))
+        with self._lock:
+            self._entries[api_url] = entry
+            self._persist(api_url)
+        return entry
+
+    def reset(self, api_url=None):
+        """Remove the entry of an API root, or all entries, from the cache
+        and the persisted cache.
+        """
+        with self._lock:
+            if api_url is None:
+                self._entries.clear()
+                path = self._get_path()
+                if path is not None:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            else:
+                self._entries.pop(api_url, None)
+                self._persist(api_url)
+            self._loaded = True
+
+
 # URLs for SQUASH endpoints, cached by `get_endpoint_url()`.
-_ENDPOINT_URLS = None
+_ENDPOINT_CACHE = _EndpointCache()
+
+
+def configure_endpoint_cache(**kwargs):
+    """Configure the endpoint URL cache used by `get_endpoint_url`.
+
+    Unset options keep their current values.
+
+    Parameters
+    ----------
+    ttl : `float`, optional
+        Time, in seconds, that discovered endpoint URLs are reused for.
+        Default is 3600.
+    persistent : `bool` or `None`, optional
+        Persist discovered endpoint URLs so that later processes can reuse
+        them. If `None` (default), they are persisted only if the
+        ``LSST_VERIFY_PERSISTENT_CACHE`` environment variable is set to a
+        non-empty value, as metrics packages are (see
+        `lsst.verify.packagecache`). Persistence is always disabled by
+        setting the ``LSST_VERIFY_NO_CACHE`` environment variable.
+    path : `str`, optional
+        Path of the persisted cache. By default, ``squash_endpoints.pickle``
+        in the directory given by
+        `lsst.verify.packagecache.get_cache_dir`.
+
+    Raises
+    ------
+    TypeError
+        Raised if an option is not recognized.
+    """
+    unknown = set(kwargs) - set(_DEFAULT_ENDPOINT_CACHE_CONFIG)
+    if unknown:
+        message = 'Unknown endpoint cache options: {0}'.format(
+            ', '.join(sorted(unknown)))
+        raise TypeError(message)
+
+    with _ENDPOINT_CACHE._lock:
+        _ENDPOINT_CACHE_CONFIG.update(kwargs)
+        # Read entries from the (possibly new) persisted cache
+        _ENDPOINT_CACHE._loaded = False
 
 
 def get_endpoint_url(api_url, api_endpoint, **kwargs):
@@ -70,25 +363,392 @@ def get_endpoint_url(api_url, api_endpoint, **kwargs):
 
     Notes
     -----
-    Endpoints are discovered from the SQUASH API itself. The SQUASH API is
-    queried on the first call to `get_endpoint_url`. Subsequent calls use
-    cached results for all endpoints. This cache can be reset with the
-    `reset_endpoint_cache` function.
+    Endpoints are discovered from the SQUASH API itself. Each API root is
+    queried on the first call to `get_endpoint_url` for that root.
+    Subsequent calls use cached results for all of the root's endpoints
+    until they expire (see `configure_endpoint_cache`). Concurrent calls
+    for the same root make a single request. This cache can be reset with
+    the `reset_endpoint_cache` function.
     """
-    global _ENDPOINT_URLS
+    return _ENDPOINT_CACHE.get(api_url, **kwargs)[api_endpoint]
 
-    if _ENDPOINT_URLS is None:
-        r = get(api_url, **kwargs)
-        _ENDPOINT_URLS = r.json()
 
-    return _ENDPOINT_URLS[api_endpoint]
+def _accepts_gzip(api_url):
+    """Test if the server of a SQUASH API root advertises support for
+    gzip-compressed request bodies.
+    """
+    return 'gzip' in _ENDPOINT_CACHE.get_encodings(api_url)
 
 
-def reset_endpoint_cache():
+def reset_endpoint_cache(api_url=None):
     """Reset the cache used by `get_endpoint_url`.
+
+    Parameters
+    ----------
+    api_url : `str`, optional
+        Root URL of the SQUASH API whose endpoints are removed from the
+        cache. By default, all endpoints are removed.
+    """
+    _ENDPOINT_CACHE.reset(api_url)
+
+
+def get_session():
+    """Get the HTTP session shared by the SQUASH client functions.
+
+    Returns
+    -------
+    session : `requests.Session`
+        Session with a connection pool mounted for both ``http://`` and
+        ``https://`` URLs. The session is created on the first call, and
+        replaced after `configure_session` or `close_session`.
+    """
+    global _SESSION
+
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=_SESSION_CONFIG['pool_connections'],
+                pool_maxsize=_SESSION_CONFIG['pool_maxsize'])
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if not _SESSION_CONFIG['keep_alive']:
+                session.headers['Connection'] = 'close'
+            _SESSION = session
+        return _SESSION
+
+
+def configure_session(**kwargs):
+    """Configure the HTTP session shared by the SQUASH client functions.
+
+    The current session, if any, is closed. Unset options keep their current
+    values.
+
+    Parameters
+    ----------
+    pool_connections : `int`, optional
+        Number of hosts to keep connection pools for. Default is 10.
+    pool_maxsize : `int`, optional
+        Maximum number of connections to keep open to each host. Default
+        is 10.
+    keep_alive : `bool`, optional
+        Reuse connections between requests. Default is `True`.
+    max_retries : `int`, optional
+        Maximum number of times a request is retried. Default is 3.
+    backoff_factor : `float`, optional
+        Base delay, in seconds, between retries. Retry ``n`` (counting from
+        zero) waits for a random time between zero and
+        ``backoff_factor * 2 ** n`` seconds. Default is 0.5.
+    backoff_max : `float`, optional
+        Maximum delay, in seconds, between retries. Responses with a
+        ``Retry-After`` header asking for a longer delay are not retried.
+        Default is 30.
+
+    Raises
+    ------
+    TypeError
+        Raised if an option is not recognized.
+    """
+    unknown = set(kwargs) - set(_DEFAULT_SESSION_CONFIG)
+    if unknown:
+        message = 'Unknown session options: {0}'.format(
+            ', '.join(sorted(unknown)))
+        raise TypeError(message)
+
+    with _SESSION_LOCK:
+        close_session()
+        _SESSION_CONFIG.update(kwargs)
+
+
+def close_session():
+    """Close the HTTP session shared by the SQUASH client functions, and
+    its pooled connections.
+
+    A new session is created by the next request.
+    """
+    global _SESSION
+
+    with _SESSION_LOCK:
+        if _SESSION is not None:
+            _SESSION.close()
+            _SESSION = None
+
+
+def get_session_stats():
+    """Get statistics of the HTTP session shared by the SQUASH client
+    functions.
+
+    Returns
+    -------
+    stats : `dict`
+        Statistics:
+
+        - ``'requests'``: number of HTTP requests sent, including retries.
+        - ``'retries'``: number of retried requests.
+        - ``'retry_after_waits'``: number of retries delayed by a
+          ``Retry-After`` header.
+        - ``'connection_errors'``: number of requests that failed without a
+          response.
+        - ``'pools'``: `list` of `dict`, one per open connection pool, with
+          the pool's ``'scheme'``, ``'host'`` and ``'port'``, the number of
+          connections it has made (``'num_connections'``) and the number of
+          requests sent over them (``'num_requests'``).
+
+        Request counts are kept since the last `reset_session_stats`. Pool
+        statistics are those of the current session.
+    """
+    with _SESSION_LOCK:
+        stats = dict(_STATS)
+        pools = []
+        if _SESSION is not None:
+            pool_manager = _SESSION.get_adapter('https://').poolmanager
+            for key in list(pool_manager.pools.keys()):
+                pool = pool_manager.pools.get(key)
+                if pool is None:
+                    continue
+                pools.append({'scheme': pool.scheme,
+                              'host': pool.host,
+                              'port': pool.port,
+                              'num_connections': pool.num_connections,
+                              'num_requests': pool.num_requests})
+        stats['pools'] = pools
+    return stats
+
+
+def reset_session_stats():
+    """Reset the request counters reported by `get_session_stats`.
+    """
+    with _SESSION_LOCK:
+        for key in _STATS:
+            _STATS[key] = 0
+
+
+def _count(stat):
+    """Increment a session statistic."""
+    with _SESSION_LOCK:
+        _STATS[stat] += 1
+
+
+def _parse_retry_after(value):
+    """Parse a ``Retry-After`` header into a delay, in seconds.
+
+    Parameters
+    ----------
+    value : `str` or `None`
+        Header value: either a delay in seconds, or an HTTP date.
+
+    Returns
+    -------
+    delay : `float` or `None`
+        Delay, in seconds, or `None` if ``value`` is `None` or can't be
+        parsed.
+
+    Examples
+    --------
+    >>> _parse_retry_after('120')
+    120.0
+    >>> _parse_retry_after('Thu, 01 Jan 1970 00:00:00 GMT')
+    0.0
+    >>> _parse_retry_after('soon') is None
+    True
+    """
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.)
+    except ValueError:
+        pass
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(mktime_tz(date) - time.time(), 0.)
+
+
+def _parse_accept_encoding(value):
+    """Parse an ``Accept-Encoding`` header into the set of accepted content
+    codings.
+
+    Examples
+    --------
+    >>> sorted(_parse_accept_encoding('GZIP, deflate;q=0.5, br;q=0'))
+    ['deflate', 'gzip']
+    >>> _parse_accept_encoding(None)
+    frozenset()
+    """
+    encodings = set()
+    if not value:
+        return frozenset(encodings)
+    for item in value.split(','):
+        params = item.split(';')
+        coding = params[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.
+        for param in params[1:]:
+            name, _, param_value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(param_value)
+                except ValueError:
+                    pass
+        if quality > 0.:
+            encodings.add(coding)
+    return frozenset(encodings)
+
+
+def _iter_json(json_doc, chunk_size=_BODY_CHUNK_SIZE):
+    """Serialize a JSON document incrementally.
+
+    Parameters
+    ----------
+    json_doc : obj
+        A JSON-serializable object.
+    chunk_size : `int`, optional
+        Approximate size, in bytes, of the yielded chunks.
+
+    Yields
+    ------
+    chunk : `bytes`
+        UTF-8 encoded JSON. The concatenated chunks are the serialized
+        document.
+    """
+    buffer = []
+    size = 0
+    for piece in json.JSONEncoder().iterencode(json_doc):
+        piece = piece.encode('utf-8')
+        buffer.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def _iter_gzip(chunks):
+    """Compress a sequence of chunks into gzip format incrementally.
+
+    Parameters
+    ----------
+    chunks : iterable of `bytes`
+        Data to compress.
+
+    Yields
+    ------
+    chunk : `bytes`
+        Compressed data. The concatenated chunks are a gzip stream.
     """
-    global _ENDPOINT_URLS
-    _ENDPOINT_URLS = None
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class _JsonBody(object):
+    """Request body that serializes, and optionally compresses, a JSON
+    document in chunks each time it is iterated.
+
+    `requests` sends iterable bodies with chunked transfer encoding, so the
+    serialized document is never held in memory. Iterating again restarts
+    the serialization, so the body can be resent when a request is retried.
+
+    Parameters
+    ----------
+    json_doc : obj
+        A JSON-serializable object.
+    compress : `bool`, optional
+        Compress the body with gzip.
+    """
+
+    def __init__(self, json_doc, compress=False):
+        self.json_doc = json_doc
+        self.compress = compress
+
+    def __iter__(self):
+        chunks = _iter_json(self.json_doc)
+        if self.compress:
+            chunks = _iter_gzip(chunks)
+        return chunks
+
+
+def _get_backoff(attempt):
+    """Get a randomized ("full jitter") exponential backoff delay, in
+    seconds, before retry number ``attempt`` (counting from zero).
+    """
+    delay = min(_SESSION_CONFIG['backoff_factor'] * 2 ** attempt,
+                _SESSION_CONFIG['backoff_max'])
+    return random.uniform(0., delay)
+
+
+def _request(method, url, **kwargs):
+    """Send an HTTP request with the shared session, retrying failures.
+
+    Requests with idempotent methods are retried after connection errors,
+    timeouts, and responses with a status in ``_RETRY_STATUSES``, honouring
+    the response's ``Retry-After`` header. Other requests are only retried
+    if a connection couldn't be made.
+
+    Parameters
+    ----------
+    method : `str`
+        HTTP method.
+    url : `str`
+        URL.
+    **kwargs
+        Keyword arguments passed to `requests.Session.request`.
+
+    Returns
+    -------
+    response : `requests.Response`
+        The final response, which may have an error status.
+
+    Raises
+    ------
+    requests.exceptions.RequestException
+        Raised if the final attempt failed without a response.
+    """
+    log = lsst.log.Log.getLogger('verify.squash')
+
+    idempotent = method.upper() in _IDEMPOTENT_METHODS
+    attempt = 0
+    while True:
+        session = get_session()
+        _count('requests')
+        try:
+            r = session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            _count('connection_errors')
+            if idempotent:
+                retry = isinstance(e, (requests.exceptions.ConnectionError,
+                                       requests.exceptions.Timeout))
+            else:
+                retry = isinstance(e, requests.exceptions.ConnectTimeout)
+            if not retry or attempt >= _SESSION_CONFIG['max_retries']:
+                raise
+            delay = _get_backoff(attempt)
+            log.warning('{0} {1} failed ({2}); retrying in {3:.1f} s'.format(
+                method, url, e, delay))
+        else:
+            retry = idempotent and r.status_code in _RETRY_STATUSES
+            if not retry or attempt >= _SESSION_CONFIG['max_retries']:
+                return r
+            delay = _get_backoff(attempt)
+            retry_after = _parse_retry_after(r.headers.get('Retry-After'))
+            if retry_after is not None:
+                if retry_after > _SESSION_CONFIG['backoff_max']:
+                    return r
+                delay = max(delay, retry_after)
+                _count('retry_after_waits')
+            log.warning('{0} {1} status: {2}; retrying in {3:.1f} s'.format(
+                method, url, r.status_code, delay))
+            r.close()
+
+        _count('retries')
+        attempt += 1
+        time.sleep(delay)
 
 
 def get_default_timeout():
@@ -142,7 +802,8 @@ def make_accept_header(version=None):
 
 
 def post(api_url, api_endpoint, json_doc=None,
-         api_user=None, api_password=None, timeout=None, version=None):
+         api_user=None, api_password=None, timeout=None, version=None,
+         compress=None, stream=False):
     """POST a JSON document to SQUASH.
 
     Parameters
@@ -162,6 +823,15 @@ def post(api_url, api_endpoint, json_doc=None,
         Request timeout. The value of `get_default_timeout` is used by default.
     version : `str`, optional
         API version. The value of `get_default_api_version` is used by default.
+    compress : `bool`, optional
+        Compress the request body with gzip (``Content-Encoding: gzip``). By
+        default, the body is compressed if the API root's response
+        advertises gzip support in its ``Accept-Encoding`` header. Set to
+        `True` to compress regardless, or `False` to never compress.
+    stream : `bool`, optional
+        Serialize (and compress) the document incrementally as it is sent,
+        with chunked transfer encoding, rather than building the whole body
+        in memory first. The server must accept chunked request bodies.
 
     Raises
     ------
@@ -173,23 +843,75 @@ def post(api_url, api_endpoint, json_doc=None,
     response : `requests.Response`
         Response object. Obtain JSON content with ``response.json()``.
     """
-    log = lsst.log.Log.getLogger('verify.squash.post')
-
     api_endpoint_url = get_endpoint_url(api_url, api_endpoint)
 
+    if compress is None:
+        compress = _accepts_gzip(api_url)
+
     headers = {
         'Accept': make_accept_header(version)
     }
+    body = {}
+    if compress or stream:
+        headers['Content-Type'] = 'application/json'
+        if compress:
+            headers['Content-Encoding'] = 'gzip'
+        data = _JsonBody(json_doc, compress=compress)
+        if not stream:
+            # Only the (compressed) body is held in memory, not the
+            # serialized document
+            data = b''.join(data)
+        body['data'] = data
+    else:
+        body['json'] = json_doc
+
+    return _post_body(api_endpoint_url, body, headers,
+                      api_user=api_user, api_password=api_password,
+                      timeout=timeout)
+
+
+def _post_body(api_endpoint_url, body, headers, api_user=None,
+               api_password=None, timeout=None):
+    """POST a prepared request body to a SQUASH endpoint, expecting a
+    ``201 Created`` response.
+
+    Parameters
+    ----------
+    api_endpoint_url : `str`
+        Endpoint URL.
+    body : `dict`
+        Request body, as ``json`` or ``data`` keyword arguments of
+        `requests.Session.request`.
+    headers : `dict`
+        Request headers.
+    api_user : `str`
+        API username.
+    api_password : `str`
+        API password.
+    timeout : `float`, optional
+        Request timeout. The value of `get_default_timeout` is used by default.
+
+    Raises
+    ------
+    requests.exceptions.RequestException
+       Raised if the HTTP request fails.
+
+    Returns
+    -------
+    response : `requests.Response`
+        Response object.
+    """
+    log = lsst.log.Log.getLogger('verify.squash.post')
 
     try:
         # Disable redirect following for POST as requests will turn a POST into
         # a GET when following a redirect. http://ls.st/pbx
-        r = requests.post(api_endpoint_url,
-                          auth=(api_user, api_password),
-                          json=json_doc,
-                          allow_redirects=False,
-                          headers=headers,
-                          timeout=timeout or get_default_timeout())
+        r = _request('POST', api_endpoint_url,
+                     auth=(api_user, api_password),
+                     allow_redirects=False,
+                     headers=headers,
+                     timeout=timeout or get_default_timeout(),
+                     **body)
         log.info('POST {0} status: {1}'.format(api_endpoint_url,
                                                r.status_code))
         r.raise_for_status()
@@ -199,15 +921,44 @@ def post(api_url, api_endpoint, json_doc=None,
         if r.status_code != 201:
             message = 'Expected status=201. Got status={0}. {1}'.format(
                 r.status_code, r.reason)
-            raise requests.exceptions.RequestException(message)
+            raise requests.exceptions.RequestException(message, response=r)
     except requests.exceptions.RequestException as e:
-        log.error(str(e))
-        log.error(json.dumps(json_doc))
+        log.error(_describe_post_error(api_endpoint_url, e))
         raise e
 
     return r
 
 
+def _describe_post_error(api_endpoint_url, error):
+    """Describe a failed POST request for the log.
+
+    Parameters
+    ----------
+    api_endpoint_url : `str`
+        Endpoint URL.
+    error : `requests.exceptions.RequestException`
+        The request's error.
+
+    Returns
+    -------
+    message : `str`
+        The URL and the error and, if the server responded, the response's
+        status and the start of its body (at most `_MAX_LOGGED_BODY`
+        characters). The posted document isn't included, since it can be
+        very large.
+    """
+    message = 'POST {0} failed: {1}'.format(api_endpoint_url, error)
+    response = getattr(error, 'response', None)
+    if response is None:
+        return message
+
+    body = response.content.decode('utf-8', 'replace')
+    if len(body) > _MAX_LOGGED_BODY:
+        body = body[:_MAX_LOGGED_BODY] + '...'
+    return '{0} (status: {1}, response: {2})'.format(
+        message, response.status_code, body)
+
+
 def get(api_url, api_endpoint=None,
         api_user=None, api_password=None, timeout=None, version=None):
     """GET request to the SQUASH API.
@@ -256,10 +1007,10 @@ def get(api_url, api_endpoint=None,
     }
 
     try:
-        r = requests.get(api_endpoint_url,
-                         auth=auth,
-                         headers=headers,
-                         timeout=timeout or get_default_timeout())
+        r = _request('GET', api_endpoint_url,
+                     auth=auth,
+                     headers=headers,
+                     timeout=timeout or get_default_timeout())
         log.info('GET {0} status: {1}'.format(api_endpoint_url,
                                               r.status_code))
         r.raise_for_status()
@@ -268,3 +1019,196 @@ def get(api_url, api_endpoint=None,
         raise e
 
     return r
+
+
+def _iter_upload_chunks(kind, items, max_chunk_size):
+    """Group items into bounded-size chunks for `post_chunked`.
+
+    Parameters
+    ----------
+    kind : `str`
+        Kind of the items, such as ``'blobs'``.
+    items : iterable
+        JSON-serializable items.
+    max_chunk_size : `int`
+        Maximum size, in bytes, of the serialized items in a chunk. An item
+        larger than this is uploaded in a chunk of its own.
+
+    Yields
+    ------
+    chunk_id : `str`
+        Hexadecimal SHA-256 digest of ``body``.
+    body : `bytes`
+        Serialized chunk: a JSON object with ``kind`` and ``items`` fields.
+    """
+    prefix = '{{"kind": {0}, "items": ['.format(json.dumps(kind))
+    prefix = prefix.encode('utf-8')
+    batch = []
+    size = 0
+    for item in items:
+        data = json.dumps(item).encode('utf-8')
+        if batch and size + len(data) > max_chunk_size:
+            body = prefix + b', '.join(batch) + b']}'
+            yield hashlib.sha256(body).hexdigest(), body
+            batch = []
+            size = 0
+        batch.append(data)
+        size += len(data)
+    if batch:
+        body = prefix + b', '.join(batch) + b']}'
+        yield hashlib.sha256(body).hexdigest(), body
+
+
+def _put_chunk(chunks_url, chunk_id, body, compress, **kwargs):
+    """Upload a chunk unless the server already has it.
+
+    Returns
+    -------
+    uploaded : `bool`
+        `False` if the chunk had already been uploaded.
+    """
+    chunk_url = '{0}/{1}/'.format(chunks_url.rstrip('/'), chunk_id)
+
+    r = _request('HEAD', chunk_url, **kwargs)
+    if r.status_code == 200:
+        return False
+
+    headers = dict(kwargs.pop('headers'))
+    headers['Content-Type'] = 'application/json'
+    if compress:
+        headers['Content-Encoding'] = 'gzip'
+        body = b''.join(_iter_gzip([body]))
+    # PUT is idempotent, so failures are retried
+    r = _request('PUT', chunk_url, data=body, headers=headers, **kwargs)
+    r.raise_for_status()
+    return True
+
+
+def post_chunked(api_url, api_endpoint, json_doc, chunked_items,
+                 api_user=None, api_password=None, timeout=None,
+                 version=None, compress=None,
+                 max_chunk_size=_MAX_UPLOAD_CHUNK_SIZE, max_workers=4):
+    """POST a large JSON document to SQUASH in several requests.
+
+    Collections of items are uploaded in bounded-size chunks to the
+    ``chunks`` endpoint, then an envelope that references the chunks is
+    posted to ``api_endpoint``.
+
+    Parameters
+    ----------
+    api_url : `str`
+        Root URL of the SQUASH API. For example,
+        ``'https://squash.lsst.codes/api'``.
+    api_endpoint : `str`
+        Name of the API endpoint to post the envelope to.
+    json_doc : `dict`
+        A JSON-serializable `dict` with the document's fields other than the
+        chunked collections.
+    chunked_items : `list` of (`str`, iterable) pairs
+        Names of the document's collection fields, such as
+        ``'measurements'``, and iterables of their JSON-serializable items.
+        Collections are uploaded in order: all chunks of a collection are
+        uploaded before the next collection's.
+    api_user : `str`
+        API username.
+    api_password : `str`
+        API password.
+    timeout : `float`, optional
+        Timeout of each request. The value of `get_default_timeout` is used
+        by default.
+    version : `str`, optional
+        API version. The value of `get_default_api_version` is used by
+        default.
+    compress : `bool`, optional
+        Compress request bodies with gzip. See `post`.
+    max_chunk_size : `int`, optional
+        Maximum size, in bytes, of the serialized items in a chunk. The
+        default is 8 MiB.
+    max_workers : `int`, optional
+        Maximum number of chunks uploaded concurrently.
+
+    Raises
+    ------
+    requests.exceptions.RequestException
+       Raised if a chunk or the envelope can't be uploaded. Chunks that were
+       uploaded are skipped when the document is posted again.
+
+    Returns
+    -------
+    response : `requests.Response`
+        Response to the envelope's POST.
+
+    Notes
+    -----
+    Each chunk is a JSON object with ``kind`` (the collection name) and
+    ``items`` fields. Chunks are identified by the SHA-256 digest of their
+    serialization, and uploaded with ``PUT <chunks endpoint>/<id>/``. A
+    chunk is not uploaded if ``HEAD <chunks endpoint>/<id>/`` succeeds,
+    so an interrupted upload resumes where it stopped. Chunk uploads are
+    idempotent and retried as configured by `configure_session`.
+
+    The envelope is ``json_doc`` with a ``chunks`` field that lists the
+    chunk identifiers of each collection, in order.
+
+    At most ``2 * max_workers`` chunks are held in memory at once, so an
+    upload's memory use and per-request duration are bounded by
+    ``max_chunk_size`` rather than by the size of the document.
+    """
+    log = lsst.log.Log.getLogger('verify.squash.post_chunked')
+
+    chunks_url = get_endpoint_url(api_url, 'chunks')
+    if compress is None:
+        compress = _accepts_gzip(api_url)
+    request_kwargs = {
+        'auth': (api_user, api_password),
+        'headers': {'Accept': make_accept_header(version)},
+        'timeout': timeout or get_default_timeout(),
+    }
+
+    # Bound the number of chunks queued or being uploaded
+    slots = threading.BoundedSemaphore(2 * max_workers)
+
+    def upload(chunk_id, body):
+        try:
+            return _put_chunk(chunks_url, chunk_id, body, compress,
+                              **request_kwargs)
+        finally:
+            slots.release()
+
+    chunk_ids = OrderedDict()
+    pool = ThreadPool(max_workers)
+    try:
+        for kind, items in chunked_items:
+            results = []
+            for chunk_id, body in _iter_upload_chunks(kind, items,
+                                                      max_chunk_size):
+                slots.acquire()
+                results.append(
+                    (chunk_id, pool.apply_async(upload, (chunk_id, body))))
+
+            chunk_ids[kind] = []
+            failures = []
+            uploaded = 0
+            for chunk_id, result in results:
+                chunk_ids[kind].append(chunk_id)
+                try:
+                    uploaded += result.get()
+                except requests.exceptions.RequestException as e:
+                    log.error('Chunk {0} upload failed: {1}'.format(
+                        chunk_id, e))
+                    failures.append(chunk_id)
+            log.info('Uploaded {0:d} of {1:d} {2} chunks'.format(
+                uploaded, len(results), kind))
+            if failures:
+                message = 'Failed to upload {0:d} of {1:d} {2} chunks'.format(
+                    len(failures), len(results), kind)
+                raise requests.exceptions.RequestException(message)
+    finally:
+        pool.terminate()
+        pool.join()
+
+    envelope = dict(json_doc)
+    envelope['chunks'] = chunk_ids
+    return post(api_url, api_endpoint, json_doc=envelope,
+                api_user=api_user, api_password=api_password,
+                timeout=timeout, version=version, compress=compress)
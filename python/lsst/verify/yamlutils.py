@@ -25,10 +25,10 @@
 from __future__ import print_function, division
 
 from collections import OrderedDict
-from copy import deepcopy
+import multiprocessing
 import yaml
 
-__all__ = ['load_ordered_yaml', 'load_all_ordered_yaml']
+__all__ = ['load_ordered_yaml', 'load_all_ordered_yaml', 'map_yaml_files']
 
 
 def load_ordered_yaml(stream, **kwargs):
@@ -39,8 +39,9 @@ def load_ordered_yaml(stream, **kwargs):
     stream :
         A stream for a YAML file (made with `open` or `~io.StringIO`, for
         example).
-    loader : optional
-        A YAML loader class. Default is ``yaml.Loader``.
+    Loader : optional
+        A YAML loader class. Default is ``yaml.CSafeLoader`` if PyYAML was
+        built with libyaml, and ``yaml.SafeLoader`` otherwise.
     object_pairs_hook : obj, optional
         Class that YAML key-value pairs are loaded into by the ``loader``.
         Default is `collections.OrderedDict`.
@@ -64,8 +65,9 @@ def load_all_ordered_yaml(stream, **kwargs):
     stream :
         A stream for a YAML file (made with `open` or `~io.StringIO`, for
         example).
-    loader : optional
-        A YAML loader class. Default is ``yaml.Loader``.
+    Loader : optional
+        A YAML loader class. Default is ``yaml.CSafeLoader`` if PyYAML was
+        built with libyaml, and ``yaml.SafeLoader`` otherwise.
     object_pairs_hook : obj, optional
         Class that YAML key-value pairs are loaded into by the ``loader``.
         Default is `collections.OrderedDict`.
@@ -80,8 +82,78 @@ def load_all_ordered_yaml(stream, **kwargs):
     return yaml.load_all(stream, OrderedLoader)
 
 
-def _build_ordered_loader(Loader=yaml.Loader, object_pairs_hook=OrderedDict):
+def map_yaml_files(func, items, processes=None):
+    """Apply a YAML file parsing function to a sequence of items,
+    optionally in a pool of worker processes.
+
+    Parameters
+    ----------
+    func : callable
+        Function that takes a single item and returns plain (picklable)
+        data, such as parsed YAML documents. It must be a module-level
+        function so that it can be sent to worker processes.
+    items : sequence
+        Items to parse, such as file paths.
+    processes : `int`, optional
+        Number of worker processes. If `None` or ``1`` (default), items are
+        parsed serially in this process.
+
+    Returns
+    -------
+    results : `list`
+        Return values of ``func``, in the same order as ``items``,
+        regardless of the number of processes.
+
+    Notes
+    -----
+    Parsing YAML is CPU-bound and independent for each file, so files can
+    be parsed in parallel. Any processing that depends on several files
+    (such as resolving specification inheritance) should be done with the
+    results, in the parent process.
+    """
+    items = list(items)
+    if processes is None or processes <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    pool = multiprocessing.Pool(processes=min(processes, len(items)))
+    try:
+        # map preserves the order of items
+        return pool.map(func, items, chunksize=1)
+    finally:
+        # All work is done (or failed), so the workers can be stopped
+        pool.terminate()
+        pool.join()
+
+
+def _get_default_loader():
+    """Get the fastest safe YAML loader class available.
+
+    Returns
+    -------
+    Loader
+        ``yaml.CSafeLoader`` (backed by libyaml) if PyYAML was built with
+        libyaml, otherwise the pure-Python ``yaml.SafeLoader``.
+    """
+    try:
+        return yaml.CSafeLoader
+    except AttributeError:
+        return yaml.SafeLoader
+
+
+# Ordered loader classes, keyed by (Loader, object_pairs_hook)
+_ordered_loaders = {}
+
+
+def _build_ordered_loader(Loader=None, object_pairs_hook=OrderedDict):
     # Solution from http://stackoverflow.com/a/21912744
+    if Loader is None:
+        Loader = _get_default_loader()
+
+    key = (Loader, object_pairs_hook)
+    try:
+        return _ordered_loaders[key]
+    except KeyError:
+        pass
 
     class OrderedLoader(Loader):
         pass
@@ -94,6 +166,7 @@ def _build_ordered_loader(Loader=yaml.Loader, object_pairs_hook=OrderedDict):
         yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
         construct_mapping)
 
+    _ordered_loaders[key] = OrderedLoader
     return OrderedLoader
 
 
@@ -114,8 +187,11 @@ def merge_documents(base_doc, new_doc):
     Returns
     -------
     merged_doc : `~collections.OrderedDict`
-        The merged document. The contents of ``merged_doc`` are copies
-        of originals in ``base_doc`` and ``new_doc``.
+        The merged document. Neither ``base_doc`` nor ``new_doc`` are
+        modified. ``merged_doc`` is structurally shared with the inputs:
+        only the mappings and lists that are changed by the merge are new
+        objects; unchanged values and subtrees are the originals. Make a
+        deep copy of ``merged_doc`` before modifying its nested content.
 
     Notes
     -----
@@ -139,9 +215,15 @@ def merge_documents(base_doc, new_doc):
     - If both ``new_doc`` and ``base_doc`` share a key and the value from
       **both** is a mapping (`dict`-type) then the two values are
       merged by recursively calling this ``merge_documents`` function.
+
+    Since unchanged subtrees are shared rather than copied, the cost of a
+    merge is proportional to the size of ``new_doc`` and the number of keys
+    along the merged paths of ``base_doc``, rather than the size of the
+    whole ``base_doc``.
     """
-    # Create a copy so that the base doc is not mutated
-    merged_doc = deepcopy(base_doc)
+    # A new top-level mapping so that the base doc is not mutated. Values
+    # are shared until they need to be merged.
+    merged_doc = OrderedDict(base_doc)
 
     for new_key, new_value in new_doc.items():
         if new_key in merged_doc:
@@ -154,20 +236,19 @@ def merge_documents(base_doc, new_doc):
 
             elif isinstance(base_value, list) and isinstance(new_value, list):
                 # Both are lists: merge by appending the new items to the end
-                # of the base items.
-                # Copy the base's list so we're not modify the input
-                merged_value = deepcopy(base_value)
-                merged_value.extend(deepcopy(new_value))  # modifies in-place
+                # of the base items, in a new list so we're not modifying
+                # the input.
+                merged_value = base_value + new_value
 
             else:
                 # A scalar: just over-write the existing base value
-                merged_value = deepcopy(new_value)
+                merged_value = new_value
 
             # Done merging this key-value pair
             merged_doc[new_key] = merged_value
 
         else:
             # Add the new key that isn't over-writing merged_doc
-            merged_doc[new_key] = deepcopy(new_value)
+            merged_doc[new_key] = new_value
 
     return merged_doc
@@ -0,0 +1,302 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Local stand-in for the SQUASH API, for testing `lsst.verify.squash`
+against a real HTTP server.
+"""
+
+from __future__ import print_function, division
+
+__all__ = ['SquashServer']
+
+from collections import namedtuple
+import hashlib
+import json
+import threading
+import time
+import zlib
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class RecordedRequest(namedtuple('RecordedRequest',
+                                 ['method', 'path', 'headers', 'body',
+                                  'client_address'])):
+    """A request received by the server. ``body`` is `bytes`, with any
+    chunked transfer encoding removed.
+    """
+
+    __slots__ = ()
+
+    def decoded_body(self):
+        """Get the body, decompressed if necessary."""
+        if self.headers.get('Content-Encoding') == 'gzip':
+            return zlib.decompress(self.body, 16 + zlib.MAX_WBITS)
+        return self.body
+
+    def json(self):
+        """Decode the body, decompressing it if necessary."""
+        return json.loads(self.decoded_body().decode('utf-8'))
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    # Keep connections alive between requests
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.stand_in._handle(self)
+
+    def do_POST(self):
+        self.server.stand_in._handle(self)
+
+    def do_PUT(self):
+        self.server.stand_in._handle(self)
+
+    def do_HEAD(self):
+        self.server.stand_in._handle(self)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class SquashServer(object):
+    """HTTP server, run in a background thread, that serves the SQUASH API
+    root and scripted responses.
+
+    Without a scripted response, the server also stores jobs posted to
+    ``/api/jobs/`` in `jobs`, and implements the chunk protocol of
+    `lsst.verify.squash.post_chunked` if it has a ``chunks`` endpoint:
+    chunks are stored by ``PUT /api/chunks/<id>/`` (if ``<id>`` is the
+    SHA-256 digest of the chunk), their existence is tested by ``HEAD``, and
+    posted job envelopes are assembled from the chunks they reference.
+
+    Parameters
+    ----------
+    endpoints : `list` of `str`, optional
+        Names of the endpoints listed by the API root. Endpoint ``name`` is
+        served at ``/api/<name>/``.
+    accept_encoding : `str`, optional
+        ``Accept-Encoding`` header of the API root's response, advertising
+        the content codings accepted in request bodies.
+
+    Examples
+    --------
+    >>> import requests
+    >>> with SquashServer() as server:
+    ...     server.add_response('POST', '/api/jobs/', status=201,
+    ...                         json={'id': 1})
+    ...     r = requests.post(server.api_url + 'jobs/', json={})
+    >>> r.status_code
+    201
+    >>> server.requests[0].path
+    '/api/jobs/'
+    """
+
+    def __init__(self, endpoints=('jobs',), accept_encoding=None):
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.stand_in = self
+        host, port = self._server.server_address[:2]
+        self.api_url = 'http://{0}:{1:d}/api/'.format(host, port)
+        self.endpoints = {name: '{0}{1}/'.format(self.api_url, name)
+                          for name in endpoints}
+        self.accept_encoding = accept_encoding
+        self.requests = []
+        # Uploaded chunks (`dict` with ``kind`` and ``items``), keyed by id
+        self.chunks = {}
+        # Posted (and assembled) jobs
+        self.jobs = []
+        self._responses = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Serve requests in a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.01})
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def add_response(self, method, path, status=200, json=None,
+                     headers=None, drop=False, delay=0.):
+        """Queue a response to a request.
+
+        Responses to the same method and path are returned in the order they
+        were added. The last one is repeated.
+
+        Parameters
+        ----------
+        method : `str`
+            HTTP method.
+        path : `str`
+            Request path, such as ``'/api/jobs/'``.
+        status : `int`, optional
+            HTTP status code.
+        json : optional
+            JSON-serializable response content.
+        headers : `dict`, optional
+            Response headers.
+        drop : `bool`, optional
+            Close the connection without responding.
+        delay : `float`, optional
+            Time, in seconds, to wait before responding.
+        """
+        response = {'status': status, 'json': json,
+                    'headers': headers or {}, 'drop': drop, 'delay': delay}
+        with self._lock:
+            self._responses.setdefault((method, path), []).append(response)
+
+    def clear_responses(self):
+        """Remove all queued responses."""
+        with self._lock:
+            self._responses.clear()
+
+    def _next_response(self, request):
+        with self._lock:
+            responses = self._responses.get((request.method, request.path))
+            if responses:
+                if len(responses) > 1:
+                    return responses.pop(0)
+                return responses[0]
+        status, content, headers = self._serve(request)
+        return {'status': status, 'json': content, 'headers': headers,
+                'drop': False, 'delay': 0.}
+
+    def _serve(self, request):
+        """Serve a request that has no scripted response.
+
+        Returns
+        -------
+        status : `int`
+            HTTP status.
+        content : obj
+            JSON-serializable content.
+        headers : `dict`
+            Response headers.
+        """
+        method, path = request.method, request.path
+        not_found = (404, {'detail': 'Not found.'}, {})
+
+        if method == 'GET' and path == '/api/':
+            headers = {}
+            if self.accept_encoding is not None:
+                headers['Accept-Encoding'] = self.accept_encoding
+            return 200, self.endpoints, headers
+
+        if path == '/api/jobs/' and method == 'POST':
+            job = request.json()
+            with self._lock:
+                if 'chunks' in job:
+                    chunk_ids = job.pop('chunks')
+                    missing = [i for ids in chunk_ids.values() for i in ids
+                               if i not in self.chunks]
+                    if missing:
+                        return 400, {'missing': missing}, {}
+                    for kind, ids in chunk_ids.items():
+                        job[kind] = [item for i in ids
+                                     for item in self.chunks[i]['items']]
+                self.jobs.append(job)
+                return 201, {'id': len(self.jobs)}, {}
+
+        if 'chunks' in self.endpoints and path.startswith('/api/chunks/'):
+            chunk_id = path[len('/api/chunks/'):].strip('/')
+            if method == 'HEAD':
+                with self._lock:
+                    if chunk_id in self.chunks:
+                        return 200, None, {}
+                return not_found
+            if method == 'PUT':
+                chunk = request.json()
+                digest = hashlib.sha256(
+                    request.decoded_body()).hexdigest()
+                if digest != chunk_id:
+                    return 400, {'detail': 'Chunk id mismatch.'}, {}
+                with self._lock:
+                    self.chunks[chunk_id] = chunk
+                return 201, {}, {}
+
+        return not_found
+
+    @staticmethod
+    def _read_chunked(rfile):
+        chunks = []
+        while True:
+            size = int(rfile.readline().split(b';')[0].strip(), 16)
+            if size == 0:
+                # Skip any trailers
+                while rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(rfile.read(size))
+            rfile.readline()
+
+    def _handle(self, handler):
+        if handler.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = self._read_chunked(handler.rfile)
+        else:
+            length = int(handler.headers.get('Content-Length', 0))
+            body = handler.rfile.read(length) if length else b''
+        request = RecordedRequest(handler.command, handler.path,
+                                  dict(handler.headers), body,
+                                  handler.client_address)
+        with self._lock:
+            self.requests.append(request)
+
+        response = self._next_response(request)
+        if response['delay']:
+            time.sleep(response['delay'])
+        if response['drop']:
+            handler.close_connection = True
+            return
+
+        content = json.dumps(response['json']).encode('utf-8')
+        handler.send_response(response['status'])
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(content)))
+        for name, value in response['headers'].items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        if handler.command != 'HEAD':
+            handler.wfile.write(content)
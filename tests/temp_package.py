@@ -0,0 +1,122 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test fixture for metrics packages written to a temporary directory."""
+
+from __future__ import print_function, division
+
+__all__ = ['TempPackageTestCase']
+
+import os
+import shutil
+import tempfile
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+# Test metrics package, with metrics/ and specs/ directories
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+class TempPackageTestCase(unittest.TestCase):
+    """Base class for test cases that write a metrics package to a
+    temporary directory, which is removed after each test.
+
+    Attributes
+    ----------
+    temp_dir : `str`
+        Temporary directory.
+    cache_dir : `str`
+        Cache directory (``$LSST_VERIFY_CACHE_DIR``) during the test, in
+        ``temp_dir``, so that tests never write to the user's cache.
+    package_dir : `str`
+        Root directory of the metrics package: the ``package_name``
+        subdirectory of ``temp_dir``, or ``temp_dir`` itself if
+        ``package_name`` is `None`.
+    """
+
+    package_name = None
+    """Name of the package directory in the temporary directory (`str`).
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+
+        if self.package_name is None:
+            self.package_dir = self.temp_dir
+        else:
+            self.package_dir = os.path.join(self.temp_dir, self.package_name)
+            os.makedirs(self.package_dir)
+
+        self.cache_dir = os.path.join(self.temp_dir, 'cache')
+        self.patch_environ({'LSST_VERIFY_CACHE_DIR': self.cache_dir})
+
+    def patch_environ(self, values):
+        """Set environment variables until the end of the test.
+
+        Parameters
+        ----------
+        values : `dict`
+            Values of the environment variables. Variables whose value is
+            `None` are unset.
+        """
+        patcher = mock.patch.dict(os.environ,
+                                  {key: value
+                                   for key, value in values.items()
+                                   if value is not None})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for key, value in values.items():
+            if value is None:
+                os.environ.pop(key, None)
+
+    def package_path(self, relpath):
+        """Get the path of a file in the package."""
+        return os.path.join(self.package_dir, relpath)
+
+    def write_yaml(self, relpath, content):
+        """Write a file in the package, creating its directory if
+        necessary.
+
+        Returns
+        -------
+        path : `str`
+            Path of the file.
+        """
+        path = self.package_path(relpath)
+        dirname = os.path.dirname(path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def copy_test_package(self, dirnames=('metrics', 'specs')):
+        """Copy directories of the test metrics package in ``data/`` into
+        the package.
+        """
+        for dirname in dirnames:
+            shutil.copytree(os.path.join(DATA_DIR, dirname),
+                            self.package_path(dirname))
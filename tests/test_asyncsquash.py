@@ -0,0 +1,210 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test the asynchronous SQUASH client against a local stand-in server."""
+
+from __future__ import print_function, division
+
+import asyncio
+import functools
+import time
+import unittest
+
+import astropy.units as u
+import requests
+
+from lsst.verify import Job, Measurement, squash
+from lsst.verify.asyncsquash import (AsyncClient, AiohttpTransport,
+                                     ThreadTransport, dispatch_many, aiohttp)
+
+from squash_server import SquashServer
+
+
+def make_jobs(n):
+    return [Job(measurements=[Measurement('validate_drp.PA1',
+                                          float(i) * u.mmag)],
+                meta={'index': i})
+            for i in range(n)]
+
+
+class RecordingTransport(object):
+    """Transport that records the methods of requests."""
+
+    def __init__(self):
+        self.transport = ThreadTransport()
+        self.methods = []
+        self.closed = False
+
+    async def request(self, method, url, **kwargs):
+        self.methods.append(method)
+        return await self.transport.request(method, url, **kwargs)
+
+    async def close(self):
+        self.closed = True
+
+
+class AsyncClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        squash.reset_endpoint_cache()
+        squash.configure_endpoint_cache(persistent=False)
+        squash.configure_session(backoff_factor=0.001)
+        self.server = SquashServer()
+        self.server.start()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+        self.server.stop()
+        squash.reset_endpoint_cache()
+        squash.configure_endpoint_cache(
+            **squash._DEFAULT_ENDPOINT_CACHE_CONFIG)
+        squash.configure_session(**squash._DEFAULT_SESSION_CONFIG)
+
+    def run_client(self, func, **kwargs):
+        async def run():
+            async with AsyncClient(self.server.api_url, api_user='user',
+                                   api_password='password',
+                                   transport=ThreadTransport(),
+                                   **kwargs) as client:
+                return await func(client)
+        return self.loop.run_until_complete(run())
+
+    def test_get_retry(self):
+        self.server.add_response('GET', '/api/jobs/', status=503)
+        self.server.add_response('GET', '/api/jobs/', json={'count': 0})
+        squash.reset_session_stats()
+
+        async def get(client):
+            return await client.get('jobs')
+        r = self.run_client(get)
+        self.assertEqual(r.json(), {'count': 0})
+        self.assertEqual(squash.get_session_stats()['retries'], 1)
+
+    def test_post(self):
+        self.server.add_response('POST', '/api/jobs/', status=201, json={})
+
+        async def post(client):
+            return await client.post('jobs', json_doc={'key': 'value'})
+        r = self.run_client(post)
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(self.server.requests[-1].json(), {'key': 'value'})
+
+        self.server.clear_responses()
+        self.server.add_response('POST', '/api/jobs/', status=400)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.run_client(post)
+
+    def test_dispatch_async(self):
+        job = make_jobs(1)[0]
+        self.loop.run_until_complete(job.dispatch_async(
+            api_url=self.server.api_url, api_user='user',
+            api_password='password'))
+        self.assertEqual(self.server.jobs, [job._get_dispatch_json()])
+
+
+class DispatchManyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        squash.reset_endpoint_cache()
+        squash.configure_endpoint_cache(persistent=False)
+        self.server = SquashServer()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        squash.reset_endpoint_cache()
+        squash.configure_endpoint_cache(
+            **squash._DEFAULT_ENDPOINT_CACHE_CONFIG)
+
+    def test_concurrent(self):
+        """Uploads run concurrently, within the window."""
+        self.server.add_response('POST', '/api/jobs/', status=201, json={},
+                                 delay=0.1)
+        start = time.time()
+        results = dispatch_many(make_jobs(6), api_url=self.server.api_url,
+                                api_user='user', api_password='password',
+                                max_concurrency=3,
+                                transport=ThreadTransport())
+        duration = time.time() - start
+        self.assertGreaterEqual(duration, 0.2)
+        self.assertLess(duration, 0.5)
+        self.assertEqual([result.index for result in results],
+                         list(range(6)))
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertEqual(result.response.status_code, 201)
+
+    def test_results(self):
+        jobs = make_jobs(3)
+        self.server.add_response('POST', '/api/jobs/', status=201, json={})
+        self.server.add_response('POST', '/api/jobs/', status=400, json={})
+        self.server.add_response('POST', '/api/jobs/', status=201, json={})
+        transport = RecordingTransport()
+        results = dispatch_many(jobs, api_url=self.server.api_url,
+                                max_concurrency=1, transport=transport)
+        self.assertIsNone(results[0].error)
+        self.assertIsInstance(results[1].error,
+                              requests.exceptions.HTTPError)
+        self.assertIsNone(results[1].response)
+        self.assertIsNone(results[2].error)
+
+        # The transport is swappable, and closed after the uploads
+        self.assertEqual(transport.methods, ['GET', 'POST', 'POST', 'POST'])
+        self.assertTrue(transport.closed)
+
+    def test_job_loaders(self):
+        """Jobs are loaded as their uploads start, and any error only fails
+        its job.
+        """
+        jobs = make_jobs(3)
+        uploaded_before_load = []
+
+        def load(index):
+            uploaded_before_load.append(len(self.server.jobs))
+            if index == 1:
+                raise ValueError('Invalid job file')
+            return jobs[index]
+
+        results = dispatch_many([functools.partial(load, index)
+                                 for index in range(3)],
+                                api_url=self.server.api_url,
+                                max_concurrency=1,
+                                transport=ThreadTransport())
+        self.assertEqual(uploaded_before_load, [0, 1, 1])
+        self.assertIsNone(results[0].error)
+        self.assertIsInstance(results[1].error, ValueError)
+        self.assertIsNone(results[1].response)
+        self.assertIsNone(results[2].error)
+        self.assertEqual(len(self.server.jobs), 2)
+
+    @unittest.skipIf(aiohttp is None, 'Requires aiohttp')
+    def test_aiohttp(self):
+        results = dispatch_many(make_jobs(4), api_url=self.server.api_url,
+                                transport=AiohttpTransport())
+        for result in results:
+            self.assertIsNone(result.error)
+        self.assertEqual(len(self.server.jobs), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -26,7 +26,7 @@ import unittest
 
 import astropy.units as u
 
-from lsst.verify import Blob, Datum
+from lsst.verify import Blob, Datum, HistogramBlob
 from lsst.verify.blobset import BlobSet
 
 
@@ -99,6 +99,22 @@ class BlobSetTestCase(unittest.TestCase):
         new_blob_set = BlobSet.deserialize(blobs=json_doc)
         self.assertEqual(new_blob_set, blob_set)
 
+    def test_update_merges_mergeable_blobs(self):
+        edges = [0., 1., 2.] * u.mag
+        hist1 = HistogramBlob('hist', edges)
+        hist1.fill([0.5] * u.mag)
+        hist2 = HistogramBlob('hist', edges)
+        hist2.fill([1.5] * u.mag)
+
+        blob_set = BlobSet([hist1, self.blob1])
+        other = BlobSet([hist2, self.blob2])
+        blob_set += other
+
+        self.assertEqual(len(blob_set), 3)
+        self.assertIs(blob_set['hist'], hist1)
+        self.assertEqual(blob_set['hist'].counts.tolist(), [1, 1])
+        self.assertIn('blob2', blob_set)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,110 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+import astropy.units as u
+
+from lsst.verify import Blob, BlobSet, HistogramBlob
+
+
+class HistogramBlobTestCase(unittest.TestCase):
+    """Test HistogramBlob filling, merging and serialization."""
+
+    def setUp(self):
+        self.edges = np.linspace(0., 10., 11) * u.mmag
+
+    def test_fill(self):
+        hist = HistogramBlob('resid', self.edges)
+        hist.fill([-1., 0.5, 0.7, 9.5, 10., 12.] * u.mmag)
+
+        self.assertEqual(hist.counts[0], 2)
+        # last bin is closed on the upper edge
+        self.assertEqual(hist.counts[-1], 2)
+        self.assertEqual(hist.underflow, 1)
+        self.assertEqual(hist.overflow, 1)
+        self.assertEqual(hist.total, 6)
+
+    def test_fill_converts_units(self):
+        hist = HistogramBlob('resid', self.edges)
+        hist.fill([0.0015] * u.mag)
+        self.assertEqual(hist.counts[1], 1)
+
+    def test_invalid_edges(self):
+        with self.assertRaises(ValueError):
+            HistogramBlob('resid', [1., 0.] * u.mmag)
+        with self.assertRaises(ValueError):
+            HistogramBlob('resid', self.edges, counts=[1, 2])
+
+    def test_merge_is_associative(self):
+        values = np.random.RandomState(42).uniform(-1, 11, size=300)
+        hists = []
+        for chunk in np.split(values, 3):
+            hist = HistogramBlob('resid', self.edges)
+            hist.fill(chunk * u.mmag)
+            hists.append(hist)
+
+        expected = HistogramBlob('resid', self.edges)
+        expected.fill(values * u.mmag)
+
+        left = HistogramBlob('resid', self.edges)
+        left.merge(hists[0]).merge(hists[1]).merge(hists[2])
+        right = HistogramBlob('resid', self.edges)
+        right.merge(hists[2]).merge(hists[1]).merge(hists[0])
+
+        for merged in (left, right):
+            np.testing.assert_array_equal(merged.counts, expected.counts)
+            self.assertEqual(merged.underflow, expected.underflow)
+            self.assertEqual(merged.overflow, expected.overflow)
+
+    def test_merge_incompatible(self):
+        hist = HistogramBlob('resid', self.edges)
+        with self.assertRaises(ValueError):
+            hist.merge(HistogramBlob('resid', [0., 1.] * u.mmag))
+        with self.assertRaises(ValueError):
+            hist.merge(HistogramBlob('resid', self.edges.value * u.arcsec))
+        with self.assertRaises(TypeError):
+            hist.merge(Blob('resid'))
+
+    def test_json(self):
+        hist = HistogramBlob('resid', self.edges, label='residual')
+        hist.fill([1.5, 2.5, 20.] * u.mmag)
+
+        json_doc = hist.json
+        self.assertEqual(json_doc['type'], 'histogram')
+        self.assertEqual(json_doc['data']['counts']['value'][1], 1)
+
+        # Generic Blob deserialization dispatches on the type
+        new_hist = Blob.deserialize(**json_doc)
+        self.assertIsInstance(new_hist, HistogramBlob)
+        self.assertEqual(new_hist, hist)
+        self.assertEqual(new_hist.overflow, 1)
+
+        new_blob_set = BlobSet.deserialize([json_doc])
+        self.assertIsInstance(new_blob_set['resid'], HistogramBlob)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,12 +22,17 @@
 #
 from __future__ import print_function
 
+import json
+import os
+
 import astropy.units as u
 import unittest
 
 from lsst.verify import (Job, Metric, ThresholdSpecification, Measurement,
                          MeasurementSet, MetricSet, SpecificationSet, Datum,
-                         Blob)
+                         Blob, HistogramBlob, squash)
+
+from squash_server import SquashServer
 
 
 class JobTestCase(unittest.TestCase):
@@ -180,6 +185,72 @@ class JobTestCase(unittest.TestCase):
             'test2_blob',
             job_1.measurements['test2.SourceCount'].blobs)
 
+    def test_job_iadd_merges_histograms(self):
+        edges = [0., 10., 20., 30.] * u.mmag
+        jobs = []
+        for values in ([5., 15.], [15., 25.]):
+            hist = HistogramBlob('phot_resid', edges)
+            hist.fill(values * u.mmag)
+            meas = Measurement(self.metric_photrms, 15 * u.mmag,
+                               blobs=[hist])
+            jobs.append(Job(measurements=[meas]))
+
+        job = jobs[0]
+        job += jobs[1]
+
+        hist = job.measurements['test.PhotRms'].blobs['phot_resid']
+        self.assertEqual(hist.counts.tolist(), [1, 2, 1])
+
+        # Merged histogram survives a serialization round trip
+        new_job = Job.deserialize(**job.json)
+        new_hist = new_job.measurements['test.PhotRms'].blobs['phot_resid']
+        self.assertIsInstance(new_hist, HistogramBlob)
+        self.assertEqual(new_hist.counts.tolist(), [1, 2, 1])
+
+    def test_job_iadd_keeps_blobs_per_measurement(self):
+        """Blobs with the same name in different measurements are not
+        merged or relinked across measurements.
+        """
+        edges = [0., 10., 20., 30.] * u.mmag
+        hist_a = HistogramBlob('resid', edges)
+        hist_a.fill([5.] * u.mmag)
+        hist_b = HistogramBlob('resid', edges)
+        hist_b.fill([25., 25.] * u.mmag)
+        job = Job(measurements=[
+            Measurement(self.metric_photrms, 15 * u.mmag, blobs=[hist_a]),
+            Measurement(self.metric_photmed, 15 * u.mag, blobs=[hist_b])])
+
+        job += Job()
+
+        self.assertEqual(
+            job.measurements['test.PhotRms'].blobs['resid'].counts.tolist(),
+            [1, 0, 0])
+        self.assertEqual(
+            job.measurements['test.PhotMedian'].blobs['resid']
+            .counts.tolist(),
+            [0, 0, 2])
+
+    def test_job_iadd_failed_merge(self):
+        """A failed blob merge leaves the job unchanged."""
+        hist = HistogramBlob('resid', [0., 10., 20.] * u.mmag)
+        hist.fill([5.] * u.mmag)
+        job = Job(measurements=[
+            Measurement(self.metric_photrms, 15 * u.mmag, blobs=[hist])])
+        other_hist = HistogramBlob('resid', [0., 5., 20.] * u.mmag)
+        other = Job(
+            measurements=[Measurement(self.metric_photrms, 10 * u.mmag,
+                                      blobs=[other_hist])],
+            meta={'camera': 'HSC'})
+
+        with self.assertRaises(ValueError):
+            job += other
+
+        meas = job.measurements['test.PhotRms']
+        self.assertEqual(meas.quantity, 15 * u.mmag)
+        self.assertIs(meas.blobs['resid'], hist)
+        self.assertEqual(hist.counts.tolist(), [1, 0])
+        self.assertNotIn('camera', job.meta)
+
     def test_metric_package_reload(self):
         # Create a Job without Metric definitions
         meas = Measurement('validate_drp.PA1', 15 * u.mmag)
@@ -196,6 +267,45 @@ class JobTestCase(unittest.TestCase):
 
             Metric)
 
+    def test_dispatch_json_lazy_specs(self):
+        """Building the dispatch document doesn't load lazy specifications.
+        """
+        package_dir = os.path.join(os.path.dirname(__file__), 'data')
+        specs = SpecificationSet.load_metrics_package(package_dir, lazy=True)
+        job = Job(measurements=self.measurement_set, specs=specs,
+                  meta={'camera': 'HSC'})
+        self.assertTrue(specs._pending_packages)
+
+        json_doc = job._get_dispatch_json()
+        self.assertTrue(specs._pending_packages)
+        self.assertEqual(sorted(json_doc), ['blobs', 'measurements', 'meta'])
+        self.assertEqual(json_doc, {key: job.json[key] for key in
+                                    ('measurements', 'blobs', 'meta')})
+
+    def test_chunked_dispatch(self):
+        measurements = MeasurementSet([self.meas_photrms,
+                                       self.meas_test_2_SourceCount])
+        job = Job(metrics=self.metric_set, measurements=measurements,
+                  meta={'camera': 'HSC'})
+        squash.reset_endpoint_cache()
+        squash.configure_endpoint_cache(persistent=False)
+        try:
+            with SquashServer(endpoints=['jobs', 'chunks']) as server:
+                job.dispatch(api_url=server.api_url, api_user='user',
+                             api_password='password', chunked=True,
+                             max_chunk_size=100)
+        finally:
+            squash.reset_endpoint_cache()
+            squash.configure_endpoint_cache(
+                **squash._DEFAULT_ENDPOINT_CACHE_CONFIG)
+
+        # Each blob and measurement is in a chunk of its own
+        self.assertEqual(len(server.chunks), 4)
+        expected = json.loads(json.dumps(job.json))
+        self.assertEqual(server.jobs,
+                         [{key: expected[key] for key in
+                           ('measurements', 'blobs', 'meta')}])
+
 
 if __name__ == "__main__":
     unittest.main()
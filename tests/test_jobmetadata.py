@@ -0,0 +1,228 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+from __future__ import print_function
+
+import unittest
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+import astropy.units as u
+
+from lsst.verify import Measurement, MeasurementSet, Metadata
+from lsst.verify.measurement import MeasurementNotes
+
+
+class MetadataTestCase(unittest.TestCase):
+    """Test Metadata with measurement notes."""
+
+    def setUp(self):
+        self.pa1 = Measurement('validate_drp.PA1', 5. * u.mmag,
+                               notes={'filter_name': 'r'})
+        self.am1 = Measurement('validate_drp.AM1', 5. * u.marcsec,
+                               notes={'dotted.note': 1})
+        self.meas_set = MeasurementSet([self.pa1, self.am1])
+        self.meta = Metadata(self.meas_set, data={'camera': 'HSC'})
+
+    def test_lookup(self):
+        self.assertEqual(self.meta['camera'], 'HSC')
+        self.assertEqual(self.meta['validate_drp.PA1.filter_name'], 'r')
+        self.assertEqual(self.meta['validate_drp.AM1.dotted.note'], 1)
+        self.assertIn('validate_drp.AM1.dotted.note', self.meta)
+        self.assertNotIn('validate_drp.AM1.filter_name', self.meta)
+        self.assertNotIn('validate_drp.XYZ.filter_name', self.meta)
+        with self.assertRaises(KeyError):
+            self.meta['validate_drp.AM1.filter_name']
+
+        # Notes added through the measurement are visible
+        self.pa1.notes['visits'] = 10
+        self.assertEqual(self.meta['validate_drp.PA1.visits'], 10)
+
+    def test_len_iter(self):
+        self.assertEqual(len(self.meta), 3)
+        self.assertEqual(sorted(self.meta),
+                         ['camera', 'validate_drp.AM1.dotted.note',
+                          'validate_drp.PA1.filter_name'])
+        self.assertEqual(dict(self.meta.items()), self.meta.json)
+        self.assertEqual(self.meta.json,
+                         {'camera': 'HSC',
+                          'validate_drp.AM1.dotted.note': 1,
+                          'validate_drp.PA1.filter_name': 'r'})
+
+    def test_membership_changes(self):
+        """The notes index is rebuilt only when measurements are inserted
+        or deleted.
+        """
+        notes_maps = self.meta._notes_maps
+        self.assertEqual(len(self.meta), 3)
+        self.assertIs(self.meta._notes_maps, notes_maps)
+
+        del self.meas_set['validate_drp.AM1']
+        self.assertNotIn('validate_drp.AM1.dotted.note', self.meta)
+        self.assertEqual(len(self.meta), 2)
+        self.assertIsNot(self.meta._notes_maps, notes_maps)
+
+        pa1 = Measurement('validate_drp.PA1', 4. * u.mmag,
+                          notes={'filter_name': 'i'})
+        self.meas_set.insert(pa1)
+        self.assertEqual(self.meta['validate_drp.PA1.filter_name'], 'i')
+
+    def test_job_metadata_precedence(self):
+        """Job metadata with a note's key takes precedence, and the key is
+        counted once.
+        """
+        self.meta._data['validate_drp.PA1.filter_name'] = 'z'
+        self.assertEqual(self.meta['validate_drp.PA1.filter_name'], 'z')
+        self.assertEqual(len(self.meta), 3)
+        self.assertEqual(len(list(self.meta)), 3)
+        self.assertEqual(self.meta.json['validate_drp.PA1.filter_name'], 'z')
+        self.assertEqual(dict(self.meta.items()),
+                         {'camera': 'HSC',
+                          'validate_drp.AM1.dotted.note': 1,
+                          'validate_drp.PA1.filter_name': 'z'})
+
+    def test_eq_refreshes_once(self):
+        """Comparing and counting metadata don't refresh the notes index
+        for each key.
+        """
+        other = Metadata(
+            MeasurementSet([
+                Measurement('validate_drp.PA1', 5. * u.mmag,
+                            notes={'filter_name': 'r'}),
+                Measurement('validate_drp.AM1', 5. * u.marcsec,
+                            notes={'dotted.note': 1})]),
+            data={'camera': 'HSC'})
+        refresh = Metadata._refresh_notes_maps
+        calls = []
+
+        def counted_refresh(meta):
+            calls.append(id(meta))
+            refresh(meta)
+
+        with mock.patch.object(Metadata, '_refresh_notes_maps',
+                               counted_refresh):
+            self.assertEqual(len(self.meta), 3)
+            self.assertEqual(len(calls), 1)
+            del calls[:]
+            self.assertEqual(self.meta, other)
+            self.assertLessEqual(calls.count(id(self.meta)), 2)
+            self.assertLessEqual(calls.count(id(other)), 2)
+
+        other['camera'] = 'DECam'
+        self.assertNotEqual(self.meta, other)
+        other['camera'] = 'HSC'
+        other['validate_drp.PA1.filter_name'] = 'i'
+        self.assertNotEqual(self.meta, other)
+
+    def test_setitem_delitem(self):
+        self.meta['validate_drp.PA1.visits'] = 10
+        self.assertEqual(self.pa1.notes['visits'], 10)
+        self.meta['validate_drp.XYZ.visits'] = 5
+        self.assertEqual(self.meta._data['validate_drp.XYZ.visits'], 5)
+
+        # Dots after the metric name are part of the note's name
+        self.meta['validate_drp.PA1.a.b'] = 1
+        self.assertEqual(self.pa1.notes['a.b'], 1)
+
+        del self.meta['validate_drp.PA1.visits']
+        self.assertNotIn('visits', self.pa1.notes)
+        del self.meta['validate_drp.XYZ.visits']
+        self.assertNotIn('validate_drp.XYZ.visits', self.meta)
+
+    def test_dotted_note_routing(self):
+        """Keys are routed by their first two components, so notes with
+        dotted names are stored with their measurement, as
+        Measurement.notes stores them, and not as job metadata.
+        """
+        self.meta['validate_drp.PA1.a.b'] = 1
+        self.meta.update_many([('validate_drp.PA1.a.b.c', 2)])
+        self.assertEqual(self.pa1.notes['a.b'], 1)
+        self.assertEqual(self.pa1.notes['a.b.c'], 2)
+        self.assertEqual(self.meta._data, {'camera': 'HSC'})
+
+        # Notes set through the measurement are found by the same key
+        self.pa1.notes['x.y'] = 3
+        self.assertEqual(self.meta['validate_drp.PA1.x.y'], 3)
+        del self.meta['validate_drp.PA1.x.y']
+        self.assertNotIn('x.y', self.pa1.notes)
+
+        # Without a measurement of the metric, the key is job metadata
+        self.meta['validate_drp.PA1x.a.b'] = 4
+        self.assertEqual(self.meta._data['validate_drp.PA1x.a.b'], 4)
+
+    def test_update_many(self):
+        self.meta.update_many([('validate_drp.PA1.visits', 10),
+                               ('validate_drp.AM1.visits', 20),
+                               ('validate_drp.XYZ.visits', 30),
+                               ('camera', 'DECam')])
+        self.assertEqual(self.pa1.notes['visits'], 10)
+        self.assertEqual(self.am1.notes['visits'], 20)
+        self.assertEqual(self.meta._data,
+                         {'camera': 'DECam', 'validate_drp.XYZ.visits': 30})
+
+        self.meta.update({'validate_drp.PA1.visits': 11})
+        self.assertEqual(self.pa1.notes['visits'], 11)
+
+    def test_get_notes(self):
+        self.assertEqual(self.meta.get_notes('validate_drp.PA1'),
+                         {'validate_drp.PA1.filter_name': 'r'})
+        self.assertEqual(self.meta.get_notes(self.am1.metric_name),
+                         {'validate_drp.AM1.dotted.note': 1})
+        self.assertEqual(self.meta.get_notes('validate_drp.XYZ'), {})
+
+
+class MeasurementNotesTestCase(unittest.TestCase):
+    """Test MeasurementNotes key prefixing."""
+
+    def setUp(self):
+        self.notes = MeasurementNotes('validate_drp.PA1')
+
+    def test_prefixing(self):
+        self.notes['filter_name'] = 'r'
+        self.notes['validate_drp.PA1.visits'] = 10
+        self.assertEqual(self.notes['validate_drp.PA1.filter_name'], 'r')
+        self.assertEqual(self.notes['visits'], 10)
+        self.assertIn('filter_name', self.notes)
+        self.assertNotIn('camera', self.notes)
+        self.assertEqual(sorted(self.notes),
+                         ['validate_drp.PA1.filter_name',
+                          'validate_drp.PA1.visits'])
+
+        del self.notes['filter_name']
+        self.assertNotIn('validate_drp.PA1.filter_name', self.notes)
+        with self.assertRaises(KeyError):
+            self.notes['filter_name']
+
+    def test_update(self):
+        self.notes.update({'filter_name': 'r',
+                           'validate_drp.PA1.visits': 10})
+        self.notes.update([('camera', 'HSC')])
+        self.assertEqual(dict(self.notes.items()),
+                         {'validate_drp.PA1.filter_name': 'r',
+                          'validate_drp.PA1.visits': 10,
+                          'validate_drp.PA1.camera': 'HSC'})
+
+
+if __name__ == "__main__":
+    unittest.main()
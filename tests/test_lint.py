@@ -0,0 +1,179 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test lint_metrics_package."""
+
+from __future__ import print_function, division
+
+import os
+import unittest
+
+from lsst.verify.lint import PHASES, lint_metrics_package
+
+from temp_package import TempPackageTestCase
+
+
+class LintMetricsPackageTestCase(TempPackageTestCase):
+    """Test linting a metrics package, with all errors collected and
+    unchanged files skipped.
+    """
+
+    package_name = 'verify_metrics'
+
+    def setUp(self):
+        TempPackageTestCase.setUp(self)
+        self.write_yaml(
+            'metrics/pkg.yaml',
+            'm:\n'
+            '  unit: mmag\n'
+            '  description: A metric.\n')
+        self.write_yaml(
+            'specs/pkg/base.yaml',
+            'id: "base"\n'
+            'metric: "m"\n'
+            'threshold:\n'
+            '  unit: "mmag"\n'
+            '  operator: "<"\n')
+        self.write_yaml(
+            'specs/pkg/a.yaml',
+            'name: "a"\n'
+            'base: "base#base"\n'
+            'threshold:\n'
+            '  value: 1.0\n')
+        self.write_yaml(
+            'specs/pkg/b.yaml',
+            'name: "b"\n'
+            'metric: "m"\n'
+            'threshold:\n'
+            '  unit: "mmag"\n'
+            '  operator: "<"\n'
+            '  value: 2.0\n')
+
+    def lint(self, **kwargs):
+        return lint_metrics_package(self.package_dir, **kwargs)
+
+    def test_pass(self):
+        result = self.lint()
+        self.assertTrue(result.passed)
+        self.assertEqual(len(result.checked), 4)
+        self.assertEqual(result.skipped, [])
+
+        self.assertEqual(set(result.timings), set(result.checked))
+        for file_timings in result.timings.values():
+            self.assertEqual(tuple(file_timings), PHASES)
+        table = result.timing_table()
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table.colnames,
+                         ['File', 'Parse', 'Resolve', 'Deserialize',
+                          'Total'])
+
+    def test_all_errors(self):
+        """Errors in several files, and in files that inherit from them,
+        are all reported.
+        """
+        self.write_yaml('metrics/pkg.yaml', 'm: [\n')
+        self.write_yaml('specs/pkg/base.yaml',
+                        'id: "base"\n'
+                        'base: "#missing"\n')
+        self.write_yaml('specs/pkg/b.yaml',
+                        'name: "b"\n'
+                        'metric: "m"\n'
+                        'threshold:\n'
+                        '  unit: "not_a_unit"\n'
+                        '  operator: "<"\n'
+                        '  value: 2.0\n')
+        result = self.lint(processes=2)
+        self.assertFalse(result.passed)
+        error_paths = sorted(set(path for path, _ in result.errors))
+        self.assertEqual(error_paths,
+                         sorted(self.package_path(p) for p in (
+                             'metrics/pkg.yaml', 'specs/pkg/a.yaml',
+                             'specs/pkg/b.yaml', 'specs/pkg/base.yaml')))
+
+    def test_incremental(self):
+        self.lint()
+        result = self.lint()
+        self.assertEqual(result.checked, [])
+        self.assertEqual(len(result.skipped), 4)
+        self.assertEqual(len(result.timings), 0)
+
+        # Changing a base lints the files that inherit from it
+        self.write_yaml('specs/pkg/base.yaml',
+                        'id: "base"\n'
+                        'metric: "m"\n'
+                        'threshold:\n'
+                        '  unit: "mmag"\n'
+                        '  operator: ">"\n')
+        result = self.lint()
+        self.assertEqual(result.checked,
+                         [self.package_path('specs/pkg/a.yaml'),
+                          self.package_path('specs/pkg/base.yaml')])
+        self.assertTrue(result.passed)
+
+        # Failing files are linted until they're fixed
+        self.write_yaml('specs/pkg/a.yaml',
+                        'name: "a"\n'
+                        'base: "base#missing"\n')
+        self.assertFalse(self.lint().passed)
+        result = self.lint()
+        self.assertEqual(result.checked,
+                         [self.package_path('specs/pkg/a.yaml')])
+        self.assertFalse(result.passed)
+
+        # Without the state, everything is linted
+        result = self.lint(incremental=False)
+        self.assertEqual(len(result.checked), 4)
+
+    def test_state_path(self):
+        """The state is kept in the cache directory by default, or at the
+        given path.
+        """
+        self.lint()
+        state_files = os.listdir(self.cache_dir)
+        self.assertEqual(len(state_files), 1)
+        self.assertTrue(state_files[0].startswith('lint-'))
+
+        state_path = os.path.join(self.temp_dir, 'lint.pickle')
+        self.lint(state_path=state_path)
+        self.assertTrue(os.path.exists(state_path))
+        result = self.lint(state_path=state_path)
+        self.assertEqual(result.checked, [])
+        self.assertEqual(os.listdir(self.cache_dir), state_files)
+
+    def test_changed_file_uses_unchanged_base(self):
+        """Bases in skipped files are loaded when needed."""
+        self.lint()
+        self.write_yaml('specs/pkg/a.yaml',
+                        'name: "a"\n'
+                        'base: "base#base"\n'
+                        'threshold:\n'
+                        '  value: 3.0\n')
+        result = self.lint()
+        self.assertTrue(result.passed)
+        self.assertEqual(result.checked,
+                         [self.package_path('specs/pkg/a.yaml')])
+        self.assertIn(self.package_path('specs/pkg/base.yaml'), result.timings)
+        self.assertNotIn(self.package_path('specs/pkg/b.yaml'), result.timings)
+
+
+if __name__ == "__main__":
+    unittest.main()
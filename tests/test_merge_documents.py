@@ -96,6 +96,27 @@ class TestMergeDocuments(unittest.TestCase):
         self.assertEqual(self.base_doc, self.base_doc_copy)
         self.assertEqual(self.new_doc, self.new_doc_copy)
 
+    def test_structural_sharing(self):
+        """Unchanged subtrees are shared, merged subtrees are new."""
+        base_doc = OrderedDict([
+            ('shared', OrderedDict([('x', [1, 2])])),
+            ('merged', OrderedDict([('y', 1)])),
+            ('items', [1]),
+        ])
+        new_doc = OrderedDict([
+            ('merged', OrderedDict([('z', 2)])),
+            ('items', [2]),
+        ])
+        merged = merge_documents(base_doc, new_doc)
+
+        self.assertIs(merged['shared'], base_doc['shared'])
+        self.assertIsNot(merged, base_doc)
+        self.assertIsNot(merged['merged'], base_doc['merged'])
+        self.assertIsNot(merged['items'], base_doc['items'])
+        self.assertEqual(merged['items'], [1, 2])
+        self.assertEqual(base_doc['items'], [1])
+        self.assertEqual(base_doc['merged'], OrderedDict([('y', 1)]))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -22,11 +22,14 @@
 #
 from __future__ import print_function
 
+import copy
 import os
 import unittest
 
 from lsst.verify import Metric, MetricSet, Name
 
+from temp_package import TempPackageTestCase
+
 
 class MetricsPackageTestCase(unittest.TestCase):
     """Test creating a MetricSet from a mock verification framework
@@ -88,6 +91,19 @@ class MetricsPackageTestCase(unittest.TestCase):
             'random-tag',
             self.metric_set['testing.AM1'].tags)
 
+    def test_lazy(self):
+        """Test lazy loading of package metrics."""
+        metric_set = MetricSet.load_metrics_package(
+            package_name_or_path=self.metrics_yaml_dirname, lazy=True)
+        self.assertEqual(list(metric_set._pending_packages), ['testing'])
+
+        self.assertNotIn('other.PA1', metric_set)
+        self.assertEqual(list(metric_set._pending_packages), ['testing'])
+
+        self.assertIn('testing.PA1', metric_set)
+        self.assertEqual(len(metric_set._pending_packages), 0)
+        self.assertEqual(metric_set, self.metric_set)
+
     def test_setitem_delitem(self):
         """Test adding and deleting metrics."""
         m1 = Metric('validate_drp.test',
@@ -158,6 +174,29 @@ class MetricsPackageTestCase(unittest.TestCase):
         self.assertIn('testing.AM1', self.metric_set)
 
 
+class MetricsPackageRefreshTestCase(TempPackageTestCase):
+    """Test reloading modified metrics files of a MetricSet."""
+
+    def setUp(self):
+        TempPackageTestCase.setUp(self)
+        self.copy_test_package(dirnames=('metrics',))
+        self.metric_set = MetricSet.load_metrics_package(
+            package_name_or_path=self.package_dir)
+
+    def test_refresh(self):
+        self.assertEqual(self.metric_set.refresh(), [])
+
+        self.write_yaml('metrics/other.yaml',
+                        'AM2:\n'
+                        '  description: "Another metric"\n'
+                        '  unit: "arcsec"\n')
+        os.remove(self.package_path('metrics/testing.yaml'))
+
+        self.assertEqual(len(self.metric_set.refresh()), 2)
+        self.assertEqual([str(name) for name in self.metric_set],
+                         ['other.AM2'])
+
+
 class VerifyMetricsParsingTestCase(unittest.TestCase):
     """Test parsing metrics from verify_metrics (an EUPS package)."""
 
@@ -211,6 +250,66 @@ class MetricSetSubsetTestCase(unittest.TestCase):
         self.assertNotIn(self.m2.name, subset)
         self.assertNotIn(self.m3.name, subset)
 
+    def test_tag_index(self):
+        """The tag index follows insertions, replacements and
+        deletions.
+        """
+        self.assertEqual(self.metric_set._tag_index,
+                         {'testing': set([self.m1.name, self.m3.name]),
+                          'other': set([self.m2.name])})
+
+        self.metric_set.insert(Metric('pkgA.m2', 'In pkgA', '',
+                                      tags=['testing', 'new']))
+        del self.metric_set['pkgA.m1']
+        self.assertEqual(self.metric_set._tag_index,
+                         {'testing': set([self.m2.name, self.m3.name]),
+                          'new': set([self.m2.name])})
+
+        subset = self.metric_set.subset(tags=['testing', 'new'])
+        self.assertEqual(list(subset.keys()), [self.m2.name])
+        self.assertEqual(len(self.metric_set.subset(tags=['missing'])), 0)
+
+        # Tags assigned after insertion are indexed
+        self.metric_set['pkgB.m3'].tags = ['new']
+        self.assertEqual(sorted(str(name) for name in
+                                self.metric_set.subset(tags=['new'])),
+                         ['pkgA.m2', 'pkgB.m3'])
+        self.assertEqual(len(self.metric_set.subset(tags=['testing'])), 1)
+
+    def test_tag_index_view(self):
+        """Views and copies see tags assigned after insertion, without
+        affecting each other's indexes.
+        """
+        subset = self.metric_set.subset('pkgA')
+        copied = copy.copy(self.metric_set)
+        self.m2.tags = ['testing']
+        self.assertEqual(sorted(str(name) for name in
+                                subset.subset(tags=['testing'])),
+                         ['pkgA.m1', 'pkgA.m2'])
+        # The view's selection is kept
+        self.assertNotIn('pkgB.m3', subset)
+        self.assertEqual(len(copied.subset(tags=['testing'])), 3)
+        self.assertEqual(len(self.metric_set.subset(tags=['other'])), 0)
+
+    def test_subset_view(self):
+        """Subsets share the set's metrics until they are modified."""
+        subset = self.metric_set.subset('pkgA')
+        self.assertIs(subset._metrics, self.metric_set._metrics)
+        with self.assertRaises(KeyError):
+            subset['pkgB.m3']
+
+        subsubset = subset.subset(tags=['testing'])
+        self.assertEqual(list(subsubset.keys()), [self.m1.name])
+
+        m4 = Metric('pkgA.m4', 'In pkgA', '', tags='testing')
+        subset.insert(m4)
+        self.assertIsNot(subset._metrics, self.metric_set._metrics)
+        self.assertEqual(sorted(str(name) for name in subset),
+                         ['pkgA.m1', 'pkgA.m2', 'pkgA.m4'])
+        self.assertNotIn('pkgB.m3', subset._metrics)
+        self.assertNotIn(m4.name, self.metric_set)
+        self.assertEqual(list(subsubset.keys()), [self.m1.name])
+
 
 class MetricSetSerializationTestCase(unittest.TestCase):
     """Test JSON serialization and deserialization for MetricSets."""
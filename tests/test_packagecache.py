@@ -0,0 +1,275 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+from __future__ import print_function
+
+import os
+import unittest
+
+import astropy.units as u
+
+from lsst.verify import Job, MetricSet, SpecificationSet, Name
+from lsst.verify.packagecache import (get_cache_dir, clear_cache,
+                                      compute_package_digest,
+                                      package_registry)
+
+from temp_package import TempPackageTestCase
+
+
+class PackageCacheTestCase(TempPackageTestCase):
+    """Test the persistent metrics package cache."""
+
+    package_name = 'verify_metrics'
+
+    def setUp(self):
+        TempPackageTestCase.setUp(self)
+        self.copy_test_package()
+
+        self.patch_environ({'LSST_VERIFY_PERSISTENT_CACHE': '1',
+                            'LSST_VERIFY_NO_CACHE': None})
+        package_registry.invalidate()
+
+    def tearDown(self):
+        package_registry.invalidate()
+        package_registry.check_mtime = False
+
+    def cache_files(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        return sorted(os.listdir(self.cache_dir))
+
+    def test_cache_dir(self):
+        self.assertEqual(get_cache_dir(), self.cache_dir)
+
+    def test_cached_load(self):
+        metrics = MetricSet.load_metrics_package(self.package_dir)
+        specs = SpecificationSet.load_metrics_package(self.package_dir)
+        self.assertEqual(len(self.cache_files()), 2)
+        self.assertFalse(any(f.endswith('.tmp') for f in self.cache_files()))
+
+        # Second loads come from the cache, and are equal
+        self.assertEqual(MetricSet.load_metrics_package(self.package_dir),
+                         metrics)
+        cached_specs = SpecificationSet.load_metrics_package(self.package_dir)
+        self.assertEqual(cached_specs, specs)
+        self.assertIn('validate_drp.PA1.design_gri', cached_specs)
+        self.assertEqual(len(self.cache_files()), 2)
+
+        # Subsets are cached separately
+        SpecificationSet.load_metrics_package(self.package_dir,
+                                              subset='validate_drp')
+        self.assertEqual(len(self.cache_files()), 3)
+
+        clear_cache()
+        self.assertEqual(self.cache_files(), [])
+
+    def test_stale_entry(self):
+        """Modifying a package file changes its digest."""
+        digest = compute_package_digest(self.package_dir)
+        SpecificationSet.load_metrics_package(self.package_dir)
+
+        yaml_path = self.package_path('specs/validate_drp/LPM-17-PA1.yaml')
+        with open(yaml_path, 'a') as f:
+            f.write('\n---\n'
+                    'name: "extra_gri"\n'
+                    'base: "#PA1-base"\n'
+                    'threshold:\n'
+                    '  value: 1.0\n')
+        self.assertNotEqual(compute_package_digest(self.package_dir), digest)
+
+        package_registry.invalidate(self.package_dir)
+        specs = SpecificationSet.load_metrics_package(self.package_dir)
+        self.assertIn('validate_drp.PA1.extra_gri', specs)
+        # The stale entry is replaced
+        self.assertEqual(len(self.cache_files()), 1)
+
+    def test_pruning(self):
+        """Stale entries, and entries of other cache versions, are removed
+        when an entry is written. Other files are kept.
+        """
+        os.makedirs(self.cache_dir)
+        for filename in ('package-v1-key-digest.pickle', 'lint-key.pickle'):
+            open(os.path.join(self.cache_dir, filename), 'wb').close()
+
+        SpecificationSet.load_metrics_package(self.package_dir)
+        entries = [f for f in self.cache_files() if f.startswith('package-')]
+        self.assertEqual(len(entries), 1)
+        self.assertIn('lint-key.pickle', self.cache_files())
+
+        yaml_path = self.package_path('specs/validate_drp/LPM-17-PA1.yaml')
+        with open(yaml_path, 'a') as f:
+            f.write('\n')
+        package_registry.invalidate()
+        SpecificationSet.load_metrics_package(self.package_dir)
+        new_entries = [f for f in self.cache_files()
+                       if f.startswith('package-')]
+        self.assertEqual(len(new_entries), 1)
+        self.assertNotEqual(new_entries, entries)
+
+        clear_cache()
+        self.assertEqual(self.cache_files(), ['lint-key.pickle'])
+
+    def test_corrupt_entry(self):
+        """Unreadable entries are rebuilt."""
+        metrics = MetricSet.load_metrics_package(self.package_dir)
+        cache_path = os.path.join(self.cache_dir, self.cache_files()[0])
+        with open(cache_path, 'wb') as f:
+            f.write(b'not a pickle')
+
+        package_registry.invalidate()
+        self.assertEqual(MetricSet.load_metrics_package(self.package_dir),
+                         metrics)
+        with open(cache_path, 'rb') as f:
+            self.assertNotEqual(f.read(), b'not a pickle')
+
+    def test_registry(self):
+        """Repeated loads are served from the in-process registry as
+        independent copies.
+        """
+        specs = SpecificationSet.load_metrics_package(self.package_dir)
+        self.assertEqual(len(package_registry), 1)
+        clear_cache()
+
+        specs2 = SpecificationSet.load_metrics_package(self.package_dir)
+        self.assertIsNot(specs2, specs)
+        self.assertEqual(specs2, specs)
+        self.assertEqual(self.cache_files(), [])
+
+        # Modifying a copy doesn't affect the registry or other copies
+        name = Name('validate_drp.PA1.design_gri')
+        del specs2[name]
+        self.assertNotIn(name, specs2)
+        self.assertNotIn(name, [spec.name for spec in
+                                specs2.get_metric_specs('validate_drp.PA1')])
+        self.assertIn(name, specs)
+        self.assertIn(name, [spec.name for spec in
+                             specs.get_metric_specs('validate_drp.PA1')])
+        self.assertIn(name,
+                      SpecificationSet.load_metrics_package(self.package_dir))
+
+        metrics = MetricSet.load_metrics_package(self.package_dir)
+        metric_name = list(metrics.keys())[0]
+        del metrics[metric_name]
+        self.assertIn(metric_name,
+                      MetricSet.load_metrics_package(self.package_dir))
+
+        # Nor does modifying the copy's specifications and metrics
+        specs2 = SpecificationSet.load_metrics_package(self.package_dir)
+        name = Name('validate_drp.PA1.minimum_gri')
+        threshold = specs2[name].threshold
+        specs2[name].threshold = threshold + 1. * threshold.unit
+        self.assertEqual(
+            SpecificationSet.load_metrics_package(self.package_dir)[name]
+            .threshold, threshold)
+
+        metrics = MetricSet.load_metrics_package(self.package_dir)
+        metrics[metric_name].description = 'Modified.'
+        self.assertNotEqual(
+            MetricSet.load_metrics_package(self.package_dir)[metric_name]
+            .description, 'Modified.')
+
+    def test_registry_copy_on_write(self):
+        """Registered metrics and specifications are only copied when they
+        are fetched from a copy.
+        """
+        specs = SpecificationSet.load_metrics_package(self.package_dir)
+        specs2 = SpecificationSet.load_metrics_package(self.package_dir)
+        name = Name('validate_drp.PA1.design_gri')
+        other_name = Name('validate_drp.PA2_design_gri.srd')
+        self.assertIs(specs._specs[name], specs2._specs[name])
+
+        spec = specs[name]
+        self.assertIsNot(spec, specs2._specs[name])
+        self.assertIs(specs[name], spec)
+        self.assertIn(spec, specs.get_metric_specs('validate_drp.PA1'))
+        self.assertIs(specs._specs[other_name], specs2._specs[other_name])
+
+        # Sets that are updated with a copy share its items until they're
+        # fetched too
+        job = Job()
+        job.specs.update(specs2)
+        self.assertIs(job.specs._specs[other_name], specs2._specs[other_name])
+        job.specs[other_name].threshold = 1. * u.mag
+        self.assertNotEqual(specs2[other_name].threshold, 1. * u.mag)
+
+        metrics = MetricSet.load_metrics_package(self.package_dir)
+        metrics2 = MetricSet.load_metrics_package(self.package_dir)
+        metric_name = list(metrics.keys())[0]
+        self.assertIs(metrics._metrics[metric_name],
+                      metrics2._metrics[metric_name])
+        for _, metric in metrics.items():
+            metric.description = 'Modified.'
+        self.assertNotEqual(metrics2[metric_name].description, 'Modified.')
+        self.assertEqual(metrics[metric_name].description, 'Modified.')
+
+    def test_registry_mtime_check(self):
+        yaml_path = self.package_path('specs/validate_drp/LPM-17-PA1.yaml')
+        SpecificationSet.load_metrics_package(self.package_dir)
+        with open(yaml_path, 'a') as f:
+            f.write('\n---\n'
+                    'name: "extra_gri"\n'
+                    'base: "#PA1-base"\n'
+                    'threshold:\n'
+                    '  value: 1.0\n')
+
+        # Without the mtime check, the registered package is reused
+        specs = SpecificationSet.load_metrics_package(self.package_dir)
+        self.assertNotIn('validate_drp.PA1.extra_gri', specs)
+
+        package_registry.check_mtime = True
+        specs = SpecificationSet.load_metrics_package(self.package_dir)
+        self.assertIn('validate_drp.PA1.extra_gri', specs)
+
+    def test_job_reload(self):
+        """Job.reload_metrics_package reads edited files despite the
+        registry.
+        """
+        yaml_path = self.package_path('specs/validate_drp/LPM-17-PA1.yaml')
+        name = Name('validate_drp.PA1.design_gri')
+        job = Job()
+        job.reload_metrics_package(self.package_dir)
+        self.assertEqual(job.specs[name].threshold, 5.0 * u.mmag)
+
+        with open(yaml_path) as f:
+            content = f.read()
+        self.assertEqual(content.count('value: 5.0'), 1)
+        with open(yaml_path, 'w') as f:
+            f.write(content.replace('value: 5.0', 'value: 7.00'))
+
+        job = Job()
+        job.reload_metrics_package(self.package_dir)
+        self.assertEqual(job.specs[name].threshold, 7.0 * u.mmag)
+
+    def test_disabled(self):
+        self.patch_environ({'LSST_VERIFY_NO_CACHE': '1'})
+        MetricSet.load_metrics_package(self.package_dir)
+        self.assertEqual(self.cache_files(), [])
+
+    def test_not_persistent_by_default(self):
+        self.patch_environ({'LSST_VERIFY_PERSISTENT_CACHE': None})
+        MetricSet.load_metrics_package(self.package_dir)
+        self.assertEqual(len(package_registry), 1)
+        self.assertEqual(self.cache_files(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
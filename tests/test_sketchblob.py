@@ -0,0 +1,116 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+from __future__ import print_function
+
+import unittest
+
+import numpy as np
+import astropy.units as u
+
+from lsst.verify import Blob, SketchBlob
+
+
+class SketchBlobTestCase(unittest.TestCase):
+    """Test SketchBlob quantile estimates, merging and serialization."""
+
+    def setUp(self):
+        self.values = np.random.RandomState(7).lognormal(size=5000)
+
+    def assertQuantilesClose(self, sketch, values):
+        accuracy = sketch.relative_accuracy
+        sorted_values = np.sort(values)
+        for q in (0., 0.01, 0.25, 0.5, 0.75, 0.99, 1.):
+            expected = sorted_values[int(q * (len(values) - 1))]
+            estimate = sketch.quantile(q).to(u.mmag).value
+            self.assertLessEqual(abs(estimate - expected),
+                                 accuracy * abs(expected) + 1e-12)
+
+    def test_quantiles(self):
+        sketch = SketchBlob('resid', unit='mmag')
+        sketch.add(self.values * u.mmag)
+        self.assertEqual(sketch.count, len(self.values))
+        self.assertQuantilesClose(sketch, self.values)
+
+    def test_negative_and_zero_values(self):
+        values = np.concatenate([-self.values, [0., 0.], self.values])
+        sketch = SketchBlob('resid', unit='mmag')
+        sketch.add(values * u.mmag)
+        self.assertEqual(sketch.count, len(values))
+        self.assertQuantilesClose(sketch, values)
+
+    def test_empty(self):
+        sketch = SketchBlob('resid', unit='mmag')
+        self.assertEqual(sketch.count, 0)
+        self.assertIsNone(sketch.quantile(0.5))
+        self.assertIsNone(sketch.min)
+
+    def test_merge(self):
+        sketches = []
+        for chunk in np.array_split(self.values, 4):
+            sketch = SketchBlob('resid', unit='mmag')
+            sketch.add(chunk * u.mmag)
+            sketches.append(sketch)
+
+        merged = SketchBlob('resid', unit='mmag')
+        for sketch in sketches:
+            merged.merge(sketch)
+
+        reference = SketchBlob('resid', unit='mmag')
+        reference.add(self.values * u.mmag)
+        self.assertEqual(merged.json['data'], reference.json['data'])
+
+    def test_merge_collapsed_is_order_independent(self):
+        a = SketchBlob('resid', max_bins=16)
+        a.add(self.values[:2000])
+        b = SketchBlob('resid', max_bins=16)
+        b.add(self.values[2000:])
+
+        ab = SketchBlob('resid', max_bins=16).merge(a).merge(b)
+        ba = SketchBlob('resid', max_bins=16).merge(b).merge(a)
+        self.assertEqual(ab.json['data'], ba.json['data'])
+        self.assertEqual(len(ab.json['data']['positive_keys']['value']), 16)
+        self.assertEqual(ab.count, len(self.values))
+
+    def test_merge_incompatible(self):
+        sketch = SketchBlob('resid', unit='mmag')
+        with self.assertRaises(ValueError):
+            sketch.merge(SketchBlob('resid', unit='arcsec'))
+        with self.assertRaises(ValueError):
+            sketch.merge(SketchBlob('resid', unit='mmag',
+                                    relative_accuracy=0.05))
+
+    def test_json(self):
+        sketch = SketchBlob('resid', unit='mmag', label='residual')
+        sketch.add(np.concatenate([-self.values, self.values]) * u.mmag)
+
+        json_doc = sketch.json
+        self.assertEqual(json_doc['type'], 'sketch')
+
+        new_sketch = Blob.deserialize(**json_doc)
+        self.assertIsInstance(new_sketch, SketchBlob)
+        self.assertEqual(new_sketch, sketch)
+        self.assertEqual(new_sketch.quantile(0.9), sketch.quantile(0.9))
+
+
+if __name__ == "__main__":
+    unittest.main()
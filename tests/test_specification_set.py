@@ -34,11 +34,17 @@ except ImportError:
 import astropy.units as u
 
 from lsst.verify.errors import SpecificationResolutionError
+from lsst.verify.metric import Metric
+from lsst.verify.metricset import MetricSet
+from lsst.verify.measurement import Measurement
+from lsst.verify.measurementset import MeasurementSet
 from lsst.verify.naming import Name
 from lsst.verify.specset import SpecificationSet, SpecificationPartial
 from lsst.verify.spec import ThresholdSpecification
 from lsst.verify.yamlutils import load_ordered_yaml
 
+from temp_package import TempPackageTestCase
+
 
 class TestSpecificationSet(unittest.TestCase):
     """Tests for SpecificationSet basic usage."""
@@ -142,6 +148,41 @@ class TestSpecificationSet(unittest.TestCase):
         self.assertEqual(resolved_doc['threshold']['operator'], '<')
         self.assertNotIn('base', resolved_doc)
 
+    def test_resolve_document_cache(self):
+        """Test that merged bases are reused and invalidated when a base is
+        replaced.
+        """
+        def make_doc(name, value):
+            return OrderedDict([
+                ('name', name),
+                ('base', ['PA1.design', 'validate_drp.LPM-17-PA1#PA1-Base']),
+                ('package', 'validate_drp'),
+                ('threshold', OrderedDict([('value', value)]))
+            ])
+
+        doc_a = self.spec_set.resolve_document(make_doc('PA1.a', 1))
+        doc_b = self.spec_set.resolve_document(make_doc('PA1.b', 2))
+        self.assertEqual(len(self.spec_set._resolved_bases), 1)
+        self.assertEqual(doc_a['threshold']['value'], 1)
+        self.assertEqual(doc_b['threshold']['value'], 2)
+        self.assertEqual(doc_b['threshold']['unit'], 'mag')
+
+        # Replacing a partial in the chain invalidates the merged bases
+        self.spec_set['validate_drp.LPM-17-PA1#PA1-Base'] = \
+            SpecificationPartial(OrderedDict([
+                ('id', 'validate_drp.LPM-17-PA1#PA1-Base'),
+                ('threshold', OrderedDict([('unit', 'mmag')]))
+            ]))
+        self.assertEqual(len(self.spec_set._resolved_bases), 0)
+        doc_c = self.spec_set.resolve_document(make_doc('PA1.c', 3))
+        self.assertEqual(doc_c['threshold']['unit'], 'mmag')
+
+        # So does replacing a specification in the chain
+        self.spec_set.insert(ThresholdSpecification(
+            'validate_drp.PA1.design', 5. * u.mmag, '>'))
+        doc_d = self.spec_set.resolve_document(make_doc('PA1.d', 4))
+        self.assertEqual(doc_d['threshold']['operator'], '>')
+
     def test_unresolvable_document(self):
         """Test that SpecificationResolutionError is raised for unresolveable
         inheritance bases.
@@ -206,6 +247,36 @@ class TestSpecificationSetGetterSetter(unittest.TestCase):
         with self.assertRaises(KeyError):
             spec_set['validate_drp.hello.world'] = spec_PA1_design
 
+    def test_metric_index(self):
+        """Test that get_metric_specs follows insertions and deletions."""
+        spec_PA1_design = ThresholdSpecification(
+            'validate_drp.PA1.design', 5. * u.mmag, '<')
+        spec_PA1_stretch = ThresholdSpecification(
+            'validate_drp.PA1.stretch', 3. * u.mmag, '<')
+        spec_PA2_design = ThresholdSpecification(
+            'validate_drp.PA2.design', 15. * u.mmag, '<=')
+
+        spec_set = SpecificationSet([spec_PA1_design])
+        spec_set.update(SpecificationSet([spec_PA1_stretch,
+                                          spec_PA2_design]))
+        self.assertEqual(
+            set(spec.name for spec
+                in spec_set.get_metric_specs('validate_drp.PA1')),
+            set([spec_PA1_design.name, spec_PA1_stretch.name]))
+        self.assertEqual(
+            spec_set.get_metric_specs(Name('validate_drp.PA2')),
+            [spec_PA2_design])
+
+        # Replacing a specification doesn't duplicate it in the index
+        spec_set.insert(ThresholdSpecification(
+            'validate_drp.PA1.design', 4. * u.mmag, '<'))
+        self.assertEqual(len(spec_set.get_metric_specs('validate_drp.PA1')),
+                         2)
+
+        del spec_set['validate_drp.PA2.design']
+        self.assertEqual(spec_set.get_metric_specs('validate_drp.PA2'), [])
+        self.assertEqual(spec_set.get_metric_specs('validate_drp.PA3'), [])
+
 
 class TestSpecificationSetLoadYamlFile(unittest.TestCase):
     """Test SpecificationSet._load_yaml_file() and sub-functions."""
@@ -353,6 +424,236 @@ class TestSpecificationSetLoadSinglePackage(unittest.TestCase):
         self.assertTrue('validate_drp:cfht_gri#base' in spec_set)
 
 
+class TestSpecificationSetDependencyResolution(TempPackageTestCase):
+    """Test resolution of specification inheritance across YAML files."""
+
+    package_name = 'pkg'
+
+    def test_deep_chain(self):
+        """Each specification inherits from the previous one, declared
+        in reverse order.
+        """
+        n = 200
+        docs = ['id: "root"\n'
+                'metric: "m"\n'
+                'threshold:\n'
+                '  unit: "mmag"\n'
+                '  operator: "<="\n'
+                '  value: 0.0\n']
+        docs.append('name: "s0"\n'
+                    'base: "#root"\n')
+        for i in range(1, n):
+            docs.append('name: "s{0:d}"\n'
+                        'base: "m.s{1:d}"\n'
+                        'threshold:\n'
+                        '  value: {0:d}\n'.format(i, i - 1))
+        self.write_yaml('chain.yaml', '---\n'.join(reversed(docs)))
+
+        spec_set = SpecificationSet.load_single_package(self.package_dir)
+        self.assertEqual(len(spec_set), n)
+        spec = spec_set['pkg.m.s{0:d}'.format(n - 1)]
+        self.assertEqual(spec.threshold, (n - 1) * u.mmag)
+        self.assertEqual(spec.operator_str, '<=')
+
+    def test_cycle(self):
+        self.write_yaml('cycle.yaml',
+                        'id: "a"\n'
+                        'base: "#b"\n'
+                        '---\n'
+                        'id: "b"\n'
+                        'base: "#a"\n')
+        with self.assertRaises(SpecificationResolutionError) as cm:
+            SpecificationSet.load_single_package(self.package_dir)
+        self.assertIn('pkg:cycle#a -> pkg:cycle#b -> pkg:cycle#a',
+                      str(cm.exception))
+
+    def test_missing_base(self):
+        self.write_yaml('missing.yaml',
+                        'name: "s1"\n'
+                        'metric: "m"\n'
+                        'base: "#base"\n'
+                        '---\n'
+                        'id: "base"\n'
+                        'base: "#missing"\n')
+        with self.assertRaises(SpecificationResolutionError) as cm:
+            SpecificationSet.load_single_package(self.package_dir)
+        self.assertIn(
+            'pkg:missing#base -> pkg:missing#missing',
+            str(cm.exception))
+
+
+class TestSpecificationSetLazyLoad(TempPackageTestCase):
+    """Test SpecificationSet.load_metrics_package(lazy=True)."""
+
+    def setUp(self):
+        TempPackageTestCase.setUp(self)
+        self.write_yaml('specs/pkg_a/a.yaml',
+                        'name: "design"\n'
+                        'metric: "m"\n'
+                        'base: "pkg_b:b#base"\n'
+                        'threshold:\n'
+                        '  value: 1.0\n')
+        self.write_yaml('specs/pkg_b/b.yaml',
+                        'id: "base"\n'
+                        'threshold:\n'
+                        '  unit: "mmag"\n'
+                        '  operator: "<"\n'
+                        '---\n'
+                        'name: "design"\n'
+                        'metric: "m"\n'
+                        'base: "#base"\n'
+                        'threshold:\n'
+                        '  value: 2.0\n')
+
+    def test_lazy_lookup(self):
+        spec_set = SpecificationSet.load_metrics_package(self.package_dir,
+                                                         lazy=True)
+        self.assertEqual(sorted(spec_set._pending_packages),
+                         ['pkg_a', 'pkg_b'])
+
+        # Looking up pkg_b doesn't load pkg_a
+        self.assertIn('pkg_b.m.design', spec_set)
+        self.assertEqual(sorted(spec_set._pending_packages), ['pkg_a'])
+
+        spec = spec_set['pkg_a.m.design']
+        self.assertEqual(spec.threshold, 1. * u.mmag)
+        self.assertEqual(len(spec_set._pending_packages), 0)
+
+    def test_lazy_cross_package_base(self):
+        """Bases in other packages are loaded on demand."""
+        spec_set = SpecificationSet.load_metrics_package(self.package_dir,
+                                                         lazy=True)
+        specs = spec_set.get_metric_specs('pkg_a.m')
+        self.assertEqual(len(specs), 1)
+        self.assertEqual(specs[0].operator_str, '<')
+        self.assertEqual(len(spec_set._pending_packages), 0)
+
+    def test_lazy_equals_eager(self):
+        lazy_set = SpecificationSet.load_metrics_package(self.package_dir,
+                                                         lazy=True)
+        eager_set = SpecificationSet.load_metrics_package(self.package_dir)
+        self.assertEqual(len(lazy_set), 2)
+        self.assertEqual(lazy_set, eager_set)
+
+    def test_lazy_subset(self):
+        spec_set = SpecificationSet.load_metrics_package(self.package_dir,
+                                                         lazy=True)
+        subset = spec_set.subset(name='pkg_b')
+        self.assertEqual([str(name) for name in subset],
+                         ['pkg_b.m.design'])
+        self.assertEqual(sorted(spec_set._pending_packages), ['pkg_a'])
+
+
+class TestSpecificationSetParallelLoad(TempPackageTestCase):
+    """Test SpecificationSet.load_metrics_package(processes=...)."""
+
+    def setUp(self):
+        TempPackageTestCase.setUp(self)
+        self.patch_environ({'LSST_VERIFY_NO_CACHE': '1'})
+        self.write_yaml('specs/pkg_b/base.yaml',
+                        'id: "base"\n'
+                        'threshold:\n'
+                        '  unit: "mmag"\n'
+                        '  operator: "<"\n')
+        for i in range(4):
+            self.write_yaml('specs/pkg_a/s{0:d}.yaml'.format(i),
+                            'name: "s{0:d}"\n'
+                            'metric: "m"\n'
+                            'base: "pkg_b:base#base"\n'
+                            'threshold:\n'
+                            '  value: {0:d}\n'.format(i))
+
+    def test_processes(self):
+        """Parsing in worker processes gives the same set as parsing
+        serially, including bases from another package.
+        """
+        serial_set = SpecificationSet.load_metrics_package(self.package_dir)
+        parallel_set = SpecificationSet.load_metrics_package(self.package_dir,
+                                                             processes=2)
+        self.assertEqual(len(parallel_set), 4)
+        self.assertEqual(parallel_set, serial_set)
+        spec = parallel_set['pkg_a.m.s3']
+        self.assertEqual(spec.threshold, 3. * u.mmag)
+        self.assertEqual(spec.operator_str, '<')
+
+
+class TestSpecificationSetRefresh(TempPackageTestCase):
+    """Test SpecificationSet.refresh."""
+
+    package_name = 'pkg'
+
+    def setUp(self):
+        TempPackageTestCase.setUp(self)
+        self.write_yaml('base.yaml',
+                        'id: "base"\n'
+                        'metric: "m"\n'
+                        'threshold:\n'
+                        '  unit: "mmag"\n'
+                        '  operator: "<"\n')
+        self.write_yaml('child.yaml',
+                        'name: "design"\n'
+                        'base: "base#base"\n'
+                        'threshold:\n'
+                        '  value: 5.0\n'
+                        '---\n'
+                        'name: "stretch"\n'
+                        'base: "m.design"\n'
+                        'threshold:\n'
+                        '  value: 3.0\n')
+        self.write_yaml('other.yaml',
+                        'name: "other"\n'
+                        'metric: "n"\n'
+                        'threshold:\n'
+                        '  unit: "s"\n'
+                        '  operator: "<"\n'
+                        '  value: 1.0\n')
+        self.spec_set = SpecificationSet.load_single_package(self.package_dir)
+
+    def test_no_changes(self):
+        self.assertEqual(self.spec_set.refresh(), [])
+        self.assertEqual(len(self.spec_set), 3)
+
+    def test_modified_base(self):
+        """Specifications inheriting from a modified file are resolved
+        again, and others are untouched.
+        """
+        other = self.spec_set['pkg.n.other']
+        self.write_yaml('base.yaml',
+                        'id: "base"\n'
+                        'metric: "m"\n'
+                        'threshold:\n'
+                        '  unit: "mag"\n'
+                        '  operator: "<="\n')
+
+        changed = self.spec_set.refresh()
+        self.assertEqual(changed, [self.package_path('base.yaml')])
+        self.assertEqual(len(self.spec_set), 3)
+        self.assertEqual(self.spec_set['pkg.m.design'].threshold, 5. * u.mag)
+        self.assertEqual(self.spec_set['pkg.m.stretch'].operator_str, '<=')
+        self.assertIs(self.spec_set['pkg.n.other'], other)
+
+    def test_added_and_removed_files(self):
+        os.remove(self.package_path('other.yaml'))
+        self.write_yaml('new.yaml',
+                        'name: "minimum"\n'
+                        'base: "base#base"\n'
+                        'threshold:\n'
+                        '  value: 8.0\n')
+
+        changed = self.spec_set.refresh()
+        self.assertEqual(len(changed), 2)
+        self.assertNotIn('pkg.n.other', self.spec_set)
+        self.assertEqual(self.spec_set['pkg.m.minimum'].threshold,
+                         8. * u.mmag)
+        self.assertEqual(len(self.spec_set), 3)
+
+    def test_removed_base(self):
+        """Removing a base that is still used is an error."""
+        os.remove(self.package_path('base.yaml'))
+        with self.assertRaises(SpecificationResolutionError):
+            self.spec_set.refresh()
+
+
 class TestSpecificationSetLoadMetricsPackage(unittest.TestCase):
     """Test SpecificationSet.load_metrics_package()."""
 
@@ -379,7 +680,7 @@ class TestSpecificationSetNameSubset(unittest.TestCase):
         self.assertTrue(isinstance(subset, type(self.spec_set)))
         self.assertTrue(len(subset) > 0)
 
-        for spec_name, spec in subset._specs.items():
+        for spec_name, spec in subset.items():
             self.assertTrue(spec_name in package)
 
     def test_PA1_subset(self):
@@ -389,7 +690,7 @@ class TestSpecificationSetNameSubset(unittest.TestCase):
         self.assertTrue(isinstance(subset, type(self.spec_set)))
         self.assertTrue(len(subset) > 0)
 
-        for spec_name, spec in subset._specs.items():
+        for spec_name, spec in subset.items():
             self.assertTrue(spec_name in metric)
 
 
@@ -445,6 +746,252 @@ class TestSpecificationSetMetadataSubset(unittest.TestCase):
         self.assertIn('validate_drp.AM1.design_HSC_r', subset)
         self.assertNotIn('validate_drp.PA1.design_HSC_r', subset)
 
+    def test_multiple_term_subset(self):
+        """Subset with metadata that satisfies multi-term queries."""
+        subset = self.spec_set.subset(meta={'filter_name': 'r',
+                                            'camera': 'HSC',
+                                            'other': [1, 2]})
+
+        self.assertIn('validate_drp.AM1.design_r', subset)
+        self.assertIn('validate_drp.AM1.design_HSC_r', subset)
+        self.assertIn('validate_drp.PA1.design_r', subset)
+        self.assertNotIn('validate_drp.AM1.design_i', subset)
+
+    def test_unconstrained_and_unhashable_queries(self):
+        """Specifications without queries always apply; queries with
+        unhashable terms are still evaluated correctly.
+        """
+        self.spec_set.insert(ThresholdSpecification(
+            Name('validate_drp.AM1.design'), 5. * u.marcsec, '<'))
+        self.spec_set.insert(ThresholdSpecification(
+            Name('validate_drp.AM1.design_visits'), 5. * u.marcsec, '<',
+            metadata_query={'visits': [1, 2]}))
+
+        subset = self.spec_set.subset(meta={'filter_name': 'i',
+                                            'visits': [1, 2]})
+        self.assertIn('validate_drp.AM1.design', subset)
+        self.assertIn('validate_drp.AM1.design_visits', subset)
+        self.assertIn('validate_drp.AM1.design_i', subset)
+        self.assertEqual(len(subset), 3)
+
+        subset = self.spec_set.subset(meta={'visits': [3]})
+        self.assertEqual(len(subset), 1)
+        self.assertIn('validate_drp.AM1.design', subset)
+
+    def test_index_after_deletion(self):
+        """The metadata index follows deletions and replacements."""
+        del self.spec_set['validate_drp.AM1.design_r']
+        self.spec_set.insert(ThresholdSpecification(
+            Name('validate_drp.PA1.design_r'), 10 * u.mmag, '<',
+            metadata_query={'filter_name': 'z'}))
+
+        subset = self.spec_set.subset(meta={'filter_name': 'r'})
+        self.assertEqual(len(subset), 0)
+
+        subset = self.spec_set.subset(meta={'filter_name': 'z'})
+        self.assertIn('validate_drp.PA1.design_r', subset)
+
+    def test_subset_view(self):
+        """Subsets share the set's containers until they are modified."""
+        subset = self.spec_set.subset(name='validate_drp.AM1')
+        self.assertIs(subset._specs, self.spec_set._specs)
+        self.assertEqual(len(subset), 3)
+        self.assertNotIn('validate_drp.PA1.design_r', subset)
+        with self.assertRaises(KeyError):
+            subset['validate_drp.PA1.design_r']
+        self.assertEqual(
+            [str(spec.name)
+             for spec in subset.get_metric_specs('validate_drp.PA1')], [])
+
+        # Subsets of subsets compose their filters
+        subsubset = subset.subset(meta={'filter_name': 'r',
+                                        'camera': 'HSC'})
+        self.assertEqual(sorted(str(name) for name in subsubset),
+                         ['validate_drp.AM1.design_HSC_r',
+                          'validate_drp.AM1.design_r'])
+        subsubset = subsubset.subset(meta={'filter_name': 'r'})
+        self.assertEqual(list(subsubset.keys()),
+                         [Name('validate_drp.AM1.design_r')])
+
+        # Modifying the parent doesn't affect the subset
+        del self.spec_set['validate_drp.AM1.design_i']
+        self.assertIn('validate_drp.AM1.design_i', subset)
+        self.assertEqual(len(subset), 3)
+
+        # Modifying the subset materializes it, without affecting the parent
+        subset.insert(ThresholdSpecification(
+            Name('validate_drp.AM1.stretch'), 3. * u.marcsec, '<'))
+        self.assertIsNot(subset._specs, self.spec_set._specs)
+        self.assertEqual(len(subset), 4)
+        self.assertNotIn('validate_drp.PA1.design_r', subset._specs)
+        self.assertEqual(len(subset.get_metric_specs('validate_drp.AM1')), 4)
+        self.assertNotIn('validate_drp.AM1.stretch', self.spec_set)
+
+    def test_tags_subset(self):
+        """Subset by specification and metric tags."""
+        self.spec_set['validate_drp.AM1.design_r'].tags = ['srd']
+        self.spec_set['validate_drp.PA1.design_r'].tags = ['srd']
+        metrics = MetricSet([
+            Metric('validate_drp.AM1', 'Astrometry', 'marcsec',
+                   tags=['astrometry']),
+            Metric('validate_drp.PA1', 'Photometry', 'mmag',
+                   tags=['photometry'])])
+
+        subset = self.spec_set.subset(spec_tags=['srd'])
+        self.assertEqual(sorted(str(name) for name in subset),
+                         ['validate_drp.AM1.design_r',
+                          'validate_drp.PA1.design_r'])
+
+        subset = self.spec_set.subset(spec_tags=['srd'],
+                                      metric_tags=['photometry'],
+                                      metrics=metrics)
+        self.assertEqual(list(subset.keys()),
+                         [Name('validate_drp.PA1.design_r')])
+
+        subset = self.spec_set.subset(metric_tags=['astrometry'],
+                                      metrics=metrics.subset(tags=[]))
+        self.assertEqual(len(subset), 3)
+        self.assertEqual(len(self.spec_set.subset(spec_tags=['other'])), 0)
+
+        # The index follows tag changes and deletions
+        self.spec_set['validate_drp.AM1.design_r'].tags = ['other']
+        del self.spec_set['validate_drp.PA1.design_r']
+        self.assertEqual(len(self.spec_set.subset(spec_tags=['srd'])), 0)
+        self.assertEqual(list(self.spec_set.subset(spec_tags=['other'])),
+                         [Name('validate_drp.AM1.design_r')])
+        self.assertEqual(self.spec_set._tag_index,
+                         {'other': set([Name('validate_drp.AM1.design_r')])})
+
+        # Views see tags assigned after they were made, and keep their
+        # selection
+        view = self.spec_set.subset('validate_drp.AM1',
+                                    meta={'filter_name': 'r'})
+        self.spec_set['validate_drp.AM1.design_i'].tags = ['other']
+        self.assertEqual(list(view.subset(spec_tags=['other'])),
+                         [Name('validate_drp.AM1.design_r')])
+        self.assertEqual(len(view), 1)
+        self.assertEqual(len(self.spec_set.subset(spec_tags=['other'])), 2)
+
+
+class TestSpecificationSetEvaluate(unittest.TestCase):
+    """Test SpecificationSet.evaluate and its use in reports."""
+
+    def setUp(self):
+        self.spec_set = SpecificationSet([
+            ThresholdSpecification('validate_drp.PA1.design',
+                                   5. * u.mmag, '<'),
+            ThresholdSpecification('validate_drp.PA1.stretch',
+                                   3. * u.mmag, '<'),
+            ThresholdSpecification('validate_drp.PA1.minimum',
+                                   0.008 * u.mag, '<='),
+            ThresholdSpecification('validate_drp.AM1.design',
+                                   10. * u.marcsec, '<'),
+            ThresholdSpecification('validate_drp.PF1.design',
+                                   10. * u.percent, '>='),
+        ])
+        self.measurements = MeasurementSet([
+            Measurement('validate_drp.PA1', 0.004 * u.mag),
+            Measurement('validate_drp.AM1', 20. * u.marcsec),
+        ])
+
+    def test_evaluate(self):
+        results = self.spec_set.evaluate(self.measurements)
+
+        # Specs without measurements (PF1) are skipped; sorted by name
+        self.assertEqual(
+            [str(name) for name in results['spec']],
+            ['validate_drp.AM1.design',
+             'validate_drp.PA1.design',
+             'validate_drp.PA1.minimum',
+             'validate_drp.PA1.stretch'])
+        self.assertEqual(results['passed'].tolist(),
+                         [False, True, True, False])
+        self.assertEqual(results['metric'][1], Name('validate_drp.PA1'))
+
+        # Results agree with Specification.check
+        for spec_name, metric_name, passed in results:
+            spec = self.spec_set[spec_name]
+            quantity = self.measurements[metric_name].quantity
+            self.assertEqual(bool(spec.check(quantity)), passed)
+
+    def test_evaluate_subset(self):
+        subset = self.spec_set.subset(name='validate_drp.PA1')
+        results = subset.evaluate(self.measurements)
+        self.assertEqual(
+            [str(name) for name in results['spec']],
+            ['validate_drp.PA1.design',
+             'validate_drp.PA1.minimum',
+             'validate_drp.PA1.stretch'])
+        self.assertEqual(results['passed'].tolist(), [True, True, False])
+
+    def test_evaluate_view_selection(self):
+        """Views only test their selected specifications."""
+        self.spec_set.insert(ThresholdSpecification(
+            'validate_drp.PA1.srd', 6. * u.mmag, '<', tags=['srd']))
+        view = self.spec_set.subset(spec_tags=['srd'])
+
+        results = view.evaluate(self.measurements)
+        self.assertEqual([str(name) for name in results['spec']],
+                         ['validate_drp.PA1.srd'])
+        self.assertEqual(results['passed'].tolist(), [True])
+
+        tested = [name
+                  for _, (groups, _) in view._view_thresholds.values()
+                  for _, spec_names, _ in groups
+                  for name in spec_names]
+        self.assertEqual(tested, [Name('validate_drp.PA1.srd')])
+
+    def test_evaluate_after_mutation(self):
+        self.spec_set.evaluate(self.measurements)
+        self.spec_set.insert(ThresholdSpecification(
+            'validate_drp.AM1.relaxed', 30. * u.marcsec, '<'))
+        del self.spec_set['validate_drp.PA1.stretch']
+
+        results = self.spec_set.evaluate(self.measurements)
+        self.assertEqual(
+            [str(name) for name in results['spec']],
+            ['validate_drp.AM1.design',
+             'validate_drp.AM1.relaxed',
+             'validate_drp.PA1.design',
+             'validate_drp.PA1.minimum'])
+        self.assertEqual(results['passed'].tolist(),
+                         [False, True, True, True])
+
+    def test_evaluate_after_spec_change(self):
+        """Thresholds and operators assigned after an evaluation are used,
+        by the set and its views.
+        """
+        view = self.spec_set.subset(name='validate_drp.PA1')
+        self.spec_set.evaluate(self.measurements)
+        view.evaluate(self.measurements)
+
+        spec = self.spec_set['validate_drp.PA1.design']
+        spec.threshold = 3. * u.mmag
+        self.spec_set['validate_drp.AM1.design'].operator_str = '>'
+
+        for spec_set in (self.spec_set, view):
+            results = spec_set.evaluate(self.measurements)
+            for spec_name, metric_name, passed in results:
+                quantity = self.measurements[metric_name].quantity
+                self.assertEqual(
+                    bool(spec_set[spec_name].check(quantity)), passed)
+        self.assertFalse(spec.check(
+            self.measurements['validate_drp.PA1'].quantity))
+        self.assertEqual(self.spec_set.evaluate(self.measurements)['passed']
+                         .tolist(), [True, False, True, False])
+
+    def test_evaluate_incompatible_units(self):
+        measurements = MeasurementSet([
+            Measurement('validate_drp.PA1', 4. * u.arcsec)])
+        with self.assertRaises(u.UnitsError):
+            self.spec_set.evaluate(measurements)
+
+    def test_report_table(self):
+        table = self.spec_set.report(self.measurements).make_table()
+        self.assertEqual(len(table), 4)
+        self.assertEqual(table['Specification'][0],
+                         'validate_drp.AM1.design')
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,239 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test the upload spool against a local stand-in SQUASH server."""
+
+from __future__ import print_function, division
+
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import astropy.units as u
+
+from lsst.verify import Job, Measurement, squash
+from lsst.verify.spool import drain, enqueue, get_spool_dir, list_spooled
+
+from squash_server import SquashServer
+
+
+class SpoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        squash.reset_endpoint_cache()
+        squash.configure_endpoint_cache(persistent=False)
+        squash.configure_session(backoff_factor=0.001)
+        self.spool_dir = tempfile.mkdtemp()
+        self.docs = [{'measurements': [], 'blobs': [], 'meta': {'index': i}}
+                     for i in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(self.spool_dir)
+        squash.reset_endpoint_cache()
+        squash.configure_endpoint_cache(
+            **squash._DEFAULT_ENDPOINT_CACHE_CONFIG)
+        squash.configure_session(**squash._DEFAULT_SESSION_CONFIG)
+
+    def _pending_path(self, content_hash):
+        return os.path.join(self.spool_dir, 'pending',
+                            content_hash + '.json.gz')
+
+    def test_get_spool_dir(self):
+        environ = dict(os.environ)
+        try:
+            os.environ.pop('LSST_VERIFY_SPOOL_DIR', None)
+            os.environ['XDG_DATA_HOME'] = '/data'
+            self.assertEqual(get_spool_dir(), '/data/lsst_verify/spool')
+            os.environ['LSST_VERIFY_SPOOL_DIR'] = '/spool'
+            self.assertEqual(get_spool_dir(), '/spool')
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
+    def test_enqueue(self):
+        content_hash = enqueue(self.docs[0], spool_dir=self.spool_dir)
+        with gzip.open(self._pending_path(content_hash)) as f:
+            data = f.read()
+        self.assertEqual(len(content_hash), 64)
+        self.assertEqual(json.loads(data.decode('utf-8')), self.docs[0])
+
+        # Identical documents are spooled once
+        self.assertEqual(enqueue(dict(self.docs[0]),
+                                 spool_dir=self.spool_dir),
+                         content_hash)
+        self.assertEqual(list_spooled(self.spool_dir), [content_hash])
+        self.assertEqual(os.listdir(os.path.join(self.spool_dir, 'pending')),
+                         [content_hash + '.json.gz'])
+
+    def test_enqueue_same_job(self):
+        """The same Job is spooled once, although its measurements and blobs
+        get new identifiers whenever it is deserialized.
+        """
+        job = Job(measurements=[Measurement('validate_drp.PA1',
+                                            5. * u.mmag,
+                                            notes={'filter_name': 'r'})],
+                  meta={'camera': 'HSC'})
+        json_doc = job._get_dispatch_json()
+        copy_doc = Job.deserialize(**job.json)._get_dispatch_json()
+        self.assertNotEqual(copy_doc, json_doc)
+
+        content_hash = enqueue(json_doc, spool_dir=self.spool_dir)
+        self.assertEqual(enqueue(copy_doc, spool_dir=self.spool_dir),
+                         content_hash)
+        self.assertEqual(list_spooled(self.spool_dir), [content_hash])
+
+        # Different content is spooled again
+        job.meta['camera'] = 'DECam'
+        self.assertNotEqual(enqueue(job._get_dispatch_json(),
+                                    spool_dir=self.spool_dir),
+                            content_hash)
+        self.assertEqual(len(list_spooled(self.spool_dir)), 2)
+
+    def test_drain(self):
+        content_hashes = [enqueue(doc, spool_dir=self.spool_dir)
+                          for doc in self.docs]
+        with SquashServer() as server:
+            result = drain(server.api_url, api_user='user',
+                           api_password='password',
+                           spool_dir=self.spool_dir, max_concurrency=2)
+            posts = [r for r in server.requests if r.method == 'POST']
+            self.assertEqual(
+                sorted(job['meta']['index'] for job in server.jobs),
+                [0, 1, 2])
+
+        self.assertEqual(sorted(result.uploaded), sorted(content_hashes))
+        self.assertEqual(result.duplicates, [])
+        self.assertEqual(result.failed, [])
+        # Not compressed unless the server supports it
+        self.assertNotIn('Content-Encoding', posts[0].headers)
+        self.assertEqual(list_spooled(self.spool_dir), [])
+        self.assertEqual(
+            sorted(os.listdir(os.path.join(self.spool_dir, 'done'))),
+            sorted(content_hashes))
+
+        # Uploaded documents aren't spooled again
+        enqueue(self.docs[0], spool_dir=self.spool_dir)
+        self.assertEqual(list_spooled(self.spool_dir), [])
+
+    def test_drain_gzip(self):
+        enqueue(self.docs[0], spool_dir=self.spool_dir)
+        with SquashServer(accept_encoding='gzip') as server:
+            result = drain(server.api_url, spool_dir=self.spool_dir)
+            post, = [r for r in server.requests if r.method == 'POST']
+            self.assertEqual(server.jobs, [self.docs[0]])
+        self.assertEqual(len(result.uploaded), 1)
+        self.assertEqual(post.headers['Content-Encoding'], 'gzip')
+
+    def test_drain_failure(self):
+        content_hash = enqueue(self.docs[0], spool_dir=self.spool_dir)
+        with SquashServer() as server:
+            server.add_response('POST', '/api/jobs/', status=503)
+            result = drain(server.api_url, spool_dir=self.spool_dir,
+                           max_attempts=3)
+            posts = [r for r in server.requests if r.method == 'POST']
+        self.assertEqual(result.failed, [content_hash])
+        self.assertEqual(len(posts), 3)
+        # Kept for the next drain
+        self.assertEqual(list_spooled(self.spool_dir), [content_hash])
+
+    def test_drain_unreachable(self):
+        """Documents stay spooled if SQUASH can't be reached, even to
+        discover its endpoints.
+        """
+        content_hashes = [enqueue(doc, spool_dir=self.spool_dir)
+                          for doc in self.docs]
+        with SquashServer() as server:
+            api_url = server.api_url
+        result = drain(api_url, spool_dir=self.spool_dir, max_attempts=2)
+        self.assertEqual(result.uploaded, [])
+        self.assertEqual(sorted(result.failed), sorted(content_hashes))
+        self.assertEqual(sorted(list_spooled(self.spool_dir)),
+                         sorted(content_hashes))
+
+    def test_prune_done(self):
+        content_hashes = [enqueue(doc, spool_dir=self.spool_dir)
+                          for doc in self.docs[:2]]
+        with SquashServer() as server:
+            drain(server.api_url, spool_dir=self.spool_dir)
+        done_dir = os.path.join(self.spool_dir, 'done')
+        old = time.time() - 2 * 24 * 3600
+        os.utime(os.path.join(done_dir, content_hashes[0]), (old, old))
+
+        drain('http://localhost:1/', spool_dir=self.spool_dir,
+              max_done_age=None)
+        self.assertEqual(sorted(os.listdir(done_dir)), sorted(content_hashes))
+        drain('http://localhost:1/', spool_dir=self.spool_dir,
+              max_done_age=24 * 3600)
+        self.assertEqual(os.listdir(done_dir), [content_hashes[1]])
+
+        # Pruned documents may be spooled again
+        self.assertEqual(enqueue(self.docs[0], spool_dir=self.spool_dir),
+                         content_hashes[0])
+        self.assertEqual(list_spooled(self.spool_dir), [content_hashes[0]])
+
+    def test_drain_rejected(self):
+        content_hash = enqueue(self.docs[0], spool_dir=self.spool_dir)
+        with SquashServer() as server:
+            server.add_response('POST', '/api/jobs/', status=400,
+                                json={'detail': 'Invalid job.'})
+            result = drain(server.api_url, spool_dir=self.spool_dir)
+            posts = [r for r in server.requests if r.method == 'POST']
+        self.assertEqual(result.failed, [content_hash])
+        self.assertEqual(len(posts), 1)
+        self.assertEqual(list_spooled(self.spool_dir), [])
+        self.assertEqual(os.listdir(os.path.join(self.spool_dir, 'rejected')),
+                         [content_hash + '.json.gz'])
+
+    def test_drain_unauthorized(self):
+        """Authentication errors leave documents in the spool, without
+        retrying them during the drain.
+        """
+        content_hash = enqueue(self.docs[0], spool_dir=self.spool_dir)
+        with SquashServer() as server:
+            server.add_response('POST', '/api/jobs/', status=401,
+                                json={'detail': 'Invalid token.'})
+            result = drain(server.api_url, spool_dir=self.spool_dir)
+            posts = [r for r in server.requests if r.method == 'POST']
+        self.assertEqual(result.failed, [content_hash])
+        self.assertEqual(len(posts), 1)
+        self.assertEqual(list_spooled(self.spool_dir), [content_hash])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.spool_dir, 'rejected')))
+
+    def test_job_dispatch(self):
+        job = Job(measurements=[Measurement('validate_drp.PA1',
+                                            5. * u.mmag)],
+                  meta={'camera': 'HSC'})
+        content_hash = job.dispatch(spool=True, spool_dir=self.spool_dir)
+        self.assertEqual(list_spooled(self.spool_dir), [content_hash])
+
+        with SquashServer() as server:
+            drain(server.api_url, spool_dir=self.spool_dir)
+            self.assertEqual(server.jobs, [job._get_dispatch_json()])
+
+
+if __name__ == "__main__":
+    unittest.main()
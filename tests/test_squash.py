@@ -23,6 +23,9 @@
 from __future__ import print_function
 
 import json
+import os
+import threading
+import time
 import unittest
 
 import requests
@@ -35,6 +38,18 @@ except ImportError:
 
 from lsst.verify import squash
 
+from squash_server import SquashServer
+from temp_package import TempPackageTestCase
+
+
+def setUpModule():
+    # Don't share endpoints with other processes through the user cache
+    squash.configure_endpoint_cache(persistent=False)
+
+
+def tearDownModule():
+    squash.configure_endpoint_cache(**squash._DEFAULT_ENDPOINT_CACHE_CONFIG)
+
 
 class GetDefaultTimeoutTestCase(unittest.TestCase):
 
@@ -104,10 +119,11 @@ class GetTestCase(unittest.TestCase):
 
     def setUp(self):
         self.api_url = 'https://example.com/api/'
-        # pre-set the _ENDPOINT_URLS to use the cache, not http get
-        squash._ENDPOINT_URLS = {
+        # pre-set the endpoint cache to use the cache, not http get
+        self.endpoints = {
             'jobs': self.api_url + 'jobs'
         }
+        squash._ENDPOINT_CACHE.set(self.api_url, self.endpoints)
 
     def tearDown(self):
         squash.reset_endpoint_cache()
@@ -117,7 +133,7 @@ class GetTestCase(unittest.TestCase):
     def test_get(self):
         with responses.RequestsMock() as reqmock:
             reqmock.add(responses.GET,
-                        squash._ENDPOINT_URLS['jobs'],
+                        self.endpoints['jobs'],
                         json={},
                         status=200,
                         content_type='application/json')
@@ -128,7 +144,7 @@ class GetTestCase(unittest.TestCase):
             self.assertEqual(len(reqmock.calls), 1)
             self.assertEqual(
                 reqmock.calls[0].request.url,
-                squash._ENDPOINT_URLS['jobs'],
+                self.endpoints['jobs'],
             )
             self.assertEqual(
                 reqmock.calls[0].request.headers['Accept'],
@@ -140,7 +156,7 @@ class GetTestCase(unittest.TestCase):
     def test_versioned_get(self):
         with responses.RequestsMock() as reqmock:
             reqmock.add(responses.GET,
-                        squash._ENDPOINT_URLS['jobs'],
+                        self.endpoints['jobs'],
                         json={},
                         status=200,
                         content_type='application/json')
@@ -157,7 +173,7 @@ class GetTestCase(unittest.TestCase):
     def test_raises(self):
         with responses.RequestsMock() as reqmock:
             reqmock.add(responses.GET,
-                        squash._ENDPOINT_URLS['jobs'],
+                        self.endpoints['jobs'],
                         json={},
                         status=404,
                         content_type='application/json')
@@ -170,10 +186,11 @@ class PostTestCase(unittest.TestCase):
 
     def setUp(self):
         self.api_url = 'https://example.com/api/'
-        # pre-set the _ENDPOINT_URLS to use the cache, not http get
-        squash._ENDPOINT_URLS = {
+        # pre-set the endpoint cache to use the cache, not http get
+        self.endpoints = {
             'jobs': self.api_url + 'jobs'
         }
+        squash._ENDPOINT_CACHE.set(self.api_url, self.endpoints)
 
     def tearDown(self):
         squash.reset_endpoint_cache()
@@ -183,7 +200,7 @@ class PostTestCase(unittest.TestCase):
     def test_json_post(self):
         with responses.RequestsMock() as reqmock:
             reqmock.add(responses.POST,
-                        squash._ENDPOINT_URLS['jobs'],
+                        self.endpoints['jobs'],
                         json={},
                         status=201,
                         content_type='application/json')
@@ -196,7 +213,7 @@ class PostTestCase(unittest.TestCase):
             self.assertEqual(len(reqmock.calls), 1)
             self.assertEqual(
                 reqmock.calls[0].request.url,
-                squash._ENDPOINT_URLS['jobs'],
+                self.endpoints['jobs'],
             )
             self.assertEqual(
                 reqmock.calls[0].request.headers['Accept'],
@@ -212,7 +229,7 @@ class PostTestCase(unittest.TestCase):
     def test_raises(self):
         with responses.RequestsMock() as reqmock:
             reqmock.add(responses.POST,
-                        squash._ENDPOINT_URLS['jobs'],
+                        self.endpoints['jobs'],
                         json={},
                         status=503,
                         content_type='application/json')
@@ -223,5 +240,391 @@ class PostTestCase(unittest.TestCase):
                             api_user='foo', api_password='bar')
 
 
+class SessionTestCase(unittest.TestCase):
+    """Test the pooled, retrying session against a local stand-in server."""
+
+    def setUp(self):
+        squash.configure_session(backoff_factor=0.001, max_retries=3)
+        squash.reset_session_stats()
+        squash.reset_endpoint_cache()
+        self.server = SquashServer()
+        self.server.start()
+        self.api_url = self.server.api_url
+        self.jobs_url = self.server.endpoints['jobs']
+
+    def tearDown(self):
+        self.server.stop()
+        squash.reset_endpoint_cache()
+        squash.configure_session(**squash._DEFAULT_SESSION_CONFIG)
+        squash.reset_session_stats()
+
+    def test_keep_alive(self):
+        for _ in range(5):
+            squash.get(self.api_url)
+        stats = squash.get_session_stats()
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(len(stats['pools']), 1)
+        self.assertEqual(stats['pools'][0]['num_connections'], 1)
+        self.assertEqual(stats['pools'][0]['num_requests'], 5)
+        addresses = set(r.client_address for r in self.server.requests)
+        self.assertEqual(len(addresses), 1)
+
+    def test_no_keep_alive(self):
+        squash.configure_session(keep_alive=False)
+        for _ in range(3):
+            squash.get(self.api_url)
+        addresses = set(r.client_address for r in self.server.requests)
+        self.assertEqual(len(addresses), 3)
+
+    def test_configure_unknown_option(self):
+        with self.assertRaises(TypeError):
+            squash.configure_session(pool_size=4)
+
+    def test_retry_get(self):
+        self.server.add_response('GET', '/api/jobs/', status=503)
+        self.server.add_response('GET', '/api/jobs/', status=503)
+        self.server.add_response('GET', '/api/jobs/', json={'count': 0})
+        r = squash.get(self.api_url, api_endpoint='jobs')
+        self.assertEqual(r.json(), {'count': 0})
+        stats = squash.get_session_stats()
+        # One request for endpoint discovery
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(stats['retries'], 2)
+
+    def test_retry_dropped_connection(self):
+        self.server.add_response('GET', '/api/jobs/', drop=True)
+        self.server.add_response('GET', '/api/jobs/', json={'count': 0})
+        r = squash.get(self.api_url, api_endpoint='jobs')
+        self.assertEqual(r.status_code, 200)
+        stats = squash.get_session_stats()
+        self.assertEqual(stats['connection_errors'], 1)
+        self.assertEqual(stats['retries'], 1)
+
+    def test_retries_exhausted(self):
+        self.server.add_response('GET', '/api/jobs/', status=503)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            squash.get(self.api_url, api_endpoint='jobs')
+        self.assertEqual(squash.get_session_stats()['retries'], 3)
+
+    def test_retry_after(self):
+        self.server.add_response('GET', '/api/jobs/', status=429,
+                                 headers={'Retry-After': '0.2'})
+        self.server.add_response('GET', '/api/jobs/', json={})
+        squash.get_endpoint_url(self.api_url, 'jobs')
+        start = time.time()
+        r = squash.get(self.api_url, api_endpoint='jobs')
+        self.assertGreaterEqual(time.time() - start, 0.2)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(squash.get_session_stats()['retry_after_waits'], 1)
+
+    def test_retry_after_too_long(self):
+        """Responses asking for a delay beyond backoff_max aren't retried.
+        """
+        self.server.add_response('GET', '/api/jobs/', status=503,
+                                 headers={'Retry-After': '3600'})
+        with self.assertRaises(requests.exceptions.HTTPError):
+            squash.get(self.api_url, api_endpoint='jobs')
+        self.assertEqual(squash.get_session_stats()['retries'], 0)
+
+    def test_post_not_retried(self):
+        self.server.add_response('POST', '/api/jobs/', status=503)
+        with self.assertRaises(requests.exceptions.RequestException):
+            squash.post(self.api_url, 'jobs', json_doc={},
+                        api_user='foo', api_password='bar')
+        posts = [r for r in self.server.requests if r.method == 'POST']
+        self.assertEqual(len(posts), 1)
+        self.assertEqual(squash.get_session_stats()['retries'], 0)
+
+    def test_post(self):
+        self.server.add_response('POST', '/api/jobs/', status=201,
+                                 json={'id': 1})
+        r = squash.post(self.api_url, 'jobs', json_doc={'key': 'value'},
+                        api_user='foo', api_password='bar')
+        self.assertEqual(r.json(), {'id': 1})
+        request = self.server.requests[-1]
+        self.assertEqual(json.loads(request.body.decode('utf-8')),
+                         {'key': 'value'})
+
+
+class EndpointCacheTestCase(TempPackageTestCase):
+    """Test the endpoint URL cache against local stand-in servers."""
+
+    def setUp(self):
+        TempPackageTestCase.setUp(self)
+        squash.reset_endpoint_cache()
+        self.cache_path = os.path.join(self.temp_dir, 'endpoints.pickle')
+        self.servers = [SquashServer(endpoints=['jobs']),
+                        SquashServer(endpoints=['jobs', 'metrics'])]
+        for server in self.servers:
+            server.start()
+
+    def tearDown(self):
+        for server in self.servers:
+            server.stop()
+        squash.configure_endpoint_cache(ttl=3600., persistent=False,
+                                        path=None)
+        squash.reset_endpoint_cache()
+
+    def count_discoveries(self, server):
+        return len([r for r in server.requests if r.path == '/api/'])
+
+    def test_per_api_root(self):
+        for server in self.servers + self.servers:
+            self.assertEqual(
+                squash.get_endpoint_url(server.api_url, 'jobs'),
+                server.endpoints['jobs'])
+        with self.assertRaises(KeyError):
+            squash.get_endpoint_url(self.servers[0].api_url, 'metrics')
+        for server in self.servers:
+            self.assertEqual(self.count_discoveries(server), 1)
+
+        # Resetting one root keeps the others
+        squash.reset_endpoint_cache(self.servers[0].api_url)
+        for server in self.servers:
+            squash.get_endpoint_url(server.api_url, 'jobs')
+        self.assertEqual(self.count_discoveries(self.servers[0]), 2)
+        self.assertEqual(self.count_discoveries(self.servers[1]), 1)
+
+    def test_ttl(self):
+        squash.configure_endpoint_cache(ttl=0.05)
+        server = self.servers[0]
+        squash.get_endpoint_url(server.api_url, 'jobs')
+        squash.get_endpoint_url(server.api_url, 'jobs')
+        self.assertEqual(self.count_discoveries(server), 1)
+        time.sleep(0.1)
+        squash.get_endpoint_url(server.api_url, 'jobs')
+        self.assertEqual(self.count_discoveries(server), 2)
+
+    def test_persistent(self):
+        squash.configure_endpoint_cache(persistent=True, path=self.cache_path)
+        for server in self.servers:
+            squash.get_endpoint_url(server.api_url, 'jobs')
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        # A new cache, as in another process, reads the persisted endpoints
+        cache = squash._EndpointCache()
+        for server in self.servers:
+            self.assertEqual(cache.get(server.api_url), server.endpoints)
+            self.assertEqual(self.count_discoveries(server), 1)
+
+        squash.reset_endpoint_cache(self.servers[0].api_url)
+        cache = squash._EndpointCache()
+        cache.get(self.servers[0].api_url)
+        cache.get(self.servers[1].api_url)
+        self.assertEqual(self.count_discoveries(self.servers[0]), 2)
+        self.assertEqual(self.count_discoveries(self.servers[1]), 1)
+
+        squash.reset_endpoint_cache()
+        self.assertFalse(os.path.exists(self.cache_path))
+
+    def test_persistent_opt_in(self):
+        """By default, endpoints are only persisted if
+        LSST_VERIFY_PERSISTENT_CACHE is set.
+        """
+        squash.configure_endpoint_cache(persistent=None, path=None)
+        self.patch_environ({'LSST_VERIFY_PERSISTENT_CACHE': None,
+                            'LSST_VERIFY_NO_CACHE': None})
+        server = self.servers[0]
+        squash.get_endpoint_url(server.api_url, 'jobs')
+        self.assertFalse(os.path.exists(self.cache_dir))
+
+        self.patch_environ({'LSST_VERIFY_PERSISTENT_CACHE': '1'})
+        squash.reset_endpoint_cache()
+        squash.get_endpoint_url(server.api_url, 'jobs')
+        self.assertEqual(os.listdir(self.cache_dir),
+                         ['squash_endpoints.pickle'])
+
+    def test_single_discovery(self):
+        """Concurrent lookups make a single discovery request."""
+        server = self.servers[0]
+        server.add_response('GET', '/api/', json=server.endpoints,
+                            delay=0.1)
+        results = []
+
+        def lookup():
+            results.append(squash.get_endpoint_url(server.api_url, 'jobs'))
+
+        threads = [threading.Thread(target=lookup) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [server.endpoints['jobs']] * 8)
+        self.assertEqual(self.count_discoveries(server), 1)
+
+
+class PostBodyTestCase(unittest.TestCase):
+    """Test compressed and streamed POST bodies against a local stand-in
+    server.
+    """
+
+    def setUp(self):
+        squash.reset_endpoint_cache()
+        self.json_doc = {'measurements': [{'metric': 'validate_drp.PA1',
+                                           'value': float(i)}
+                                          for i in range(1000)],
+                         'meta': {'filter_name': u'r\u00e9'}}
+
+    def tearDown(self):
+        squash.reset_endpoint_cache()
+
+    def post(self, server, **kwargs):
+        server.add_response('POST', '/api/jobs/', status=201, json={})
+        squash.post(server.api_url, 'jobs', json_doc=self.json_doc,
+                    api_user='foo', api_password='bar', **kwargs)
+        request = server.requests[-1]
+        self.assertEqual(request.json(), self.json_doc)
+        return request
+
+    def test_iter_json(self):
+        chunks = list(squash._iter_json(self.json_doc, chunk_size=1024))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(json.loads(b''.join(chunks).decode('utf-8')),
+                         self.json_doc)
+
+    def test_compress_advertised(self):
+        with SquashServer(accept_encoding='gzip, deflate') as server:
+            request = self.post(server)
+            self.assertEqual(request.headers['Content-Encoding'], 'gzip')
+            self.assertLess(len(request.body),
+                            len(json.dumps(self.json_doc)))
+
+            request = self.post(server, compress=False)
+            self.assertNotIn('Content-Encoding', request.headers)
+
+    def test_compress_not_advertised(self):
+        with SquashServer() as server:
+            request = self.post(server)
+            self.assertNotIn('Content-Encoding', request.headers)
+
+            request = self.post(server, compress=True)
+            self.assertEqual(request.headers['Content-Encoding'], 'gzip')
+
+    def test_stream(self):
+        with SquashServer() as server:
+            request = self.post(server, stream=True)
+            self.assertEqual(request.headers['Transfer-Encoding'], 'chunked')
+            self.assertNotIn('Content-Length', request.headers)
+            self.assertNotIn('Content-Encoding', request.headers)
+
+            request = self.post(server, stream=True, compress=True)
+            self.assertEqual(request.headers['Transfer-Encoding'], 'chunked')
+            self.assertEqual(request.headers['Content-Encoding'], 'gzip')
+
+    def test_error_description(self):
+        """Failed POSTs are described by URL, status and the start of the
+        response, not by the posted document.
+        """
+        with SquashServer() as server:
+            server.add_response('POST', '/api/jobs/', status=400,
+                                json={'detail': 'x' * 5000})
+            with self.assertRaises(requests.exceptions.HTTPError) as cm:
+                squash.post(server.api_url, 'jobs', json_doc=self.json_doc)
+            url = server.endpoints['jobs']
+
+        message = squash._describe_post_error(url, cm.exception)
+        self.assertIn(url, message)
+        self.assertIn('status: 400', message)
+        self.assertIn('{"detail": "xxx', message)
+        self.assertNotIn('validate_drp.PA1', message)
+        self.assertLess(len(message), squash._MAX_LOGGED_BODY + 300)
+
+        message = squash._describe_post_error(
+            url, requests.exceptions.ConnectionError('refused'))
+        self.assertEqual(message, 'POST {0} failed: refused'.format(url))
+
+
+class PostChunkedTestCase(unittest.TestCase):
+    """Test chunked uploads against a local stand-in server."""
+
+    def setUp(self):
+        squash.reset_endpoint_cache()
+        squash.configure_session(max_retries=0)
+        self.blobs = [{'identifier': 'blob{0:d}'.format(i),
+                       'data': list(range(i))} for i in range(50)]
+        self.measurements = [{'metric': 'validate_drp.PA1',
+                              'value': float(i)} for i in range(50)]
+        self.meta = {'camera': 'HSC'}
+
+    def tearDown(self):
+        squash.reset_endpoint_cache()
+        squash.configure_session(**squash._DEFAULT_SESSION_CONFIG)
+
+    def post(self, server, **kwargs):
+        chunked_items = [('blobs', iter(self.blobs)),
+                         ('measurements', iter(self.measurements))]
+        return squash.post_chunked(server.api_url, 'jobs',
+                                   json_doc={'meta': self.meta},
+                                   chunked_items=chunked_items,
+                                   api_user='foo', api_password='bar',
+                                   max_chunk_size=500, max_workers=3,
+                                   **kwargs)
+
+    def uploaded_kinds(self, server):
+        return [r.json()['kind'] for r in server.requests
+                if r.method == 'PUT']
+
+    def test_iter_upload_chunks(self):
+        chunks = list(squash._iter_upload_chunks('blobs', self.blobs, 500))
+        self.assertGreater(len(chunks), 1)
+        items = []
+        for chunk_id, body in chunks:
+            chunk = json.loads(body.decode('utf-8'))
+            self.assertEqual(chunk['kind'], 'blobs')
+            if len(chunk['items']) > 1:
+                self.assertLessEqual(len(body), 500 + 50)
+            items.extend(chunk['items'])
+        self.assertEqual(items, self.blobs)
+
+        # Identical content gives identical ids
+        self.assertEqual(
+            chunks,
+            list(squash._iter_upload_chunks('blobs', self.blobs, 500)))
+
+    def test_post_chunked(self):
+        with SquashServer(endpoints=['jobs', 'chunks']) as server:
+            r = self.post(server)
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(server.jobs,
+                         [{'meta': self.meta, 'blobs': self.blobs,
+                           'measurements': self.measurements}])
+
+        # All blobs are uploaded before measurements
+        kinds = self.uploaded_kinds(server)
+        self.assertEqual(len(kinds), len(server.chunks))
+        self.assertEqual(kinds, sorted(kinds))
+
+    def test_resume(self):
+        blob_chunk_ids = [chunk_id for chunk_id, _ in
+                          squash._iter_upload_chunks('blobs', self.blobs,
+                                                     500)]
+        with SquashServer(endpoints=['jobs', 'chunks']) as server:
+            server.add_response(
+                'PUT', '/api/chunks/{0}/'.format(blob_chunk_ids[1]),
+                status=500)
+            with self.assertRaises(requests.exceptions.RequestException):
+                self.post(server)
+            self.assertEqual(server.jobs, [])
+            self.assertEqual(len(server.chunks), len(blob_chunk_ids) - 1)
+            self.assertNotIn('measurements', self.uploaded_kinds(server))
+
+            # Only the missing chunks are uploaded again
+            server.clear_responses()
+            del server.requests[:]
+            self.post(server)
+        kinds = self.uploaded_kinds(server)
+        self.assertEqual(kinds.count('blobs'), 1)
+        self.assertEqual(server.jobs[0]['blobs'], self.blobs)
+
+    def test_compress(self):
+        with SquashServer(endpoints=['jobs', 'chunks'],
+                          accept_encoding='gzip') as server:
+            self.post(server)
+        self.assertEqual(server.jobs[0]['blobs'], self.blobs)
+        for request in server.requests:
+            if request.method in ('PUT', 'POST'):
+                self.assertEqual(request.headers['Content-Encoding'], 'gzip')
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -26,6 +26,7 @@ import unittest
 import operator
 
 import astropy.units as u
+import numpy as np
 
 from lsst.verify import Name, Job
 from lsst.verify.spec import ThresholdSpecification
@@ -181,6 +182,69 @@ class ThresholdSpecificationTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             ThresholdSpecification.convert_operator_str('<<'),
 
+    def test_compile(self):
+        """Test compiled predicates on plain values and quantities."""
+        s = ThresholdSpecification('design', 5. * u.mmag, '<')
+
+        predicate = s.compile()
+        self.assertTrue(predicate(4.))
+        self.assertFalse(predicate(5.))
+        self.assertIs(s.compile(), predicate)
+
+        # Predicate on values in the metric's (different) units
+        predicate = s.compile('mag')
+        self.assertTrue(predicate(0.004))
+        self.assertFalse(predicate(0.006))
+        self.assertTrue(predicate(4. * u.mmag))
+        self.assertEqual(predicate(np.array([0.001, 0.01])).tolist(),
+                         [True, False])
+
+        with self.assertRaises(u.UnitsError):
+            predicate(1. * u.s)
+        with self.assertRaises(u.UnitsError):
+            s.compile(u.s)
+
+        # Changing the threshold or operator resets compiled predicates
+        s.threshold = 10. * u.mmag
+        self.assertTrue(s.compile('mag')(0.006))
+        s.operator_str = '>'
+        self.assertFalse(s.compile('mag')(0.006))
+
+    def test_check(self):
+        """Test check() with compatible and incompatible measurements."""
+        s = ThresholdSpecification('design', 5. * u.mmag, '<')
+        self.assertTrue(s.check(4. * u.mmag))
+        self.assertTrue(s.check(0.004 * u.mag))
+        self.assertFalse(s.check(0.006 * u.mag))
+        with self.assertRaises(u.UnitsError):
+            s.check(4. * u.s)
+        with self.assertRaises(u.UnitsError):
+            s.check(4.)
+
+        # Plain numbers are treated as dimensionless
+        s = ThresholdSpecification('design', 5. * u.percent, '<')
+        self.assertTrue(s.check(0.04))
+        self.assertFalse(s.check(0.06))
+
+    def test_check_boundary(self):
+        """check() agrees with comparing the quantities themselves when the
+        measurement equals the threshold in other units.
+        """
+        pairs = [(0.008 * u.mag, 8. * u.mmag),
+                 (8. * u.mmag, 0.008 * u.mag),
+                 (0.3 * u.mag, 300. * u.mmag),
+                 (0.7 * u.mag, 700. * u.mmag),
+                 (0.1 * u.arcsec, 100. * u.marcsec),
+                 (10. * u.percent, 0.1 * u.dimensionless_unscaled),
+                 (1.1 * u.m, 110. * u.cm)]
+        for threshold, measurement in pairs:
+            for operator_str in ('<', '<=', '>', '>=', '==', '!='):
+                s = ThresholdSpecification('design', threshold, operator_str)
+                self.assertEqual(s.check(measurement),
+                                 bool(s.operator(measurement, threshold)),
+                                 msg='{0} {1} {2}'.format(
+                                     measurement, operator_str, threshold))
+
     def test_query_metadata(self):
         job = Job(meta={'filter_name': 'r',
                         'camera': 'MegaCam'})
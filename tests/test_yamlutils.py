@@ -0,0 +1,164 @@
+#
+# LSST Data Management System
+#
+# This product includes software developed by the
+# LSST Project (http://www.lsst.org/).
+#
+# See COPYRIGHT file at the top of the source tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the LSST License Statement and
+# the GNU General Public License along with this program.  If not,
+# see <https://www.lsstcorp.org/LegalNotices/>.
+#
+"""Test yamlutils loaders."""
+
+from __future__ import print_function, division
+
+from collections import OrderedDict
+import os
+import timeit
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    mock = None
+
+import yaml
+
+import lsst.pex.exceptions
+from lsst.utils import getPackageDir
+from lsst.verify import MetricSet, SpecificationSet
+from lsst.verify.yamlutils import (load_ordered_yaml, load_all_ordered_yaml,
+                                   _build_ordered_loader, _get_default_loader)
+
+
+def get_verify_metrics_dir():
+    """Get the directory of the verify_metrics package, or `None` if it
+    isn't set up.
+    """
+    try:
+        return getPackageDir('verify_metrics')
+    except lsst.pex.exceptions.NotFoundError:
+        return None
+
+
+VERIFY_METRICS_DIR = get_verify_metrics_dir()
+
+
+def list_yaml_files(package_dir):
+    """List the YAML files in a metrics package's metrics/ and specs/
+    directories.
+    """
+    paths = []
+    for dirname in ('metrics', 'specs'):
+        for root, _, filenames in os.walk(os.path.join(package_dir, dirname)):
+            paths.extend(os.path.join(root, filename)
+                         for filename in sorted(filenames)
+                         if filename.endswith('.yaml'))
+    return sorted(paths)
+
+
+def load_yaml_files(paths, Loader=None):
+    docs = []
+    for path in paths:
+        with open(path) as f:
+            docs.append(list(load_all_ordered_yaml(f, Loader=Loader)))
+    return docs
+
+
+class LoaderTestCase(unittest.TestCase):
+    """Test the default ordered YAML loader."""
+
+    def test_default_loader(self):
+        if hasattr(yaml, 'CSafeLoader'):
+            self.assertIs(_get_default_loader(), yaml.CSafeLoader)
+        else:
+            self.assertIs(_get_default_loader(), yaml.SafeLoader)
+
+    @unittest.skipIf(mock is None, 'unittest.mock is required.')
+    def test_fallback(self):
+        """Without libyaml, the pure-Python safe loader is used."""
+        with mock.patch.dict(yaml.__dict__):
+            yaml.__dict__.pop('CSafeLoader', None)
+            self.assertIs(_get_default_loader(), yaml.SafeLoader)
+            OrderedLoader = _build_ordered_loader()
+            self.assertTrue(issubclass(OrderedLoader, yaml.SafeLoader))
+            doc = load_ordered_yaml('b: 1\na: 2\n')
+        self.assertEqual(list(doc.keys()), ['b', 'a'])
+
+    def test_ordered(self):
+        doc = load_ordered_yaml('z: 1\ny:\n  b: 2\n  a: 3\nx: [1, 2]\n')
+        self.assertIsInstance(doc, OrderedDict)
+        self.assertEqual(list(doc.keys()), ['z', 'y', 'x'])
+        self.assertIsInstance(doc['y'], OrderedDict)
+        self.assertEqual(list(doc['y'].keys()), ['b', 'a'])
+
+    def test_safe(self):
+        """The default loader doesn't construct arbitrary Python objects."""
+        with self.assertRaises(yaml.constructor.ConstructorError):
+            load_ordered_yaml('!!python/object/apply:os.getcwd []\n')
+
+    def test_loader_reused(self):
+        self.assertIs(_build_ordered_loader(), _build_ordered_loader())
+        self.assertIsNot(_build_ordered_loader(),
+                         _build_ordered_loader(Loader=yaml.Loader))
+
+    @unittest.skipUnless(VERIFY_METRICS_DIR, 'verify_metrics is not set up.')
+    def test_parity(self):
+        """The default loader gives the same documents, in the same key
+        order, as the pure-Python loader for all of verify_metrics.
+        """
+        paths = list_yaml_files(VERIFY_METRICS_DIR)
+        self.assertGreater(len(paths), 0)
+        docs = load_yaml_files(paths)
+        python_docs = load_yaml_files(paths, Loader=yaml.Loader)
+        for path, file_docs, python_file_docs in zip(paths, docs,
+                                                     python_docs):
+            # OrderedDict equality also compares key order
+            self.assertEqual(file_docs, python_file_docs, msg=path)
+
+
+@unittest.skipUnless(os.getenv('LSST_VERIFY_BENCHMARK'),
+                     'Set LSST_VERIFY_BENCHMARK to run benchmarks.')
+@unittest.skipUnless(VERIFY_METRICS_DIR, 'verify_metrics is not set up.')
+@unittest.skipIf(mock is None, 'unittest.mock is required.')
+class LoaderBenchmarkTestCase(unittest.TestCase):
+    """Benchmark loading all of verify_metrics, with
+    ``load_metrics_package``, with each YAML loader.
+    """
+
+    def load(self):
+        MetricSet.load_metrics_package(VERIFY_METRICS_DIR)
+        SpecificationSet.load_metrics_package(VERIFY_METRICS_DIR)
+
+    def test_benchmark(self):
+        paths = list_yaml_files(VERIFY_METRICS_DIR)
+        loaders = [('yaml.Loader', yaml.Loader),
+                   ('yaml.SafeLoader', yaml.SafeLoader)]
+        if hasattr(yaml, 'CSafeLoader'):
+            loaders.append(('yaml.CSafeLoader', yaml.CSafeLoader))
+
+        print('\nLoading {0:d} YAML files:'.format(len(paths)))
+        # Time actual loads, not the package caches
+        with mock.patch.dict(os.environ, {'LSST_VERIFY_NO_CACHE': '1'}):
+            for name, Loader in loaders:
+                with mock.patch('lsst.verify.yamlutils._get_default_loader',
+                                return_value=Loader):
+                    duration = min(timeit.repeat(self.load, number=1,
+                                                 repeat=5))
+                print('{0:>18s}: {1:8.2f} ms'.format(name, duration * 1e3))
+
+
+if __name__ == "__main__":
+    unittest.main()